@@ -0,0 +1,73 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+"""
+Benchmark parsing of wide checklist sheets into metadata objects.
+
+Usage:
+    python benchmarks/bench_from_dict.py [--rows 100000] [--columns 200]
+"""
+
+import argparse
+import time
+
+from q2_ena_uploader.metadata.experiment import ExperimentSet
+from q2_ena_uploader.metadata.sample import SampleSet
+
+
+def _sample_rows(n_rows: int, n_columns: int) -> list:
+    header = ["alias", "taxon_id", "scientific_name", "url_link1", "xref_link1"]
+    header += [f"checklist field {i}" for i in range(n_columns - len(header))]
+    return [
+        {k: f"{k} value {i % 10}" if k != "alias" else f"sample{i}" for k in header}
+        for i in range(n_rows)
+    ]
+
+
+def _experiment_rows(n_rows: int, n_columns: int) -> list:
+    header = [
+        "title",
+        "study_ref",
+        "sample_description",
+        "platform",
+        "instrument_model",
+        "library_strategy",
+        "library_source",
+        "library_selection",
+        "library_layout",
+    ]
+    header += [f"extra field {i}" for i in range(n_columns - len(header))]
+    return [{k: f"{k} {i % 10}" for k in header} for i in range(n_rows)]
+
+
+def _time(label: str, func, rows: list):
+    start = time.perf_counter()
+    func(rows)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {len(rows):>8} rows  {elapsed:8.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--columns", type=int, default=200)
+    args = parser.parse_args()
+
+    _time(
+        "SampleSet.from_list",
+        SampleSet.from_list,
+        _sample_rows(args.rows, args.columns),
+    )
+    _time(
+        "ExperimentSet.from_list",
+        ExperimentSet.from_list,
+        _experiment_rows(args.rows, args.columns),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+"""
+Benchmark the time taken to load the plugin, using python -X importtime.
+
+The framework modules which every QIIME 2 plugin loads anyway (qiime2,
+q2_types, pandas) are imported first, so that only the cost added by this
+plugin is measured. The benchmark fails (exit code 1) if loading the plugin
+imports any of the dependencies which should only be loaded when they are
+used, or if it takes longer than the given budget.
+
+Usage:
+    python benchmarks/bench_import.py [--repeats 5] [--budget-ms 250]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Modules imported by every QIIME 2 plugin, excluded from the measurement
+FRAMEWORK = [
+    "pandas",
+    "qiime2.plugin",
+    "q2_types.metadata",
+    "q2_types.per_sample_sequences",
+    "q2_types.sample_data",
+]
+
+# Dependencies which must not be imported when the plugin is loaded
+LAZY = [
+    "lxml",
+    "multiprocessing",
+    "pyarrow.parquet",
+    "requests",
+    "socks",
+    "urllib3",
+]
+
+PLUGIN = "q2_ena_uploader.plugin_setup"
+MARKER = "--- plugin ---"
+
+
+def _measure(module: str) -> List[Tuple[str, int, int]]:
+    # (module, self time, cumulative time) in microseconds of every module
+    # imported after the framework, in the order of the importtime output
+    code = (
+        f"import {', '.join(FRAMEWORK)}; import sys; "
+        f"sys.stderr.write({MARKER!r} + '\\n'); import {module}"
+    )
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env=env,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"Importing {module} failed:\n{result.stderr}")
+
+    lines = result.stderr.split(MARKER + "\n", 1)[1].splitlines()
+    imports = []
+    for line in lines:
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        imports.append((name.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=250.0)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    # the fastest run is the least disturbed by the rest of the system
+    runs = [_measure(PLUGIN) for _ in range(args.repeats)]
+    totals = [dict((name, cum) for name, _, cum in run)[PLUGIN] for run in runs]
+    best = runs[totals.index(min(totals))]
+
+    self_times: Dict[str, int] = {name: self_us for name, self_us, _ in best}
+    print(f"Loading {PLUGIN}: {min(totals) / 1000:.1f} ms (best of {args.repeats})")
+    print("Slowest modules (self time):")
+    for name, self_us in sorted(self_times.items(), key=lambda x: -x[1])[: args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {name}")
+
+    failures = []
+    eager = sorted(
+        lazy
+        for lazy in LAZY
+        if any(name == lazy or name.startswith(lazy + ".") for name in self_times)
+    )
+    if eager:
+        failures.append(f"Dependencies imported when loading: {', '.join(eager)}")
+    if min(totals) / 1000 > args.budget_ms:
+        failures.append(
+            f"Loading took {min(totals) / 1000:.1f} ms, more than the budget of "
+            f"{args.budget_ms:.0f} ms"
+        )
+    for failure in failures:
+        print(f"FAILED: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+"""
+Benchmark parsing of wide metadata TSV files by the available engines.
+
+Every engine is timed parsing the file and producing the records rendered
+into XML, and the memory taken by the parsed table is reported next to the
+one of a DataFrame read by pandas.read_csv with type inference.
+
+Usage:
+    python benchmarks/bench_parse.py [--rows 100000] [--columns 40]
+"""
+
+import argparse
+import csv
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from bench_from_dict import _sample_rows
+from q2_ena_uploader.types._parse_cache import ParsedTSV, available_engines
+
+
+def _report(label: str, parse_time: float, records_time: float, nbytes: int):
+    print(
+        f"{label:<24} parse {parse_time:6.2f} s  records {records_time:6.2f} s  "
+        f"table {nbytes / 2**20:8.1f} MiB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--columns", type=int, default=40)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "samples.tsv")
+        rows = _sample_rows(args.rows, args.columns)
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]), delimiter="\t")
+            writer.writeheader()
+            writer.writerows(rows)
+        del rows
+
+        start = time.perf_counter()
+        df = pd.read_csv(path, sep="\t")
+        parse_time = time.perf_counter() - start
+        start = time.perf_counter()
+        df.to_dict("records")
+        records_time = time.perf_counter() - start
+        nbytes = df.memory_usage(deep=True).sum()
+        _report("pandas.read_csv", parse_time, records_time, nbytes)
+
+        for engine in available_engines():
+            start = time.perf_counter()
+            parsed = ParsedTSV(path, engine=engine)
+            parse_time = time.perf_counter() - start
+            start = time.perf_counter()
+            parsed.records()
+            records_time = time.perf_counter() - start
+            _report(engine, parse_time, records_time, parsed.nbytes)
+
+
+if __name__ == "__main__":
+    main()
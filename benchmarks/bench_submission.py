@@ -0,0 +1,152 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+"""
+Benchmark the sample and read submissions end-to-end against a local drop-box.
+
+The metadata steps of submit-all (submit-metadata-samples followed by
+submit-metadata-reads) are run against the stand-in drop-box server with the
+configured latency and error rate - the FTP transfer of the reads is replaced
+by a file transfer metadata table reporting every file as uploaded.
+
+Usage:
+    python benchmarks/bench_submission.py [--samples 1000] [--batch-size 100]
+        [--threads 1 4 8] [--latency 0.2] [--latency-per-object 0.001]
+        [--error-rate 0.05]
+"""
+
+import argparse
+import csv
+import gzip
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+import pandas as pd
+import qiime2
+
+from bench_xml import _experiment_rows, _sample_rows
+from q2_ena_uploader.drop_box_server import DropBoxServer
+from q2_ena_uploader.read_submission import submit_metadata_reads
+from q2_ena_uploader.sample_submission import submit_metadata_samples
+from q2_ena_uploader.types import (
+    ENAMetadataExperimentFormat,
+    ENAMetadataSamplesFormat,
+)
+
+
+def _write_tsv(path: str, rows: list) -> str:
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]), delimiter="\t")
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def _prepare_inputs(tmp: str, n_samples: int):
+    samples = ENAMetadataSamplesFormat(
+        _write_tsv(os.path.join(tmp, "samples.tsv"), _sample_rows(n_samples, 20)),
+        mode="r",
+    )
+    experiment = ENAMetadataExperimentFormat(
+        _write_tsv(os.path.join(tmp, "experiment.tsv"), _experiment_rows(n_samples)),
+        mode="r",
+    )
+
+    manifest = {}
+    for i in range(n_samples):
+        paths = []
+        for direction in ("R1", "R2"):
+            path = os.path.join(tmp, f"sample{i}_{direction}_001.fastq.gz")
+            with gzip.open(path, "wt") as f:
+                f.write(f"@read{i}\nACGT\n+\nIIII\n")
+            paths.append(path)
+        manifest[f"sample{i}"] = paths
+    demux = SimpleNamespace(
+        manifest=pd.DataFrame.from_dict(
+            manifest, orient="index", columns=["forward", "reverse"]
+        )
+    )
+
+    # every file is reported as uploaded by the (skipped) FTP transfer
+    transferred = pd.DataFrame(
+        {"status": 1, "action": "ADD"},
+        index=pd.Index(
+            [f"sample{i}_{d}" for i in range(n_samples) for d in "fr"],
+            name="sampleid",
+        ),
+    )
+    return samples, experiment, demux, qiime2.Metadata(transferred)
+
+
+def _run(args, threads: int, inputs) -> dict:
+    samples, experiment, demux, transferred = inputs
+    server = DropBoxServer(
+        latency=args.latency,
+        latency_per_object=args.latency_per_object,
+        error_rate=args.error_rate,
+        seed=0,
+    )
+    with server:
+        os.environ["ENA_SERVER_URL"] = server.url
+
+        start = time.perf_counter()
+        receipt = submit_metadata_samples(
+            samples=samples, batch_size=args.batch_size, threads=threads
+        )
+        samples_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        submit_metadata_reads(
+            demux=demux,
+            experiment=experiment,
+            samples_submission_receipt=receipt,
+            file_transfer_metadata=transferred,
+            batch_size=args.batch_size,
+            threads=threads,
+        )
+        reads_time = time.perf_counter() - start
+
+    return {
+        "samples": samples_time,
+        "reads": reads_time,
+        "objects": len(server.drop_box.accessions),
+        **server.stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--latency-per-object", type=float, default=0.001)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    os.environ.setdefault("ENA_USERNAME", "Webin-0")
+    os.environ.setdefault("ENA_PASSWORD", "password")
+    # the same metadata is submitted in every run, so that it would only be
+    # rendered once with the cache of rendered documents
+    os.environ.setdefault("ENA_RENDER_CACHE", "false")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        inputs = _prepare_inputs(tmp, args.samples)
+        for threads in args.threads:
+            result = _run(args, threads, inputs)
+            print(
+                f"threads {threads:>3}  samples {result['samples']:7.2f} s  "
+                f"reads {result['reads']:7.2f} s  "
+                f"{result['requests']:>5} requests ({result['errors']} failed)  "
+                f"{result['objects']} objects registered"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+"""
+Benchmark building and serializing metadata XML with every XML backend.
+
+Experiments are rendered with and without the memo of their shared
+platform/library subtrees - lxml copies a memoized subtree on every reuse,
+which is nevertheless faster than building it anew.
+
+Usage:
+    python benchmarks/bench_xml.py [--rows 100000] [--columns 200]
+"""
+
+import argparse
+import time
+
+from q2_ena_uploader.metadata import experiment
+from q2_ena_uploader.metadata.experiment import ExperimentSet
+from q2_ena_uploader.metadata.render import render_set
+from q2_ena_uploader.metadata.sample import SampleSet
+from q2_ena_uploader.metadata.xml_backend import available_backends, etree
+
+
+def _sample_rows(n_rows: int, n_columns: int) -> list:
+    header = ["alias", "taxon_id", "scientific_name", "url_link1", "xref_link1"]
+    header += [f"checklist field {i}" for i in range(n_columns - len(header))]
+    return [
+        {
+            "alias": f"sample{i}",
+            "taxon_id": "410658",
+            "scientific_name": "soil metagenome",
+            "url_link1": "label|https://example.org",
+            "xref_link1": "db|id",
+            **{k: f"{k} value {i % 10}" for k in header[5:]},
+        }
+        for i in range(n_rows)
+    ]
+
+
+def _experiment_rows(n_rows: int) -> list:
+    return [
+        {
+            "title": f"Experiment {i}",
+            "study_ref": "study1",
+            "sample_description": f"sample{i}",
+            "platform": "ILLUMINA",
+            "instrument_model": "Illumina MiSeq",
+            "library_strategy": "AMPLICON",
+            "library_source": "METAGENOMIC",
+            "library_selection": "PCR",
+            "library_layout": "PAIRED",
+            "library_nominal_length": "250",
+        }
+        for i in range(n_rows)
+    ]
+
+
+def _time(set_cls, rows: list) -> float:
+    start = time.perf_counter()
+    render_set(set_cls, rows)
+    return time.perf_counter() - start
+
+
+def _time_without_memo(rows: list) -> float:
+    size = experiment.SHARED_SUBTREES_SIZE
+    experiment.SHARED_SUBTREES_SIZE = 0
+    try:
+        return _time(ExperimentSet, rows)
+    finally:
+        experiment.SHARED_SUBTREES_SIZE = size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--columns", type=int, default=200)
+    args = parser.parse_args()
+
+    inputs = [
+        (SampleSet, _sample_rows(args.rows, args.columns)),
+        (ExperimentSet, _experiment_rows(args.rows)),
+    ]
+    for set_cls, rows in inputs:
+        baseline = None
+        for backend in reversed(available_backends()):
+            etree.use(backend)
+            elapsed = _time(set_cls, rows)
+            baseline = baseline or elapsed
+            print(
+                f"{set_cls.__name__:<14} {backend:<7} {len(rows):>8} rows  "
+                f"{elapsed:8.2f} s  ({baseline / elapsed:.1f}x)"
+            )
+
+    rows = inputs[1][1]
+    for backend in reversed(available_backends()):
+        etree.use(backend)
+        without, with_memo = _time_without_memo(rows), _time(ExperimentSet, rows)
+        print(
+            f"{'subtree memo':<14} {backend:<7} {len(rows):>8} rows  "
+            f"{without:8.2f} s without, {with_memo:.2f} s with "
+            f"({without / with_memo:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
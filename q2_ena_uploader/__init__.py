@@ -5,20 +5,46 @@
 #
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
-from .all import submit_all
-from .ftp_file_upload import transfer_files_to_ena
-from .read_submission import submit_metadata_reads
-from .sample_submission import cancel_submission, submit_metadata_samples
+import importlib
 
 try:
     from ._version import __version__
 except ModuleNotFoundError:
     __version__ = "0.0.0+notfound"
 
+# The actions are imported on first access, so that importing the package (or
+# any of its modules, e.g. in worker processes) does not load the submission
+# code and its dependencies
+_ACTIONS = {
+    "transfer_files_to_ena": ".ftp_file_upload",
+    "submit_metadata_reads": ".read_submission",
+    "cancel_submission": ".sample_submission",
+    "cancel_submissions": ".sample_submission",
+    "submit_metadata_samples": ".sample_submission",
+    "submit_all": ".all",
+    "prepare_submission": ".bundle",
+    "send_submission": ".bundle",
+}
+
+
+def __getattr__(name: str):
+    if name in _ACTIONS:
+        module = importlib.import_module(_ACTIONS[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted([*globals(), *_ACTIONS])
+
+
 __all__ = [
     "transfer_files_to_ena",
     "submit_metadata_reads",
     "cancel_submission",
+    "cancel_submissions",
     "submit_metadata_samples",
     "submit_all",
+    "prepare_submission",
+    "send_submission",
 ]
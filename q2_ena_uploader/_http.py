@@ -0,0 +1,59 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+class _CountingPoolMixin:
+    """Connection pool counting the connections which were established."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.num_connects = 0
+
+    def _new_conn(self):
+        conn = super()._new_conn()
+        connect = conn.connect
+
+        # dropped connections are re-established by the same connection
+        # object, so every (re)connect is counted instead of every object
+        def _connect():
+            connect()
+            self.num_connects += 1
+
+        conn.connect = _connect
+        return conn
+
+
+class _CountingHTTPConnectionPool(_CountingPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _CountingHTTPSConnectionPool(_CountingPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class _PooledAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+
+def create_session(pool_size: int, keep_alive: bool) -> requests.Session:
+    """Create an HTTP session counting the connections of its pools."""
+    session = requests.Session()
+    adapter = _PooledAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    return session
@@ -0,0 +1,135 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+from datetime import datetime
+from typing import Collection, Dict, Iterable, KeysView, List, Optional, Tuple
+from xml.etree.ElementTree import Element, SubElement, fromstring, tostring
+
+from q2_ena_uploader.types._types_and_formats import ENASubmissionReceiptFormat
+from q2_ena_uploader.utils import merge_receipts
+
+# Objects of a receipt which are registered under an alias of the submitter
+REGISTERED_OBJECTS = ("PROJECT", "SAMPLE", "EXPERIMENT", "RUN")
+
+
+class AccessionIndex:
+    """
+    Accessions of the objects registered in ENA, indexed by their alias.
+
+    The index is built from the receipts of earlier submissions - only the
+    objects which were assigned an accession are included, so that objects
+    of a failed submission are submitted again.
+    """
+
+    def __init__(self):
+        self._objects: Dict[str, Dict[str, Element]] = {
+            tag: {} for tag in REGISTERED_OBJECTS
+        }
+
+    @classmethod
+    def from_receipts(
+        cls, receipts: Iterable[ENASubmissionReceiptFormat]
+    ) -> "AccessionIndex":
+        index = cls()
+        for receipt in receipts:
+            index.add(ENASubmissionReceiptFormat.read_ET_from_file(str(receipt)))
+        return index
+
+    def add(self, receipt: Element):
+        """Add the registered objects of a receipt to the index."""
+        for tag, objects in self._objects.items():
+            for element in receipt.findall(tag):
+                alias, accession = element.get("alias"), element.get("accession")
+                if alias and accession:
+                    # later receipts take precedence
+                    objects[alias] = element
+
+    def accession(self, tag: str, alias: str) -> Optional[str]:
+        """The accession of an object, or None if it is not registered."""
+        element = self._objects[tag].get(alias)
+        return None if element is None else element.get("accession")
+
+    def registered(self, tag: str) -> KeysView[str]:
+        """Aliases of the registered objects of a type (e.g. "SAMPLE")."""
+        return self._objects[tag].keys()
+
+    def receipt(self, tags: Iterable[str]) -> bytes:
+        """A successful receipt listing the registered objects of the types."""
+        root = Element(
+            "RECEIPT",
+            {
+                "receiptDate": datetime.now().astimezone().isoformat(),
+                "submissionFile": "submission.xml",
+                "success": "true",
+            },
+        )
+        for tag in tags:
+            root.extend(self._objects[tag].values())
+        SubElement(root, "MESSAGES")
+        return tostring(root, encoding="utf-8", xml_declaration=True)
+
+
+def drop_registered(
+    xml: bytes, registered: Collection[str]
+) -> Tuple[Optional[bytes], List[str]]:
+    """
+    Remove the registered objects from an XML set document (e.g. SAMPLE_SET).
+
+    Parameters
+    ----------
+    xml : bytes
+        The XML set document.
+    registered : collection of str
+        Aliases of the registered objects.
+
+    Returns
+    -------
+    tuple
+        The document without the registered objects (None if no object is
+        left) and the aliases of the removed objects.
+    """
+    root = fromstring(xml)
+    skipped = []
+    for element in list(root):
+        if element.get("alias") in registered:
+            root.remove(element)
+            skipped.append(element.get("alias"))
+    if not skipped:
+        return xml, skipped
+    if len(root) == 0:
+        return None, skipped
+    return tostring(root, encoding="utf8"), skipped
+
+
+def skipped_message(objects: str, skipped: List[str]) -> List[str]:
+    """Messages summarizing the objects skipped as already registered."""
+    if not skipped:
+        return []
+    return [
+        f"{len(skipped)} {objects} already registered in the previous receipts "
+        "were not submitted again."
+    ]
+
+
+def merge_registered(path: str, index: AccessionIndex, tags: Iterable[str]):
+    """
+    Add the registered objects of the types to the receipt stored in a file.
+
+    Parameters
+    ----------
+    path : str
+        Path to the receipt of the new submission.
+    index : AccessionIndex
+        The registered objects.
+    tags : iterable of str
+        Types of the objects to add (e.g. "PROJECT" and "SAMPLE").
+    """
+    with open(path, "r+b") as fh:
+        content = merge_receipts([fh.read(), index.receipt(tags)])
+        fh.seek(0)
+        fh.truncate()
+        fh.write(content)
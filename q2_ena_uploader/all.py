@@ -8,7 +8,19 @@
 
 
 def submit_all(
-    ctx, demux, study, samples, experiment, submission_hold_date, dev, action
+    ctx,
+    demux,
+    study,
+    samples,
+    experiment,
+    submission_hold_date,
+    dev,
+    action,
+    batch_size=0,
+    threads=1,
+    previous_receipts=None,
+    retries=0,
+    validate_xml=True,
 ):
     submit_metadata_samples = ctx.get_action("ena_uploader", "submit_metadata_samples")
     submit_metadata_reads = ctx.get_action("ena_uploader", "submit_metadata_reads")
@@ -20,6 +32,11 @@ def submit_all(
         submission_hold_date=submission_hold_date,
         dev=dev,
         action=action,
+        batch_size=batch_size,
+        threads=threads,
+        previous_receipts=previous_receipts,
+        retries=retries,
+        validate_xml=validate_xml,
     )
     (receipt_transfer,) = transfer_files(demux=demux, action=action)
     (receipt_reads,) = submit_metadata_reads(
@@ -30,6 +47,11 @@ def submit_all(
         submission_hold_date=submission_hold_date,
         action=action,
         dev=dev,
+        batch_size=batch_size,
+        threads=threads,
+        previous_receipts=previous_receipts,
+        retries=retries,
+        validate_xml=validate_xml,
     )
 
     return receipt_study, receipt_reads, receipt_transfer
@@ -0,0 +1,350 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import hashlib
+import os
+from contextlib import ExitStack
+from io import BytesIO
+from tempfile import TemporaryFile
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple, Union
+
+from q2_types.per_sample_sequences import CasavaOneEightSingleLanePerSampleDirFmt
+
+from q2_ena_uploader.metadata.run import _run_set_from_dict
+from q2_ena_uploader.metadata.validation import assert_valid_xml
+from q2_ena_uploader.read_submission import (
+    _process_manifest,
+    _split_into_batches,
+    _validate_sample_ids_match,
+)
+from q2_ena_uploader.sample_submission import _create_submission_xml
+from q2_ena_uploader.types._types_and_formats import (
+    ENAMetadataExperimentFormat,
+    ENAMetadataSamplesDirFmt,
+    ENAMetadataStudyFormat,
+    ENASubmissionBundleDirFmt,
+    ENASubmissionReceiptFormat,
+)
+from q2_ena_uploader.utils import (
+    ActionType,
+    assert_credentials,
+    get_server_url,
+    merge_receipts,
+    receipt_status,
+    submit_batches,
+    split_xml_set,
+)
+
+# Size of the chunks in which the documents are copied into the bundle
+DOCUMENT_CHUNK_SIZE = 2**20
+
+Document = Tuple[str, Union[bytes, str, BinaryIO]]
+
+
+def _write_document(
+    bundle: ENASubmissionBundleDirFmt,
+    stage: str,
+    index: int,
+    part: str,
+    document: Document,
+) -> dict:
+    # copies the document into the bundle and returns its manifest entry
+    filename, content = document
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    if isinstance(content, bytes):
+        content = BytesIO(content)
+    content.seek(0)
+
+    path = bundle.document_path(stage, index, part)
+    digest = hashlib.sha256()
+    with open(path, "wb") as fh:
+        for chunk in iter(lambda: content.read(DOCUMENT_CHUNK_SIZE), b""):
+            digest.update(chunk)
+            fh.write(chunk)
+    return {
+        "path": os.path.basename(path),
+        "filename": filename,
+        "sha256": digest.hexdigest(),
+    }
+
+
+def _samples_submissions(
+    study: Optional[ENAMetadataStudyFormat],
+    samples: Optional[ENAMetadataSamplesDirFmt],
+    submission_xml: str,
+    batch_size: int,
+    threads: int,
+    validate_xml: bool,
+) -> Iterator[Dict[str, Document]]:
+    documents = {}
+    if study is not None:
+        study_xml = study.to_xml()
+        assert_valid_xml(study_xml, "study", strict=validate_xml)
+        documents["PROJECT"] = ("project.xml", study_xml)
+
+    if samples is None:
+        yield {**documents, "SUBMISSION": ("submission.xml", submission_xml)}
+        return
+
+    samples_xml = samples.to_xml(processes=threads)
+    assert_valid_xml(samples_xml, "samples", strict=validate_xml)
+    if batch_size > 0:
+        batches = split_xml_set(samples_xml, batch_size) or [samples_xml]
+    else:
+        batches = [samples_xml]
+    for batch_xml in batches:
+        yield {
+            **documents,
+            "SAMPLE": ("samples.xml", batch_xml),
+            "SUBMISSION": ("submission.xml", submission_xml),
+        }
+        # the study only needs to be registered once
+        documents.pop("PROJECT", None)
+
+
+def _reads_submissions(
+    experiment: ENAMetadataExperimentFormat,
+    parsed_data: dict,
+    submission_xml: str,
+    batch_size: int,
+    threads: int,
+    validate_xml: bool,
+) -> Iterator[Dict[str, Document]]:
+    with TemporaryFile() as experiment_xml:
+        experiment.to_xml(processes=threads, file=experiment_xml)
+        assert_valid_xml(experiment_xml, "experiment", strict=validate_xml)
+
+        if batch_size > 0:
+            with ExitStack() as stack:
+                for batch_experiment_xml, batch_run_xml in _split_into_batches(
+                    experiment_xml, parsed_data, batch_size, stack
+                ):
+                    yield {
+                        "SUBMISSION": ("submission.xml", submission_xml),
+                        "EXPERIMENT": ("metadata.xml", batch_experiment_xml),
+                        "RUN": ("run.xml", batch_run_xml),
+                    }
+            return
+
+        with TemporaryFile() as run_xml:
+            _run_set_from_dict(parsed_data, run_xml)
+            yield {
+                "SUBMISSION": ("submission.xml", submission_xml),
+                "EXPERIMENT": ("metadata.xml", experiment_xml),
+                "RUN": ("run.xml", run_xml),
+            }
+
+
+def prepare_submission(
+    study: ENAMetadataStudyFormat = None,
+    samples: ENAMetadataSamplesDirFmt = None,
+    experiment: ENAMetadataExperimentFormat = None,
+    demux: CasavaOneEightSingleLanePerSampleDirFmt = None,
+    samples_submission_receipt: ENASubmissionReceiptFormat = None,
+    submission_hold_date: str = "",
+    action: str = "ADD",
+    batch_size: int = 0,
+    threads: int = 1,
+    validate_xml: bool = True,
+) -> ENASubmissionBundleDirFmt:
+    """
+    Prepare a submission to ENA offline, without connecting to ENA.
+
+    All of the processing done by the submission actions - rendering and
+    validating the XML documents, computing the checksums of the read files
+    and checking the sample IDs - is done here, so that it can run on a node
+    without internet access. The resulting bundle is sent to ENA by
+    `send_submission`.
+
+    Parameters
+    ----------
+    study : ENAMetadataStudyFormat, optional
+        Study metadata in ENA format, by default None.
+    samples : ENAMetadataSamplesDirFmt, optional
+        Sample metadata in ENA format, by default None.
+    experiment : ENAMetadataExperimentFormat, optional
+        Experiment metadata in ENA format, by default None. Needs to be
+        provided together with `demux`.
+    demux : CasavaOneEightSingleLanePerSampleDirFmt, optional
+        The demultiplexed sequence data whose runs are submitted, by default
+        None.
+    samples_submission_receipt : ENASubmissionReceiptFormat, optional
+        Receipt from an earlier sample submission, by default None. When
+        provided, the samples of the reads are checked against it.
+    submission_hold_date : str, optional
+        Date until which the submission should be kept private, by default "".
+        Format should be YYYY-MM-DD.
+    action : str, optional
+        Type of submission action, by default "ADD".
+        Supported values:
+        - "ADD": Add new data
+        - "MODIFY": Modify existing data
+    batch_size : int, optional
+        Maximum number of samples included in a single submission, by default
+        0 (everything is submitted at once).
+    threads : int, optional
+        Number of worker processes used to render the XML documents, by
+        default 1.
+    validate_xml : bool, optional
+        Whether an error is raised if the generated XML documents do not
+        conform to the ENA schemas bundled with the plugin, by default True.
+        If False, the problems are reported as a warning and the documents
+        are added to the bundle nevertheless.
+
+    Returns
+    -------
+    ENASubmissionBundleDirFmt
+        The bundle of all the submission documents, with the samples and the
+        study submitted before the experiments and runs.
+
+    Raises
+    ------
+    RuntimeError
+        If none of study, samples and experiment are provided
+    ValueError
+        If only one of experiment and demux is provided
+    ValueError
+        If sample IDs don't match across the provided sources
+    ValueError
+        If the generated XML documents do not conform to the ENA schemas
+        and `validate_xml` is enabled
+    """
+    if study is None and samples is None and experiment is None:
+        raise RuntimeError(
+            "Please ensure that the study, the samples or the experiment "
+            "metadata are included in the ENA submission."
+        )
+    if (experiment is None) != (demux is None):
+        raise ValueError(
+            "The experiment metadata and the demultiplexed reads need to be "
+            "provided together."
+        )
+
+    submission_xml = _create_submission_xml(
+        ActionType.from_string(action), submission_hold_date
+    )
+    stages = []
+    if study is not None or samples is not None:
+        stages.append(
+            (
+                "samples",
+                _samples_submissions(
+                    study, samples, submission_xml, batch_size, threads, validate_xml
+                ),
+            )
+        )
+
+    parsed_data = {}
+    if experiment is not None:
+        df = demux.manifest
+        _validate_sample_ids_match(df, None, samples_submission_receipt, experiment)
+        parsed_data = _process_manifest(df)
+        stages.append(
+            (
+                "reads",
+                _reads_submissions(
+                    experiment,
+                    parsed_data,
+                    submission_xml,
+                    batch_size,
+                    threads,
+                    validate_xml,
+                ),
+            )
+        )
+
+    bundle = ENASubmissionBundleDirFmt()
+    submissions = []
+    for stage, stage_submissions in stages:
+        for index, documents in enumerate(stage_submissions, start=1):
+            documents = {
+                part: _write_document(bundle, stage, index, part, document)
+                for part, document in documents.items()
+            }
+            submissions.append({"stage": stage, "documents": documents})
+
+    bundle.write_manifest(
+        {
+            "action": ActionType.from_string(action).value,
+            "submission_hold_date": submission_hold_date,
+            "submissions": submissions,
+            "files": parsed_data,
+        }
+    )
+    return bundle
+
+
+def send_submission(
+    bundle: ENASubmissionBundleDirFmt, dev: bool = True, threads: int = 1
+) -> ENASubmissionReceiptFormat:
+    """
+    Send a submission prepared by `prepare_submission` to the ENA server.
+
+    The documents of the bundle are streamed from disk as they are. The
+    submissions of the same stage are sent concurrently, but all the samples
+    are submitted before any of the reads, which refer to them - the reads
+    are only submitted if all of the samples were registered.
+
+    Parameters
+    ----------
+    bundle : ENASubmissionBundleDirFmt
+        The prepared submission.
+    dev : bool, optional
+        Whether to use the development server, by default True.
+    threads : int, optional
+        Maximum number of submissions sent concurrently, by default 1.
+
+    Returns
+    -------
+    ENASubmissionReceiptFormat
+        The receipts of all the submissions of the bundle, merged into one.
+
+    Raises
+    ------
+    RuntimeError
+        If ENA username or password environment variables are not set
+    ValueError
+        If the samples were not registered, so that the reads referring to
+        them could not be submitted
+    """
+    username, password = assert_credentials()
+    url = get_server_url(dev)
+
+    stages = {}
+    for stage, documents in bundle.submissions():
+        stages.setdefault(stage, []).append(documents)
+
+    receipts = []
+    for stage, submissions in stages.items():
+        if receipts and stage == "reads":
+            # the reads refer to the samples, which need to be registered
+            success, error = receipt_status(BytesIO(merge_receipts(receipts)))
+            if success != "true":
+                raise ValueError(
+                    "The samples of the bundle were not registered, so the reads "
+                    f"referring to them were not submitted. ENA reported: {error}"
+                )
+        with ExitStack() as stack:
+            batches = []
+            for documents in submissions:
+                files = {}
+                for part, (filename, path) in documents.items():
+                    if part == "SUBMISSION":
+                        # the submission document is inspected when retrying
+                        with open(path, "rb") as fh:
+                            content = fh.read()
+                    else:
+                        content = stack.enter_context(open(path, "rb"))
+                    files[part] = (filename, content, "text/xml")
+                batches.append(files)
+            receipts.append(submit_batches(url, (username, password), batches, threads))
+
+    receipt = ENASubmissionReceiptFormat()
+    with receipt.open() as fh:
+        merge_receipts(receipts, fh)
+    return receipt
@@ -0,0 +1,103 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import hashlib
+import json
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+# Maximum number of aliases listed in the summary of a differential submission
+MAX_LISTED_ALIASES = 10
+
+
+def row_digest(row: dict) -> str:
+    """
+    Compute the SHA-256 digest of a metadata row.
+
+    The digest does not depend on the order of the columns, and missing
+    values (None or empty strings) are left out, so that the same row stored
+    in a TSV or a Parquet file has the same digest.
+    """
+    values = {str(k): str(v) for k, v in row.items() if v is not None and v != ""}
+    content = json.dumps(values, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class MetadataDiff(NamedTuple):
+    """Aliases of the rows of new metadata, compared to a previous version."""
+
+    changed: List[str]
+    unchanged: List[str]
+    added: List[str]
+    removed: List[str]
+
+    def summary(self, objects: str) -> List[str]:
+        """Messages summarizing the differential submission of the objects."""
+
+        def _listed(aliases: List[str]) -> str:
+            listed = ", ".join(aliases[:MAX_LISTED_ALIASES])
+            if len(aliases) > MAX_LISTED_ALIASES:
+                listed += f" and {len(aliases) - MAX_LISTED_ALIASES} more"
+            return listed
+
+        messages = [
+            f"Differential MODIFY: {len(self.changed)} changed {objects} were "
+            f"submitted, {len(self.unchanged)} unchanged {objects} were skipped."
+        ]
+        if self.added:
+            messages.append(
+                f"{len(self.added)} {objects} missing from the previous metadata "
+                f"were skipped, as they need to be submitted with ADD: "
+                f"{_listed(self.added)}."
+            )
+        if self.removed:
+            messages.append(
+                f"{len(self.removed)} {objects} of the previous metadata are "
+                f"missing from the new metadata and were left unchanged: "
+                f"{_listed(self.removed)}."
+            )
+        return messages
+
+
+def diff_rows(
+    rows: Iterable[dict], previous: Iterable[dict], alias: str
+) -> Tuple[MetadataDiff, List[dict]]:
+    """
+    Compare metadata rows to a previous version by their digests.
+
+    Parameters
+    ----------
+    rows : iterable of dict
+        Rows of the new metadata.
+    previous : iterable of dict
+        Rows of the previous metadata.
+    alias : str
+        Column identifying the rows (e.g. "alias" for samples).
+
+    Returns
+    -------
+    tuple
+        The MetadataDiff of the aliases and the changed rows, in the order
+        of the new metadata.
+    """
+    previous_digests: Dict[str, str] = {
+        str(row.get(alias)): row_digest(row) for row in previous
+    }
+
+    changed, unchanged, added, changed_rows = [], [], [], []
+    seen = set()
+    for row in rows:
+        key = str(row.get(alias))
+        seen.add(key)
+        if key not in previous_digests:
+            added.append(key)
+        elif previous_digests[key] == row_digest(row):
+            unchanged.append(key)
+        else:
+            changed.append(key)
+            changed_rows.append(row)
+    removed = [key for key in previous_digests if key not in seen]
+    return MetadataDiff(changed, unchanged, added, removed), changed_rows
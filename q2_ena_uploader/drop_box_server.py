@@ -0,0 +1,391 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+"""
+Local stand-in for the ENA drop-box submission service.
+
+The server accepts the same multipart SUBMISSION/PROJECT/SAMPLE/EXPERIMENT/RUN
+documents as the ENA drop-box, registers the submitted objects under fake
+accessions and answers with receipts shaped like the ENA ones. Latency and
+server errors can be injected to benchmark and load-test the submission
+actions offline, e.g.:
+
+    python -m q2_ena_uploader.drop_box_server --port 8080 --latency 0.5
+    export ENA_SERVER_URL=http://127.0.0.1:8080/ena/submit/drop-box/submit
+"""
+
+import argparse
+import random
+import threading
+import time
+from datetime import datetime
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from xml.etree.ElementTree import Element, SubElement, fromstring, tostring
+
+# Path of the submission endpoint - the same as on the ENA servers
+SUBMIT_PATH = "/ena/submit/drop-box/submit"
+
+# Prefixes of the accessions assigned to every object type and of the
+# secondary accessions reported alongside them
+ACCESSION_PREFIXES = {
+    "PROJECT": ("PRJEB", ("ERP", "study")),
+    "SAMPLE": ("ERS", ("SAMEA", "biosample")),
+    "EXPERIMENT": ("ERX", None),
+    "RUN": ("ERR", None),
+    "SUBMISSION": ("ERA", None),
+}
+
+# Order in which objects are reported in a receipt
+_OBJECT_TAGS = ("PROJECT", "SAMPLE", "EXPERIMENT", "RUN")
+
+_TEST_MESSAGE = (
+    "This submission is a TEST submission and will be discarded within 24 hours"
+)
+
+
+class DropBox:
+    """
+    In-memory state of the stand-in drop-box.
+
+    Objects are registered per submission account under their alias, so
+    that adding an existing object, modifying an unknown one or cancelling
+    an unknown accession fails the same way as on ENA. A submission is
+    atomic - nothing is registered if any of its objects failed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {tag: 0 for tag in ACCESSION_PREFIXES}
+        # {(account, tag, alias): accession}
+        self.accessions = {}
+        self.cancelled = set()
+
+    def _accession(self, tag: str) -> Tuple[str, Optional[Tuple[str, str]]]:
+        self._counters[tag] += 1
+        n = self._counters[tag]
+        prefix, secondary = ACCESSION_PREFIXES[tag]
+        if secondary is None:
+            return f"{prefix}{n:06d}", None
+        return f"{prefix}{n:06d}", (f"{secondary[0]}{n:06d}", secondary[1])
+
+    @staticmethod
+    def _objects(documents: Dict[str, bytes]) -> List[Element]:
+        objects = []
+        for tag in _OBJECT_TAGS:
+            if tag not in documents:
+                continue
+            root = fromstring(documents[tag])
+            objects.extend(root.iter(tag))
+        return objects
+
+    def submit(self, documents: Dict[str, bytes], account: str = "") -> bytes:
+        """
+        Process the documents of a single submission.
+
+        Parameters
+        ----------
+        documents : dict
+            Contents of the submitted documents keyed by the names of the
+            multipart fields (SUBMISSION, PROJECT, SAMPLE, EXPERIMENT, RUN).
+        account : str, optional
+            Name of the submission account, by default "".
+
+        Returns
+        -------
+        bytes
+            The receipt of the submission.
+        """
+        errors, registered, cancelled = [], [], []
+        try:
+            submission = fromstring(documents["SUBMISSION"])
+            objects = self._objects(documents)
+        except KeyError:
+            submission, objects = None, []
+            errors.append("The submission XML document is missing.")
+        except Exception as e:
+            submission, objects = None, []
+            errors.append(f"Invalid XML document: {e}")
+
+        actions = [] if submission is None else list(submission.iter("ACTION"))
+        action_names = [a[0].tag for a in actions if len(a)]
+        hold = None if submission is None else submission.find(".//HOLD")
+        hold_date = None if hold is None else hold.get("HoldUntilDate")
+
+        with self._lock:
+            for action in actions:
+                if not len(action):
+                    continue
+                name = action[0].tag
+                if name in ("ADD", "MODIFY"):
+                    registered.extend(
+                        self._process_objects(name, objects, account, errors)
+                    )
+                elif name == "CANCEL":
+                    target = action[0].get("target")
+                    if target in self.accessions.values() and (
+                        target not in self.cancelled
+                    ):
+                        cancelled.append(target)
+                    else:
+                        errors.append(
+                            f"The object {target} does not exist in the "
+                            f"submission account or has already been cancelled."
+                        )
+                elif name not in ("HOLD", "RELEASE", "VALIDATE"):
+                    errors.append(f"Unsupported submission action: {name}.")
+            if submission is not None and not action_names:
+                errors.append("The submission XML document contains no actions.")
+
+            # submissions are atomic - only commit if everything succeeded
+            if not errors:
+                for key, accession, _ in registered:
+                    self.accessions[key] = accession
+                self.cancelled.update(cancelled)
+                submission_accession, _ = self._accession("SUBMISSION")
+
+        receipt = Element(
+            "RECEIPT",
+            {
+                "receiptDate": datetime.now().astimezone().isoformat(),
+                "submissionFile": "submission.xml",
+                "success": "false" if errors else "true",
+            },
+        )
+        if not errors:
+            for (_, tag, alias), accession, secondary in registered:
+                element = SubElement(
+                    receipt,
+                    tag,
+                    {"accession": accession, "alias": alias, "status": "PRIVATE"},
+                )
+                if tag == "PROJECT" and hold_date:
+                    element.set("holdUntilDate", hold_date)
+                if secondary is not None:
+                    SubElement(
+                        element,
+                        "EXT_ID",
+                        {"accession": secondary[0], "type": secondary[1]},
+                    )
+            SubElement(
+                receipt,
+                "SUBMISSION",
+                {
+                    "accession": submission_accession,
+                    "alias": submission.get("alias")
+                    or f"SUBMISSION-{datetime.now():%d-%m-%Y-%H:%M:%S:%f}",
+                },
+            )
+
+        messages = SubElement(receipt, "MESSAGES")
+        for error in errors:
+            SubElement(messages, "ERROR").text = error
+        if not errors:
+            for target in cancelled:
+                SubElement(messages, "INFO").text = (
+                    f"The object {target} has been cancelled."
+                )
+            SubElement(messages, "INFO").text = "Submission has been committed."
+        SubElement(messages, "INFO").text = _TEST_MESSAGE
+
+        actions_element = SubElement(receipt, "ACTIONS")
+        actions_element.text = " ".join(action_names)
+
+        return tostring(receipt, encoding="UTF-8")
+
+    def _process_objects(
+        self, action: str, objects: List[Element], account: str, errors: List[str]
+    ) -> list:
+        registered = []
+        for element in objects:
+            tag, alias = element.tag, element.get("alias")
+            key = (account, tag, alias)
+            existing = self.accessions.get(key)
+            where = f'In {tag.lower()}, alias: "{alias}".'
+            if action == "ADD" and existing is not None:
+                errors.append(
+                    f"{where} The object being added already exists in the "
+                    f'submission account with accession: "{existing}".'
+                )
+            elif action == "MODIFY" and existing is None:
+                errors.append(
+                    f"{where} The object being modified does not exist in the "
+                    f"submission account."
+                )
+            elif action == "ADD":
+                registered.append((key, *self._accession(tag)))
+            else:
+                registered.append((key, existing, None))
+        return registered
+
+
+class _DropBoxHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with server.stats_lock:
+            server.stats["requests"] += 1
+
+        if self.path.split("?")[0] != SUBMIT_PATH:
+            return self._reply(404, b"Not Found", "text/plain")
+        if not self.headers.get("Authorization", "").startswith("Basic "):
+            return self._reply(401, b"Unauthorized", "text/plain")
+
+        documents = {}
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {self.headers.get('Content-Type', '')}\r\n\r\n".encode()
+            + body
+        )
+        if message.is_multipart():
+            for part in message.iter_parts():
+                name = part.get_param("name", header="content-disposition")
+                documents[name] = part.get_payload(decode=True)
+
+        n_objects = sum(
+            documents[tag].count(f"<{tag} ".encode())
+            for tag in _OBJECT_TAGS
+            if tag in documents
+        )
+        time.sleep(server.latency + server.latency_per_object * n_objects)
+
+        with server.stats_lock:
+            fail = server.random.random() < server.error_rate
+            if fail:
+                server.stats["errors"] += 1
+        if fail:
+            return self._reply(
+                server.error_status, b"Service Unavailable", "text/plain"
+            )
+
+        # objects are registered per account, i.e. per set of credentials
+        receipt = server.drop_box.submit(documents, self.headers["Authorization"])
+        self._reply(200, receipt, "application/xml")
+
+    def log_message(self, *args):
+        pass
+
+
+class DropBoxServer(ThreadingHTTPServer):
+    """
+    HTTP server standing in for the ENA drop-box.
+
+    Parameters
+    ----------
+    host : str, optional
+        Address the server listens on, by default "127.0.0.1".
+    port : int, optional
+        Port the server listens on, by default 0 (any free port).
+    latency : float, optional
+        Seconds every request is delayed by, by default 0.
+    latency_per_object : float, optional
+        Additional seconds every request is delayed by for every submitted
+        object, by default 0.
+    error_rate : float, optional
+        Fraction of the requests which fail with `error_status` (without
+        processing the submission), by default 0.
+    error_status : int, optional
+        HTTP status of the injected errors, by default 503.
+    seed : int, optional
+        Seed of the random number generator deciding which requests fail.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        latency_per_object: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        seed: Optional[int] = None,
+    ):
+        super().__init__((host, port), _DropBoxHandler)
+        self.drop_box = DropBox()
+        self.latency = latency
+        self.latency_per_object = latency_per_object
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.stats = {"requests": 0, "errors": 0}
+        self.stats_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{SUBMIT_PATH}"
+
+    def start(self) -> "DropBoxServer":
+        """Serve requests in a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving requests and close the server."""
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+
+    def __enter__(self) -> "DropBoxServer":
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(
+        description="Run a local stand-in for the ENA drop-box submission service."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--latency-per-object", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    server = DropBoxServer(
+        args.host,
+        args.port,
+        latency=args.latency,
+        latency_per_object=args.latency_per_object,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed,
+    )
+    print(f"Serving the ENA drop-box stand-in at {server.url}")
+    print(f"Point the plugin at it with: export ENA_SERVER_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
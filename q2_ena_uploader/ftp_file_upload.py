@@ -10,7 +10,6 @@ import os
 import time
 from typing import Tuple, Optional
 from urllib.parse import urlparse
-import socks
 import socket
 
 import pandas as pd
@@ -164,6 +163,9 @@ def setup_proxy():
         print(f"Proxy detected: {proxy_type} proxy at {proxy_host}:{proxy_port}")
 
     if proxy_host and proxy_port:
+        # only imported when a proxy is used
+        import socks
+
         print("Setting up proxy connection...")
         socks.set_default_proxy(socks.HTTP, proxy_host, proxy_port)
         socket.socket = socks.socksocket
@@ -5,12 +5,73 @@
 #
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
-from typing import List
-from xml.etree import ElementTree
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Tuple
 
 from typing_extensions import Self
 
 from q2_ena_uploader.metadata.library import Library
+from q2_ena_uploader.metadata.xml_backend import etree
+
+# Maximum number of distinct platform/library subtrees memoized while a set
+# is rendered - the least recently used subtrees are dropped first, and 0
+# disables the memo
+SHARED_SUBTREES_SIZE = 64
+
+SPECIAL_ATTRIBUTES = frozenset(
+    {
+        "title",
+        "study_ref",
+        "sample_description",
+        "platform",
+        "instrument_model",
+    }
+)
+
+
+def _platform_element(platform: str, instrument_model: str):
+    platform_el = etree.Element("PLATFORM")
+    platform_model = etree.SubElement(platform_el, platform.upper())
+    etree.SubElement(platform_model, "INSTRUMENT_MODEL").text = instrument_model
+    return platform_el
+
+
+def _library_element(library_attributes: Tuple[tuple, ...]):
+    return Library(**dict(library_attributes)).to_xml_element()
+
+
+def _shared_element(subtrees: Optional[OrderedDict], key: tuple, build, *args):
+    # subtrees shared by the experiments of one set are rendered only once -
+    # the memo lives as long as the rendering of the set, so that warnings
+    # are emitted again for every rendered document. With lxml, every reuse
+    # is a copy of the subtree (see XMLBackend.shared), which is still faster
+    # than building it anew (see benchmarks/bench_xml.py)
+    if subtrees is None or SHARED_SUBTREES_SIZE <= 0:
+        return build(*args)
+    if key in subtrees:
+        subtrees.move_to_end(key)
+    else:
+        subtrees[key] = build(*args)
+        if len(subtrees) > SHARED_SUBTREES_SIZE:
+            subtrees.popitem(last=False)
+    return etree.shared(subtrees[key])
+
+
+class _ExperimentColumns(NamedTuple):
+    """Column positions of an experiment TSV header, grouped by their role."""
+
+    special: Tuple[Tuple[int, str], ...]
+    library: Tuple[Tuple[int, str], ...]
+
+
+@lru_cache(maxsize=32)
+def _compile_header(header: Tuple[str, ...]) -> _ExperimentColumns:
+    special = tuple(
+        (i, k.strip()) for i, k in enumerate(header) if k.strip() in SPECIAL_ATTRIBUTES
+    )
+    library = tuple((i, k) for i, k in enumerate(header) if k.startswith("library"))
+    return _ExperimentColumns(special, library)
 
 
 class Experiment:
@@ -30,9 +91,9 @@ class Experiment:
         self.instrument_model = instrument_model
         self.library_attributes = library_attributes if library_attributes else {}
 
-    def to_xml_element(self):
+    def to_xml_element(self, subtrees: Optional[OrderedDict] = None):
         if self.sample_description:
-            root = ElementTree.Element(
+            root = etree.Element(
                 "EXPERIMENT", {"alias": "exp_" + str(self.sample_description)}
             )
         else:
@@ -41,19 +102,19 @@ class Experiment:
             )
 
         if self.title:
-            ElementTree.SubElement(root, "TITLE").text = str(self.title)
+            etree.SubElement(root, "TITLE").text = str(self.title)
 
         if self.study_ref:
-            _ = ElementTree.SubElement(root, "STUDY_REF", {"refname": self.study_ref})
+            _ = etree.SubElement(root, "STUDY_REF", {"refname": self.study_ref})
         else:
             raise ValueError(
                 "Study reference must be present for an metadata submission."
             )
 
-        design_element = ElementTree.SubElement(root, "DESIGN")
-        _ = ElementTree.SubElement(design_element, "DESIGN_DESCRIPTION")
+        design_element = etree.SubElement(root, "DESIGN")
+        _ = etree.SubElement(design_element, "DESIGN_DESCRIPTION")
 
-        _ = ElementTree.SubElement(
+        _ = etree.SubElement(
             design_element, "SAMPLE_DESCRIPTOR", {"refname": self.sample_description}
         )
 
@@ -64,13 +125,16 @@ class Experiment:
                     "a metadata submission."
                 )
             else:
-                platform_el = ElementTree.SubElement(root, "PLATFORM")
-                platform_model = ElementTree.SubElement(
-                    platform_el, self.platform.upper()
-                )
-                ElementTree.SubElement(platform_model, "INSTRUMENT_MODEL").text = (
-                    self.instrument_model
+                # the PLATFORM subtree is identical for all experiments sharing
+                # the same platform/instrument - it is rendered once and reused
+                platform_el = _shared_element(
+                    subtrees,
+                    ("PLATFORM", self.platform, self.instrument_model),
+                    _platform_element,
+                    self.platform,
+                    self.instrument_model,
                 )
+                root.append(platform_el)
         else:
             raise ValueError(
                 "Platform record must be present for an metadata submission."
@@ -86,29 +150,26 @@ class Experiment:
                 "Please provide values for all library descriptors."
             )
         else:
-            library_tree = Library(**self.library_attributes)
-            library_tree_element = library_tree.to_xml_element()
-            design_element.append(library_tree_element)
+            # library validation warnings are emitted only once per distinct
+            # combination of descriptors within a set, as the rendered element
+            # is reused
+            library_key = tuple(sorted(self.library_attributes.items()))
+            library_el = _shared_element(
+                subtrees, ("LIBRARY", library_key), _library_element, library_key
+            )
+            design_element.append(library_el)
 
         return root
 
     @classmethod
     def from_dict(cls, row_dict: dict) -> Self:
-        special_attributes = {
-            "title",
-            "study_ref",
-            "sample_description",
-            "platform",
-            "instrument_model",
-        }
-        kwargs = {
-            k.strip(): v.strip()
-            for k, v in row_dict.items()
-            if k.strip() in special_attributes
-        }
-        kwargs["library_attributes"] = {
-            k: v for k, v in row_dict.items() if k.startswith("library")
-        }
+        # column roles depend only on the header, so they are classified once
+        # per distinct header and then applied to every row by position
+        columns = _compile_header(tuple(row_dict))
+        values = tuple(row_dict.values())
+
+        kwargs = {k: values[i].strip() for i, k in columns.special}
+        kwargs["library_attributes"] = {k: values[i] for i, k in columns.library}
 
         return cls(**kwargs)
 
@@ -121,12 +182,13 @@ class ExperimentSet:
         self.experiments.append(experiment)
 
     def to_xml_element(self):
-        experiment_set_element = ElementTree.Element("EXPERIMENT_SET")
+        experiment_set_element = etree.Element("EXPERIMENT_SET")
+        subtrees = OrderedDict()
         for experiment in self.experiments:
-            experiment_element = experiment.to_xml_element()
+            experiment_element = experiment.to_xml_element(subtrees)
             experiment_set_element.append(experiment_element)
 
-        return ElementTree.ElementTree(experiment_set_element)
+        return etree.ElementTree(experiment_set_element)
 
     @classmethod
     def from_list(cls, inputs: List[dict]) -> Self:
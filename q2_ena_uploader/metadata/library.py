@@ -6,7 +6,8 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 import warnings
-from xml.etree import ElementTree
+
+from q2_ena_uploader.metadata.xml_backend import etree
 
 
 class Library:
@@ -34,26 +35,22 @@ class Library:
                 "Library strategy must be present for an metadata submission."
             )
         else:
-            root = ElementTree.Element("LIBRARY_DESCRIPTOR")
-            ElementTree.SubElement(root, "LIBRARY_STRATEGY").text = str(
-                self.library_strategy
-            )
+            root = etree.Element("LIBRARY_DESCRIPTOR")
+            etree.SubElement(root, "LIBRARY_STRATEGY").text = str(self.library_strategy)
 
         if self.library_source is None:
             raise ValueError(
                 "Library source must be present for an metadata submission."
             )
         else:
-            ElementTree.SubElement(root, "LIBRARY_SOURCE").text = str(
-                self.library_source
-            )
+            etree.SubElement(root, "LIBRARY_SOURCE").text = str(self.library_source)
 
         if self.library_selection is None:
             raise ValueError(
                 "Library selection must be present for an metadata submission."
             )
         else:
-            ElementTree.SubElement(root, "LIBRARY_SELECTION").text = str(
+            etree.SubElement(root, "LIBRARY_SELECTION").text = str(
                 self.library_selection
             )
 
@@ -69,7 +66,7 @@ class Library:
                     UserWarning,
                 )
 
-            library_layout_el = ElementTree.SubElement(root, "LIBRARY_LAYOUT")
+            library_layout_el = etree.SubElement(root, "LIBRARY_LAYOUT")
 
             if self.library_layout.lower() == "paired":
                 # Build attributes dict with optional nominal_length and nominal_sdev
@@ -79,12 +76,12 @@ class Library:
                 if self.nominal_sdev is not None:
                     paired_attrs["NOMINAL_SDEV"] = str(self.nominal_sdev)
 
-                ElementTree.SubElement(library_layout_el, "PAIRED", paired_attrs)
+                etree.SubElement(library_layout_el, "PAIRED", paired_attrs)
             else:
-                ElementTree.SubElement(library_layout_el, "SINGLE")
+                etree.SubElement(library_layout_el, "SINGLE")
 
         if self.library_construction_protocol is not None:
-            ElementTree.SubElement(root, "LIBRARY_CONSTRUCTION_PROTOCOL").text = str(
+            etree.SubElement(root, "LIBRARY_CONSTRUCTION_PROTOCOL").text = str(
                 self.library_construction_protocol
             )
 
@@ -0,0 +1,207 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+from collections import deque
+from functools import partial
+from typing import BinaryIO, Callable, Iterable, List, Optional, Type, Union
+
+from q2_ena_uploader.metadata.experiment import ExperimentSet
+from q2_ena_uploader.metadata.sample import SampleSet
+from q2_ena_uploader.metadata.xml_backend import etree
+
+# Number of shards created per worker process - more, smaller shards balance
+# the load better when rendering time differs between rows.
+SHARDS_PER_PROCESS = 4
+
+MetadataSet = Union[Type[SampleSet], Type[ExperimentSet]]
+
+
+def _render_shard(set_cls: MetadataSet, rows: List[dict], backend: str) -> bytes:
+    # make sure workers use the same XML backend as the parent process
+    etree.use(backend)
+    root = set_cls.from_list(rows).to_xml_element().getroot()
+    return b"".join(
+        etree.tostring(element, encoding="unicode").encode("utf-8") for element in root
+    )
+
+
+def render_set(
+    set_cls: MetadataSet,
+    rows: List[dict],
+    processes: int = 1,
+    file: Optional[BinaryIO] = None,
+) -> Optional[bytes]:
+    """
+    Render rows of a metadata TSV into a SAMPLE_SET/EXPERIMENT_SET document.
+
+    Parameters
+    ----------
+    set_cls : type
+        The set class used to render the rows (SampleSet or ExperimentSet).
+    rows : list of dict
+        Rows of the metadata TSV file.
+    processes : int, optional
+        Number of worker processes, by default 1. With more than one process
+        the rows are split into shards rendered in parallel and concatenated
+        in their original order - the output is identical to the serial one.
+    file : file-like, optional
+        Binary file the document is written to instead of being returned.
+
+    Returns
+    -------
+    bytes or None
+        The rendered XML document, or None if it was written to `file`.
+    """
+    if processes <= 1 or len(rows) < 2:
+        root = set_cls.from_list(rows).to_xml_element().getroot()
+        if file is None:
+            return etree.tostring(root, encoding="utf8", xml_declaration=True)
+        etree.write(root, file, encoding="utf8")
+        return None
+
+    # multiprocessing is only imported when rendering in parallel
+    from concurrent.futures import ProcessPoolExecutor
+
+    n_shards = min(len(rows), processes * SHARDS_PER_PROCESS)
+    shard_size = -(-len(rows) // n_shards)
+    shards = [rows[i : i + shard_size] for i in range(0, len(rows), shard_size)]
+
+    # the set elements carry no attributes, so their tags are written directly
+    tag = set_cls().to_xml_element().getroot().tag
+    chunks = [] if file is None else None
+    write = chunks.append if file is None else file.write
+
+    write(b"<?xml version='1.0' encoding='utf8'?>\n")
+    write(f"<{tag}>".encode("utf-8"))
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        # shards are written out as soon as they are ready (in order)
+        for fragment in executor.map(
+            _render_shard,
+            [set_cls] * len(shards),
+            shards,
+            [etree.name] * len(shards),
+        ):
+            write(fragment)
+    write(f"</{tag}>".encode("utf-8"))
+
+    return b"".join(chunks) if file is None else None
+
+
+def _render_file(
+    set_cls: MetadataSet,
+    read_rows: Callable[[str], List[dict]],
+    path: str,
+    backend: str,
+) -> bytes:
+    return _render_shard(set_cls, read_rows(path), backend)
+
+
+def _render_ordered(
+    set_cls: MetadataSet,
+    render: Callable[..., bytes],
+    items: Iterable,
+    processes: int,
+    file: Optional[BinaryIO],
+) -> Optional[bytes]:
+    # renders every item into a fragment of the set document - in parallel,
+    # with at most two items per process submitted ahead of the one written
+    tag = set_cls().to_xml_element().getroot().tag
+    chunks = [] if file is None else None
+    write = chunks.append if file is None else file.write
+
+    write(b"<?xml version='1.0' encoding='utf8'?>\n")
+    write(f"<{tag}>".encode("utf-8"))
+    if processes <= 1:
+        for item in items:
+            write(render(item, etree.name))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            pending = deque()
+            for item in items:
+                pending.append(executor.submit(render, item, etree.name))
+                if len(pending) >= 2 * processes:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+    write(f"</{tag}>".encode("utf-8"))
+
+    return b"".join(chunks) if file is None else None
+
+
+def render_batches(
+    set_cls: MetadataSet,
+    batches: Iterable[List[dict]],
+    processes: int = 1,
+    file: Optional[BinaryIO] = None,
+) -> Optional[bytes]:
+    """
+    Render rows read in batches into a SAMPLE_SET/EXPERIMENT_SET document.
+
+    Unlike `render_set`, the rows do not need to be held in memory all at
+    once - batches are only read from the iterable as they are rendered.
+
+    Parameters
+    ----------
+    set_cls : type
+        The set class used to render the rows (SampleSet or ExperimentSet).
+    batches : iterable of list of dict
+        Consecutive batches of rows of the metadata table.
+    processes : int, optional
+        Number of worker processes, by default 1. With more than one process
+        the batches are rendered in parallel and written in their original
+        order, at most two batches per process being read ahead.
+    file : file-like, optional
+        Binary file the document is written to instead of being returned.
+
+    Returns
+    -------
+    bytes or None
+        The rendered XML document, or None if it was written to `file`.
+    """
+    return _render_ordered(
+        set_cls, partial(_render_shard, set_cls), batches, processes, file
+    )
+
+
+def render_files(
+    set_cls: MetadataSet,
+    paths: List[str],
+    read_rows: Callable[[str], List[dict]],
+    processes: int = 1,
+    file: Optional[BinaryIO] = None,
+) -> Optional[bytes]:
+    """
+    Render the rows of several metadata files into a single set document.
+
+    With more than one process, every file is both read and rendered by a
+    worker process, so that only the rendered fragments are sent back to
+    the parent process.
+
+    Parameters
+    ----------
+    set_cls : type
+        The set class used to render the rows (SampleSet or ExperimentSet).
+    paths : list of str
+        Paths to the metadata files, in the order of their rows.
+    read_rows : callable
+        Function reading the rows of a file from its path - it needs to be
+        defined at the top level of a module to be used by worker processes.
+    processes : int, optional
+        Number of worker processes, by default 1.
+    file : file-like, optional
+        Binary file the document is written to instead of being returned.
+
+    Returns
+    -------
+    bytes or None
+        The rendered XML document, or None if it was written to `file`.
+    """
+    return _render_ordered(
+        set_cls, partial(_render_file, set_cls, read_rows), paths, processes, file
+    )
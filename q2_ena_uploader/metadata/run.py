@@ -5,7 +5,7 @@
 #
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
-from xml.etree import ElementTree
+from q2_ena_uploader.metadata.xml_backend import etree
 
 
 class Run:
@@ -15,13 +15,13 @@ class Run:
         self.files = files if files is not None else {}
 
     def to_xml_element(self):
-        run_element = ElementTree.Element("RUN", {"alias": self.alias})
-        ElementTree.SubElement(run_element, "EXPERIMENT_REF", {"refname": self.refname})
-        data_block = ElementTree.SubElement(run_element, "DATA_BLOCK")
-        files_element = ElementTree.SubElement(data_block, "FILES")
+        run_element = etree.Element("RUN", {"alias": self.alias})
+        etree.SubElement(run_element, "EXPERIMENT_REF", {"refname": self.refname})
+        data_block = etree.SubElement(run_element, "DATA_BLOCK")
+        files_element = etree.SubElement(data_block, "FILES")
 
         for filename, checksum in zip(self.files["filename"], self.files["checksum"]):
-            ElementTree.SubElement(
+            etree.SubElement(
                 files_element,
                 "FILE",
                 {
@@ -32,22 +32,21 @@ class Run:
                 },
             )
 
-        ElementTree.ElementTree(run_element)
+        etree.ElementTree(run_element)
         return run_element
 
 
-def _run_set_from_dict(row_dict) -> bytes:
-    run_set_root = ElementTree.Element("RUN_SET")
-    kwargs = {}
-    xml_bytes = None
+def _run_set_from_dict(row_dict, file=None) -> bytes:
+    run_set_root = etree.Element("RUN_SET")
     for alias in row_dict:
-        kwargs["alias"] = "run_" + alias
-        kwargs["refname"] = "exp_" + alias
-        kwargs["files"] = row_dict[alias]
-        run_element = Run(**kwargs)
-        run_set_root.append(run_element.to_xml_element())
-        xml_bytes = ElementTree.tostring(
-            run_set_root, encoding="utf-8", xml_declaration=True
+        run_element = Run(
+            alias="run_" + alias, refname="exp_" + alias, files=row_dict[alias]
         )
+        run_set_root.append(run_element.to_xml_element())
 
-    return xml_bytes
+    if not row_dict:
+        return None
+    if file is not None:
+        etree.write(run_set_root, file, encoding="utf-8")
+        return None
+    return etree.tostring(run_set_root, encoding="utf-8", xml_declaration=True)
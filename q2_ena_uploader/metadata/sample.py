@@ -5,11 +5,131 @@
 #
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
-import xml.etree.ElementTree as ET
-from typing import List
+from array import array
+from functools import lru_cache
+from typing import Iterable, Iterator, List, NamedTuple, Tuple
 
 from typing_extensions import Self
 
+from q2_ena_uploader.metadata.xml_backend import etree
+
+SPECIAL_ATTRIBUTES = frozenset(
+    {
+        "alias",
+        "center_name",
+        "title",
+        "taxon_id",
+        "scientific_name",
+        "common_name",
+        "description",
+    }
+)
+
+
+class _SampleColumns(NamedTuple):
+    """Column positions of a sample TSV header, grouped by their role."""
+
+    special: Tuple[Tuple[int, str], ...]
+    url_links: Tuple[int, ...]
+    xref_links: Tuple[int, ...]
+    attributes: Tuple[Tuple[int, str], ...]
+
+
+@lru_cache(maxsize=32)
+def _compile_header(header: Tuple[str, ...]) -> _SampleColumns:
+    special, url_links, xref_links, attributes = [], [], [], []
+    for i, k in enumerate(header):
+        if k.strip() in SPECIAL_ATTRIBUTES:
+            special.append((i, k.strip()))
+        if k.startswith("url_link"):
+            url_links.append(i)
+        if k.startswith("xref_link"):
+            xref_links.append(i)
+        if (
+            k not in SPECIAL_ATTRIBUTES
+            and not k.startswith("url")
+            and not k.startswith("xref")
+        ):
+            attributes.append((i, k))
+    return _SampleColumns(
+        tuple(special),
+        tuple(url_links),
+        tuple(xref_links),
+        tuple(attributes),
+    )
+
+
+def _sample_element(
+    alias,
+    center_name,
+    title,
+    taxon_id,
+    scientific_name,
+    common_name,
+    description,
+    url_links,
+    xref_links,
+    attributes: Iterable[Tuple[str, str]],
+):
+    if alias is None:
+        raise ValueError("Sample alias must have a value for a sample submission.")
+    elif center_name is None:
+        sample_element = etree.Element("SAMPLE", {"alias": alias})
+    else:
+        sample_element = etree.Element(
+            "SAMPLE", {"alias": alias, "center_name": center_name}
+        )
+
+    if title is not None:
+        etree.SubElement(sample_element, "TITLE").text = title
+
+    if taxon_id is None:
+        raise ValueError("Sample taxon id must have a value for a sample submission.")
+    else:
+        sample_name_element = etree.SubElement(sample_element, "SAMPLE_NAME")
+        etree.SubElement(sample_name_element, "TAXON_ID").text = taxon_id
+        if scientific_name is not None:
+            etree.SubElement(sample_name_element, "SCIENTIFIC_NAME").text = (
+                scientific_name
+            )
+        if common_name is not None:
+            etree.SubElement(sample_name_element, "COMMON_NAME").text = common_name
+
+    if description is not None:
+        etree.SubElement(sample_element, "DESCRIPTION").text = description
+
+    if len(url_links) > 0 or len(xref_links) > 0:
+        links_element = etree.SubElement(sample_element, "SAMPLE_LINKS")
+        if len(url_links) > 0:
+            for link in url_links:
+                project_link_element = etree.SubElement(links_element, "SAMPLE_LINK")
+                url_link_element = etree.SubElement(project_link_element, "URL_LINK")
+                label, url = link.split("|")
+                etree.SubElement(url_link_element, "LABEL").text = label
+                etree.SubElement(url_link_element, "URL").text = url
+        if len(xref_links) > 0:
+            for link in xref_links:
+                project_link_element = etree.SubElement(links_element, "SAMPLE_LINK")
+                xref_link_element = etree.SubElement(project_link_element, "XREF_LINK")
+                db, id = link.split("|")
+                etree.SubElement(xref_link_element, "DB").text = db
+                etree.SubElement(xref_link_element, "ID").text = id
+
+    sample_atts_element = None
+    for k, v in attributes:
+        if sample_atts_element is None:
+            sample_atts_element = etree.SubElement(sample_element, "SAMPLE_ATTRIBUTES")
+        att_element = etree.SubElement(sample_atts_element, "SAMPLE_ATTRIBUTE")
+        etree.SubElement(att_element, "TAG").text = k
+        if "|" not in str(v):
+            etree.SubElement(att_element, "VALUE").text = v
+        else:
+            value, units = v.split("|")
+            etree.SubElement(att_element, "VALUE").text = value
+            etree.SubElement(att_element, "UNITS").text = units
+
+    return sample_element
+
 
 class Sample:
     def __init__(
@@ -37,118 +157,179 @@ class Sample:
         self.attributes = attributes
 
     def to_xml_element(self):
-        if self.alias is None:
-            raise ValueError("Sample alias must have a value for a sample submission.")
-        elif self.center_name is None:
-            sample_element = ET.Element("SAMPLE", {"alias": self.alias})
-        else:
-            sample_element = ET.Element(
-                "SAMPLE", {"alias": self.alias, "center_name": self.center_name}
-            )
-
-        if self.title is not None:
-            ET.SubElement(sample_element, "TITLE").text = self.title
-
-        if self.taxon_id is None:
-            raise ValueError(
-                "Sample taxon id must have a value for a sample submission."
-            )
-        else:
-            sample_name_element = ET.SubElement(sample_element, "SAMPLE_NAME")
-            ET.SubElement(sample_name_element, "TAXON_ID").text = self.taxon_id
-            if self.scientific_name is not None:
-                ET.SubElement(sample_name_element, "SCIENTIFIC_NAME").text = (
-                    self.scientific_name
-                )
-            if self.common_name is not None:
-                ET.SubElement(sample_name_element, "COMMON_NAME").text = (
-                    self.common_name
-                )
-
-        if self.description is not None:
-            ET.SubElement(sample_element, "DESCRIPTION").text = self.description
-
-        if len(self.url_links) > 0 or len(self.xref_links) > 0:
-            links_element = ET.SubElement(sample_element, "SAMPLE_LINKS")
-            if len(self.url_links) > 0:
-                for link in self.url_links:
-                    project_link_element = ET.SubElement(links_element, "SAMPLE_LINK")
-                    url_link_element = ET.SubElement(project_link_element, "URL_LINK")
-                    label, url = link.split("|")
-                    ET.SubElement(url_link_element, "LABEL").text = label
-                    ET.SubElement(url_link_element, "URL").text = url
-            if len(self.xref_links) > 0:
-                for link in self.xref_links:
-                    project_link_element = ET.SubElement(links_element, "SAMPLE_LINK")
-                    xref_link_element = ET.SubElement(project_link_element, "XREF_LINK")
-                    db, id = link.split("|")
-                    ET.SubElement(xref_link_element, "DB").text = db
-                    ET.SubElement(xref_link_element, "ID").text = id
-
-        if len(self.attributes) > 0:
-            sample_atts_element = ET.SubElement(sample_element, "SAMPLE_ATTRIBUTES")
-            for k, v in self.attributes.items():
-                att_element = ET.SubElement(sample_atts_element, "SAMPLE_ATTRIBUTE")
-                ET.SubElement(att_element, "TAG").text = k
-                if "|" not in str(v):
-                    ET.SubElement(att_element, "VALUE").text = v
-                else:
-                    value, units = v.split("|")
-                    ET.SubElement(att_element, "VALUE").text = value
-                    ET.SubElement(att_element, "UNITS").text = units
-
-        return sample_element
+        return _sample_element(
+            self.alias,
+            self.center_name,
+            self.title,
+            self.taxon_id,
+            self.scientific_name,
+            self.common_name,
+            self.description,
+            self.url_links,
+            self.xref_links,
+            self.attributes.items(),
+        )
 
     @classmethod
     def from_dict(cls, row_dict: dict) -> Self:
-        special_attributes = {
-            "alias",
-            "center_name",
-            "title",
-            "taxon_id",
-            "scientific_name",
-            "common_name",
-            "description",
-        }
-        kwargs = {
-            k.strip(): v.strip()
-            for k, v in row_dict.items()
-            if k.strip() in special_attributes
-        }
-        kwargs["url_links"] = [
-            v for k, v in row_dict.items() if k.startswith("url_link")
-        ]
-        kwargs["xref_links"] = [
-            v for k, v in row_dict.items() if k.startswith("xref_link")
-        ]
-        kwargs["attributes"] = {
-            k: v
-            for k, v in row_dict.items()
-            if k not in special_attributes
-            and not k.startswith("url")
-            and not k.startswith("xref")
-        }
+        # column roles depend only on the header, so they are classified once
+        # per distinct header and then applied to every row by position
+        columns = _compile_header(tuple(row_dict))
+        values = tuple(row_dict.values())
+
+        kwargs = {k: values[i].strip() for i, k in columns.special}
+        kwargs["url_links"] = [values[i] for i in columns.url_links]
+        kwargs["xref_links"] = [values[i] for i in columns.xref_links]
+        kwargs["attributes"] = {k: values[i] for i, k in columns.attributes}
         return cls(**kwargs)
 
 
+class _Column:
+    """
+    A single table column stored as one integer code per row.
+
+    Codes index into the list of distinct values seen in the column, so that
+    values repeated across rows (typical for checklist fields) are held only
+    once. Code 0 is reserved for missing values.
+    """
+
+    def __init__(self, n_rows: int = 0):
+        self.values = [None]
+        self._codes_by_value = {None: 0}
+        self.codes = array("I", [0]) * n_rows
+
+    def append(self, value):
+        code = self._codes_by_value.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self._codes_by_value[value] = code
+        self.codes.append(code)
+
+    def __getitem__(self, row: int):
+        return self.values[self.codes[row]]
+
+
+class SampleTable:
+    """
+    Columnar representation of a set of samples.
+
+    Every sample field and every sample attribute is kept in its own
+    categorical column instead of one Sample object (with its own dicts and
+    lists) per row. The order in which attributes appear for every sample is
+    itself stored as a categorical column, so that XML rendered from the
+    table is identical to rendering the individual samples.
+    """
+
+    FIELDS = (
+        "alias",
+        "center_name",
+        "title",
+        "taxon_id",
+        "scientific_name",
+        "common_name",
+        "description",
+        "url_links",
+        "xref_links",
+    )
+
+    def __init__(self):
+        self.n_rows = 0
+        self.fields = {name: _Column() for name in self.FIELDS}
+        self.attributes = {}
+        self._attribute_order = _Column()
+
+    def __len__(self):
+        return self.n_rows
+
+    def _append(self, fields: dict, attributes: Iterable[Tuple[str, str]]):
+        for name, column in self.fields.items():
+            column.append(fields.get(name))
+
+        names = []
+        for k, v in attributes:
+            column = self.attributes.get(k)
+            if column is None:
+                column = self.attributes[k] = _Column(self.n_rows)
+            column.append(v)
+            names.append(k)
+
+        # keep all attribute columns aligned - absent attributes are missing
+        for column in self.attributes.values():
+            if len(column.codes) == self.n_rows:
+                column.codes.append(0)
+
+        self._attribute_order.append(tuple(names))
+        self.n_rows += 1
+
+    def add_row(self, row_dict: dict):
+        """Append one TSV row, classified the same way as Sample.from_dict."""
+        columns = _compile_header(tuple(row_dict))
+        values = tuple(row_dict.values())
+
+        fields = {k: values[i].strip() for i, k in columns.special}
+        fields["url_links"] = tuple(values[i] for i in columns.url_links)
+        fields["xref_links"] = tuple(values[i] for i in columns.xref_links)
+        self._append(fields, ((k, values[i]) for i, k in columns.attributes))
+
+    def add_sample(self, sample: Sample):
+        fields = {
+            name: getattr(sample, name)
+            for name in self.FIELDS
+            if name not in ("url_links", "xref_links")
+        }
+        fields["url_links"] = tuple(sample.url_links)
+        fields["xref_links"] = tuple(sample.xref_links)
+        self._append(fields, sample.attributes.items())
+
+    def _row_attributes(self, row: int) -> Iterator[Tuple[str, str]]:
+        for k in self._attribute_order[row]:
+            yield k, self.attributes[k][row]
+
+    def sample(self, row: int) -> Sample:
+        """Materialize a single row as a Sample object."""
+        kwargs = {name: column[row] for name, column in self.fields.items()}
+        kwargs["url_links"] = list(kwargs["url_links"])
+        kwargs["xref_links"] = list(kwargs["xref_links"])
+        kwargs["attributes"] = dict(self._row_attributes(row))
+        return Sample(**kwargs)
+
+    def to_xml_elements(self) -> Iterator:
+        fields = [self.fields[name] for name in self.FIELDS]
+        for row in range(self.n_rows):
+            yield _sample_element(
+                *(column[row] for column in fields), self._row_attributes(row)
+            )
+
+
 class SampleSet:
     def __init__(self):
-        self.samples = []
+        self.table = SampleTable()
+
+    @property
+    def samples(self) -> Tuple[Sample, ...]:
+        """
+        Read-only snapshot of the samples of the set.
+
+        The samples are stored as table rows and materialized on access, so
+        changes to the returned objects are not reflected in the set - use
+        `add_sample` to add samples.
+        """
+        return tuple(self.table.sample(row) for row in range(len(self.table)))
 
     def add_sample(self, sample):
-        self.samples.append(sample)
+        self.table.add_sample(sample)
 
     def to_xml_element(self):
-        sample_set_element = ET.Element("SAMPLE_SET")
-        for sample in self.samples:
-            sample_element = sample.to_xml_element()
+        sample_set_element = etree.Element("SAMPLE_SET")
+        for sample_element in self.table.to_xml_elements():
             sample_set_element.append(sample_element)
 
-        return ET.ElementTree(sample_set_element)
+        return etree.ElementTree(sample_set_element)
 
     @classmethod
     def from_list(cls, inputs: List[dict]) -> Self:
         sample_set = SampleSet()
         for row_dict in inputs:
-            sample_set.add_sample(Sample.from_dict(row_dict))
+            sample_set.table.add_row(row_dict)
         return sample_set
@@ -5,10 +5,44 @@
 #
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
-import xml.etree.ElementTree as ET
+from functools import lru_cache
+from typing import NamedTuple, Tuple
 
 from typing_extensions import Self
 
+from q2_ena_uploader.metadata.xml_backend import etree
+
+SPECIAL_ATTRIBUTES = frozenset({"alias", "title", "center_name", "name", "description"})
+
+
+class _StudyColumns(NamedTuple):
+    """Positions of the study TSV keys, grouped by their role."""
+
+    special: Tuple[Tuple[int, str], ...]
+    collaborators: Tuple[int, ...]
+    attributes: Tuple[int, ...]
+    url_links: Tuple[int, ...]
+    xref_links: Tuple[int, ...]
+
+
+def _positions(header: Tuple[str, ...], prefix: str) -> Tuple[int, ...]:
+    return tuple(i for i, k in enumerate(header) if k.startswith(prefix))
+
+
+@lru_cache(maxsize=32)
+def _compile_header(header: Tuple[str, ...]) -> _StudyColumns:
+    return _StudyColumns(
+        special=tuple(
+            (i, k.strip())
+            for i, k in enumerate(header)
+            if k.strip() in SPECIAL_ATTRIBUTES
+        ),
+        collaborators=_positions(header, "collaborator"),
+        attributes=_positions(header, "project_attribute"),
+        url_links=_positions(header, "url_link"),
+        xref_links=_positions(header, "xref_link"),
+    )
+
 
 class Study:
     def __init__(
@@ -35,83 +69,81 @@ class Study:
 
     def to_xml_element(self):
 
-        root = ET.Element("PROJECT_SET")
+        root = etree.Element("PROJECT_SET")
         if self.alias is None:
             raise ValueError("Study alias must have a value for a study submission.")
         elif self.center_name is None:
-            study_element = ET.SubElement(root, "PROJECT", {"alias": self.alias})
+            study_element = etree.SubElement(root, "PROJECT", {"alias": self.alias})
         else:
-            study_element = ET.SubElement(
+            study_element = etree.SubElement(
                 root, "PROJECT", {"alias": self.alias, "center_name": self.center_name}
             )
 
         if self.name is not None:
-            ET.SubElement(study_element, "NAME").text = str(self.name)
+            etree.SubElement(study_element, "NAME").text = str(self.name)
 
         if self.title is None:
             raise ValueError("Study title must have a value for a study submission.")
         else:
-            ET.SubElement(study_element, "TITLE").text = str(self.title)
+            etree.SubElement(study_element, "TITLE").text = str(self.title)
 
         if self.description is not None:
-            ET.SubElement(study_element, "DESCRIPTION").text = str(self.description)
+            etree.SubElement(study_element, "DESCRIPTION").text = str(self.description)
 
         if len(self.collaborators) > 0:
-            collaborators_element = ET.SubElement(study_element, "COLLABORATORS")
+            collaborators_element = etree.SubElement(study_element, "COLLABORATORS")
             for el in self.collaborators:
-                ET.SubElement(collaborators_element, "COLLABORATOR").text = str(el)
+                etree.SubElement(collaborators_element, "COLLABORATOR").text = str(el)
 
-        submission_element = ET.SubElement(study_element, "SUBMISSION_PROJECT")
-        ET.SubElement(submission_element, "SEQUENCING_PROJECT")
+        submission_element = etree.SubElement(study_element, "SUBMISSION_PROJECT")
+        etree.SubElement(submission_element, "SEQUENCING_PROJECT")
 
         if len(self.url_links) > 0 or len(self.xref_links) > 0:
-            links_element = ET.SubElement(study_element, "PROJECT_LINKS")
+            links_element = etree.SubElement(study_element, "PROJECT_LINKS")
             if len(self.url_links) > 0:
                 for link in self.url_links:
-                    project_link_element = ET.SubElement(links_element, "PROJECT_LINK")
-                    url_link_element = ET.SubElement(project_link_element, "URL_LINK")
+                    project_link_element = etree.SubElement(
+                        links_element, "PROJECT_LINK"
+                    )
+                    url_link_element = etree.SubElement(
+                        project_link_element, "URL_LINK"
+                    )
                     label, url = link.split("|")
-                    ET.SubElement(url_link_element, "LABEL").text = label
-                    ET.SubElement(url_link_element, "URL").text = url
+                    etree.SubElement(url_link_element, "LABEL").text = label
+                    etree.SubElement(url_link_element, "URL").text = url
             if len(self.xref_links) > 0:
                 for link in self.xref_links:
-                    project_link_element = ET.SubElement(links_element, "PROJECT_LINK")
-                    xref_link_element = ET.SubElement(project_link_element, "XREF_LINK")
+                    project_link_element = etree.SubElement(
+                        links_element, "PROJECT_LINK"
+                    )
+                    xref_link_element = etree.SubElement(
+                        project_link_element, "XREF_LINK"
+                    )
                     db, id = link.split("|")
-                    ET.SubElement(xref_link_element, "DB").text = db
-                    ET.SubElement(xref_link_element, "ID").text = id
+                    etree.SubElement(xref_link_element, "DB").text = db
+                    etree.SubElement(xref_link_element, "ID").text = id
 
         if len(self.attributes) > 0:
-            attributes_element = ET.SubElement(study_element, "PROJECT_ATTRIBUTES")
+            attributes_element = etree.SubElement(study_element, "PROJECT_ATTRIBUTES")
             for el in self.attributes:
                 tag, value = el.split("|")
-                attribute_element = ET.SubElement(
+                attribute_element = etree.SubElement(
                     attributes_element, "PROJECT_ATTRIBUTE"
                 )
-                ET.SubElement(attribute_element, "TAG").text = tag
-                ET.SubElement(attribute_element, "VALUE").text = value
+                etree.SubElement(attribute_element, "TAG").text = tag
+                etree.SubElement(attribute_element, "VALUE").text = value
 
-        tree = ET.ElementTree(root)
+        tree = etree.ElementTree(root)
         return tree
 
     @classmethod
     def from_dict(cls, row_dict: dict) -> Self:
-        special_attributes = {"alias", "title", "center_name", "name", "description"}
-        kwargs = {
-            k.strip(): v.strip()
-            for k, v in row_dict.items()
-            if k.strip() in special_attributes
-        }
-        kwargs["collaborators"] = [
-            v for k, v in row_dict.items() if k.startswith("collaborator")
-        ]
-        kwargs["attributes"] = [
-            v for k, v in row_dict.items() if k.startswith("project_attribute")
-        ]
-        kwargs["url_links"] = [
-            v for k, v in row_dict.items() if k.startswith("url_link")
-        ]
-        kwargs["xref_links"] = [
-            v for k, v in row_dict.items() if k.startswith("xref_link")
-        ]
+        columns = _compile_header(tuple(row_dict))
+        values = tuple(row_dict.values())
+
+        kwargs = {k: values[i].strip() for i, k in columns.special}
+        kwargs["collaborators"] = [values[i] for i in columns.collaborators]
+        kwargs["attributes"] = [values[i] for i in columns.attributes]
+        kwargs["url_links"] = [values[i] for i in columns.url_links]
+        kwargs["xref_links"] = [values[i] for i in columns.xref_links]
         return Study(**kwargs)
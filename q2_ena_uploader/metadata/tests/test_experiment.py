@@ -7,11 +7,19 @@
 # ----------------------------------------------------------------------------
 import csv
 import unittest
+import warnings
 import xml.etree.ElementTree as ET
+from unittest.mock import patch
 
 from qiime2.plugin.testing import TestPluginBase
 
-from q2_ena_uploader.metadata.experiment import Experiment, ExperimentSet
+from q2_ena_uploader.metadata.experiment import (
+    Experiment,
+    ExperimentSet,
+    _library_element,
+    _platform_element,
+)
+from q2_ena_uploader.metadata.xml_backend import etree
 from q2_ena_uploader.metadata.tests.test_utils import (
     CustomAssertions,
 )
@@ -207,6 +215,97 @@ class TestExperiment(TestPluginBase, CustomAssertions):
         ):
             experiment.to_xml_element()
 
+    def test_experiment_shared_subtrees_are_reused(self):
+        """Test that identical platform/library subtrees are rendered once."""
+        row1 = self.tsv_data[0].copy()
+        row2 = self.tsv_data[0].copy()
+        row2["sample_description"] = "sample_description2"
+
+        module = "q2_ena_uploader.metadata.experiment"
+        with patch(
+            f"{module}._platform_element", wraps=_platform_element
+        ) as mock_platform, patch(
+            f"{module}._library_element", wraps=_library_element
+        ) as mock_library:
+            xml = ExperimentSet.from_list([row1, row2]).to_xml_element().getroot()
+
+        self.assertEqual(mock_platform.call_count, 1)
+        self.assertEqual(mock_library.call_count, 1)
+        xml1, xml2 = list(xml)
+        for path in ("PLATFORM", "DESIGN/LIBRARY_DESCRIPTOR"):
+            self.assertEqual(
+                etree.tostring(xml1.find(path)), etree.tostring(xml2.find(path))
+            )
+        self.assertEqual(
+            xml2.find("DESIGN/SAMPLE_DESCRIPTOR").attrib["refname"],
+            "sample_description2",
+        )
+
+    def test_experiment_shared_subtrees_bounded(self):
+        """Test that only a limited number of subtrees is memoized."""
+        strategies = ["WGS", "AMPLICON", "RNA-Seq", "WGS"]
+        rows = []
+        for i, strategy in enumerate(strategies):
+            row = self.tsv_data[0].copy()
+            row["sample_description"] = f"sample{i}"
+            row["library_strategy"] = strategy
+            rows.append(row)
+
+        module = "q2_ena_uploader.metadata.experiment"
+        with patch(f"{module}.SHARED_SUBTREES_SIZE", 2), patch(
+            f"{module}._library_element", wraps=_library_element
+        ) as mock_library:
+            xml = ExperimentSet.from_list(rows).to_xml_element().getroot()
+
+        # the first library was dropped before it was used again
+        self.assertEqual(mock_library.call_count, 4)
+        self.assertEqual(
+            [el.find("DESIGN/LIBRARY_DESCRIPTOR/LIBRARY_STRATEGY").text for el in xml],
+            strategies,
+        )
+
+    def test_experiment_distinct_library_subtrees(self):
+        """Test that different library descriptors are rendered separately."""
+        row1 = self.tsv_data[0].copy()
+        row2 = self.tsv_data[0].copy()
+        row2["library_strategy"] = "AMPLICON"
+
+        xml1 = Experiment.from_dict(row1).to_xml_element()
+        xml2 = Experiment.from_dict(row2).to_xml_element()
+
+        lib1 = xml1.find("DESIGN/LIBRARY_DESCRIPTOR")
+        lib2 = xml2.find("DESIGN/LIBRARY_DESCRIPTOR")
+        self.assertIsNot(lib1, lib2)
+        self.assertEqual(lib1.find("LIBRARY_STRATEGY").text, "WGS")
+        self.assertEqual(lib2.find("LIBRARY_STRATEGY").text, "AMPLICON")
+
+    def test_experiment_library_warning_once_per_combination(self):
+        """Test that library warnings fire once per distinct descriptor set."""
+        rows = []
+        for i in range(3):
+            row = self.tsv_data[0].copy()
+            row["sample_description"] = f"sample{i}"
+            row["library_nominal_sdev"] = "10"
+            del row["library_nominal_length"]
+            rows.append(row)
+
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter("always")
+            ExperimentSet.from_list(rows).to_xml_element()
+
+        sdev_warnings = [x for x in w if "Nominal_sdev" in str(x.message)]
+        self.assertEqual(len(sdev_warnings), 1)
+
+    def test_experiment_library_warning_every_set(self):
+        """Test that library warnings fire again for every rendered set."""
+        row = self.tsv_data[0].copy()
+        row["library_nominal_sdev"] = "10"
+        del row["library_nominal_length"]
+
+        for _ in range(2):
+            with self.assertWarnsRegex(UserWarning, "Nominal_sdev"):
+                ExperimentSet.from_list([row]).to_xml_element()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,129 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import csv
+import unittest
+from io import BytesIO
+from unittest.mock import MagicMock
+from xml.etree import ElementTree
+
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_ena_uploader.metadata.experiment import ExperimentSet
+from q2_ena_uploader.metadata.render import render_batches, render_set
+from q2_ena_uploader.metadata.sample import SampleSet
+
+
+class TestRenderSet(TestPluginBase):
+    """Test serial and parallel rendering of metadata sets."""
+
+    package = "q2_ena_uploader.metadata.tests"
+
+    def _read_rows(self, filename):
+        with open(self.get_data_path(filename), "r") as tsv_file:
+            return list(csv.DictReader(tsv_file, delimiter="\t"))
+
+    def setUp(self):
+        super().setUp()
+        self.sample_rows = self._read_rows("sample/test_sample2.tsv")
+        self.experiment_rows = self._read_rows("experiment/test_experiment1.tsv")
+
+    def test_render_serial(self):
+        """Test that serial rendering serializes the whole set document."""
+        expected = ElementTree.tostring(
+            SampleSet.from_list(self.sample_rows).to_xml_element().getroot(),
+            encoding="utf8",
+        )
+        self.assertEqual(render_set(SampleSet, self.sample_rows), expected)
+
+    def test_render_parallel_samples_identical(self):
+        """Test that parallel sample rendering matches the serial output."""
+        rows = self.sample_rows * 10
+        self.assertEqual(
+            render_set(SampleSet, rows, processes=2),
+            render_set(SampleSet, rows, processes=1),
+        )
+
+    def test_render_parallel_experiments_identical(self):
+        """Test that parallel experiment rendering matches the serial output."""
+        rows = self.experiment_rows * 10
+        self.assertEqual(
+            render_set(ExperimentSet, rows, processes=2),
+            render_set(ExperimentSet, rows, processes=1),
+        )
+
+    def test_render_parallel_empty(self):
+        """Test that an empty set is rendered identically."""
+        self.assertEqual(
+            render_set(SampleSet, [], processes=2),
+            render_set(SampleSet, [], processes=1),
+        )
+
+    def test_render_to_file(self):
+        """Test that a document written to a file matches the returned one."""
+        rows = self.sample_rows * 10
+        for processes in (1, 2):
+            with self.subTest(processes=processes):
+                file = BytesIO()
+                result = render_set(SampleSet, rows, processes, file=file)
+
+                self.assertIsNone(result)
+                self.assertEqual(
+                    file.getvalue(), render_set(SampleSet, rows, processes)
+                )
+
+    def test_render_parallel_error(self):
+        """Test that errors raised while rendering a shard are propagated."""
+        rows = self.sample_rows * 4
+        rows[-1] = {k: v for k, v in rows[-1].items() if k != "taxon_id"}
+
+        with self.assertRaisesRegex(ValueError, "Sample taxon id must have a value"):
+            render_set(SampleSet, rows, processes=2)
+
+    def test_render_batches_identical(self):
+        """Test that batches are rendered like the whole set."""
+        rows = self.sample_rows * 10
+        batches = [rows[i : i + 3] for i in range(0, len(rows), 3)]
+        for processes in (1, 2):
+            with self.subTest(processes=processes):
+                self.assertEqual(
+                    render_batches(SampleSet, iter(batches), processes),
+                    render_set(SampleSet, rows, processes),
+                )
+
+    def test_render_batches_to_file(self):
+        """Test that batches can be rendered into a file."""
+        rows = self.experiment_rows * 5
+        file = BytesIO()
+
+        result = render_batches(ExperimentSet, [rows[:4], rows[4:]], file=file)
+
+        self.assertIsNone(result)
+        self.assertEqual(file.getvalue(), render_set(ExperimentSet, rows, 2))
+
+    def test_render_batches_lazily(self):
+        """Test that batches are only read ahead by a bounded amount."""
+        read = []
+
+        def batches():
+            for i in range(20):
+                read.append(i)
+                yield self.sample_rows
+
+        file = MagicMock()
+        file.write.side_effect = lambda data: written.append(len(read))
+        written = []
+
+        render_batches(SampleSet, batches(), processes=2, file=file)
+
+        # XML declaration, opening tag, then the first rendered batch
+        self.assertEqual(written[2], 2 * 2)
+        self.assertEqual(len(written), 2 + 20 + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,6 +6,7 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 import unittest
+from io import BytesIO
 import xml.etree.ElementTree as ET
 
 from qiime2.plugin.testing import TestPluginBase
@@ -125,6 +126,26 @@ class TestRun(TestPluginBase, CustomAssertions):
         # Compare the XML structures
         self.assert_xml_equal(xml_tree, expected_xml)
 
+    def test_run_set_from_dict_to_file(self):
+        """Test writing a run set XML to a file."""
+        row_dict = {
+            f"run{i}": {
+                "experiment_ref": f"experiment_ref{i}",
+                "filename": [f"filename{i}"],
+                "checksum": [f"checksum{i}"],
+            }
+            for i in range(3)
+        }
+        file = BytesIO()
+
+        self.assertIsNone(_run_set_from_dict(row_dict, file))
+        self.assertEqual(file.getvalue(), _run_set_from_dict(row_dict))
+        self.assertEqual(len(ET.fromstring(file.getvalue()).findall("RUN")), 3)
+
+    def test_run_set_from_dict_empty(self):
+        """Test that no run set is created for an empty dictionary."""
+        self.assertIsNone(_run_set_from_dict({}))
+
 
 if __name__ == "__main__":
     unittest.main()
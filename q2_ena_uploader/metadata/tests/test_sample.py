@@ -11,7 +11,12 @@ import xml.etree.ElementTree as ET
 
 from qiime2.plugin.testing import TestPluginBase
 
-from q2_ena_uploader.metadata.sample import Sample, SampleSet
+from q2_ena_uploader.metadata.sample import (
+    Sample,
+    SampleSet,
+    SampleTable,
+    _compile_header,
+)
 from q2_ena_uploader.metadata.tests.test_utils import (
     CustomAssertions,
 )
@@ -150,6 +155,11 @@ class TestSample(TestPluginBase, CustomAssertions):
         # Check sample count
         self.assertEqual(len(sample_set.samples), 2)
 
+        # the samples are a read-only snapshot of the set
+        self.assertIsInstance(sample_set.samples, tuple)
+        with self.assertRaises(AttributeError):
+            sample_set.samples = [sample1]
+
         # Convert to XML and check structure
         xml_tree = sample_set.to_xml_element()
         root = xml_tree.getroot()
@@ -172,6 +182,91 @@ class TestSample(TestPluginBase, CustomAssertions):
         # Compare with expected XML
         self.assert_xml_equal(xml_tree, self.sample1_xml)
 
+    def test_sample_from_dict_column_roles(self):
+        """Test that columns are classified by role regardless of their order."""
+        row = {
+            "xref_link1": "DB|ID1",
+            "depth": "10|m",
+            " alias ": " sample1 ",
+            "url_link1": "label|http://example.com",
+            "taxon_id": "9606",
+        }
+        sample = Sample.from_dict(row)
+
+        self.assertEqual(sample.alias, "sample1")
+        self.assertEqual(sample.taxon_id, "9606")
+        self.assertEqual(sample.url_links, ["label|http://example.com"])
+        self.assertEqual(sample.xref_links, ["DB|ID1"])
+        self.assertEqual(sample.attributes, {"depth": "10|m", " alias ": " sample1 "})
+
+    def test_sample_set_from_list_compiles_header_once(self):
+        """Test that the column plan is compiled once per distinct header."""
+        _compile_header.cache_clear()
+        SampleSet.from_list(self.sample1_data)
+
+        info = _compile_header.cache_info()
+        self.assertEqual(info.misses, 1)
+        self.assertEqual(info.hits, len(self.sample1_data) - 1)
+
+
+class TestSampleTable(TestPluginBase):
+    """Test the columnar SampleTable backing the SampleSet."""
+
+    package = "q2_ena_uploader.metadata.tests"
+
+    def setUp(self):
+        super().setUp()
+        self.rows = [
+            {
+                "alias": f"sample{i}",
+                "taxon_id": "9606",
+                "url_link1": "label|http://example.com",
+                "collection date": "2023-01-01",
+                "depth": f"{i}|m",
+            }
+            for i in range(4)
+        ]
+
+    def test_repeated_values_stored_once(self):
+        """Test that repeated column values are stored only once."""
+        table = SampleTable()
+        for row in self.rows:
+            table.add_row(row)
+
+        self.assertEqual(len(table), 4)
+        # missing value placeholder + one distinct value
+        self.assertEqual(len(table.fields["taxon_id"].values), 2)
+        self.assertEqual(len(table.attributes["collection date"].values), 2)
+        self.assertEqual(len(table.attributes["depth"].values), 5)
+        self.assertEqual(len(table.fields["alias"].values), 5)
+
+    def test_sample_materialized_from_table(self):
+        """Test that rows materialize into the same Sample as from_dict."""
+        table = SampleTable()
+        for row in self.rows:
+            table.add_row(row)
+
+        for i, row in enumerate(self.rows):
+            self.assertEqual(vars(table.sample(i)), vars(Sample.from_dict(row)))
+
+    def test_heterogeneous_samples(self):
+        """Test samples with different attributes are rendered unchanged."""
+        sample1 = Sample(alias="s1", taxon_id="1", attributes={"a": "1", "b": "2"})
+        sample2 = Sample(alias="s2", taxon_id="1", attributes={"c": "3", "a": "4"})
+        sample3 = Sample(alias="s3", taxon_id="1", attributes={})
+
+        sample_set = SampleSet()
+        for sample in (sample1, sample2, sample3):
+            sample_set.add_sample(sample)
+
+        rendered = sample_set.to_xml_element().getroot()
+        for element, sample in zip(rendered, (sample1, sample2, sample3)):
+            self.assertEqual(ET.tostring(element), ET.tostring(sample.to_xml_element()))
+        self.assertEqual(
+            [vars(s) for s in sample_set.samples],
+            [vars(s) for s in (sample1, sample2, sample3)],
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
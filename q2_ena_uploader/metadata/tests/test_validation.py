@@ -0,0 +1,91 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import unittest
+
+from parameterized import parameterized
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_ena_uploader.metadata.validation import assert_valid_xml, validate_xml
+
+
+class TestValidateXml(TestPluginBase):
+    """Test the offline validation against the ENA schemas."""
+
+    package = "q2_ena_uploader.metadata.tests"
+
+    @parameterized.expand(
+        [
+            ("sample/test_sample1.xml",),
+            ("study/study1.xml",),
+            ("run/run_1.xml",),
+        ]
+    )
+    def test_valid_documents(self, filename):
+        """Test that valid documents do not produce any errors."""
+        self.assertEqual(validate_xml(self.get_data_path(filename)), [])
+
+    def test_valid_bytes(self):
+        """Test that documents can also be validated from memory."""
+        with open(self.get_data_path("sample/test_sample1.xml"), "rb") as f:
+            self.assertEqual(validate_xml(f.read()), [])
+
+    def test_errors_refer_to_objects(self):
+        """Test that errors name the invalid object by position and alias."""
+        xml = (
+            b"<SAMPLE_SET>"
+            b'<SAMPLE alias="s1"><SAMPLE_NAME><TAXON_ID>9606</TAXON_ID>'
+            b"</SAMPLE_NAME></SAMPLE>"
+            b'<SAMPLE alias="s2"><SAMPLE_NAME><TAXON_ID>human</TAXON_ID>'
+            b"</SAMPLE_NAME></SAMPLE>"
+            b"</SAMPLE_SET>"
+        )
+
+        errors = validate_xml(xml)
+
+        self.assertEqual(len(errors), 1)
+        self.assertRegex(errors[0], r"^SAMPLE 2 \(alias 's2'\), line 1: .*TAXON_ID")
+
+    def test_errors_in_every_object(self):
+        """Test that errors are reported for all invalid objects."""
+        errors = validate_xml(self.get_data_path("experiment/test_experiment1.xml"))
+
+        self.assertEqual(len(errors), 2)
+        self.assertTrue(errors[0].startswith("EXPERIMENT 1"))
+        self.assertTrue(errors[1].startswith("EXPERIMENT 2"))
+        self.assertIn("GENIUS", errors[0])
+
+    def test_malformed_document(self):
+        """Test that unparseable documents are reported."""
+        errors = validate_xml(b"<SAMPLE_SET><SAMPLE>")
+
+        self.assertEqual(len(errors), 1)
+        self.assertIn("could not be parsed", errors[0])
+
+    def test_assert_valid_xml(self):
+        """Test that invalid documents raise an error listing all problems."""
+        with self.assertRaisesRegex(
+            ValueError, r"(?s)experiment XML.*EXPERIMENT 1.*EXPERIMENT 2"
+        ):
+            assert_valid_xml(
+                self.get_data_path("experiment/test_experiment1.xml"), "experiment"
+            )
+
+    def test_assert_valid_xml_not_strict(self):
+        """Test that invalid documents only warn if validation is not strict."""
+        with self.assertWarnsRegex(
+            UserWarning, r"(?s)experiment XML.*EXPERIMENT 1.*EXPERIMENT 2"
+        ):
+            assert_valid_xml(
+                self.get_data_path("experiment/test_experiment1.xml"),
+                "experiment",
+                strict=False,
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import csv
+import unittest
+from xml.etree.ElementTree import canonicalize
+
+from parameterized import parameterized
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_ena_uploader.metadata.experiment import ExperimentSet
+from q2_ena_uploader.metadata.render import render_set
+from q2_ena_uploader.metadata.run import _run_set_from_dict
+from q2_ena_uploader.metadata.sample import SampleSet
+from q2_ena_uploader.metadata.study import Study
+from q2_ena_uploader.metadata.tests.test_study import read_study_tsv_to_dict
+from q2_ena_uploader.metadata.xml_backend import (
+    XMLBackend,
+    available_backends,
+    etree,
+)
+
+BACKENDS = [(name,) for name in available_backends()]
+
+
+class TestXMLBackend(TestPluginBase):
+    """Test that all XML backends produce the same documents."""
+
+    package = "q2_ena_uploader.metadata.tests"
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(etree.use, etree.name)
+
+    def _read_rows(self, filename):
+        with open(self.get_data_path(filename), "r") as tsv_file:
+            return list(csv.DictReader(tsv_file, delimiter="\t"))
+
+    def _render_all(self, backend):
+        etree.use(backend)
+        study = Study.from_dict(
+            read_study_tsv_to_dict(self.get_data_path("study/study1.tsv"))
+        ).to_xml_element()
+        files = {"filename": ["a.fastq.gz"], "checksum": ["md5"]}
+        return [
+            render_set(SampleSet, self._read_rows("sample/test_sample1.tsv")),
+            render_set(
+                ExperimentSet, self._read_rows("experiment/test_experiment2.tsv")
+            ),
+            etree.tostring(study.getroot(), encoding="utf8", xml_declaration=True),
+            _run_set_from_dict({"sample1": files, "sample2": files}),
+        ]
+
+    @parameterized.expand(BACKENDS)
+    def test_canonical_output_identical(self, backend):
+        """Test that every backend renders canonically identical documents."""
+        expected = self._render_all("stdlib")
+        observed = self._render_all(backend)
+
+        for exp, obs in zip(expected, observed):
+            self.assertEqual(canonicalize(obs), canonicalize(exp))
+
+    @parameterized.expand(BACKENDS)
+    def test_shared_element_attached_twice(self, backend):
+        """Test that shared elements can be attached to several parents."""
+        etree.use(backend)
+        shared = etree.Element("SHARED")
+        parent1 = etree.Element("PARENT")
+        parent2 = etree.Element("PARENT")
+
+        parent1.append(etree.shared(shared))
+        parent2.append(etree.shared(shared))
+
+        self.assertIsNotNone(parent1.find("SHARED"))
+        self.assertIsNotNone(parent2.find("SHARED"))
+
+    def test_default_backend(self):
+        """Test that the first available backend is used by default."""
+        self.assertEqual(XMLBackend().name, available_backends()[0])
+
+    def test_unknown_backend(self):
+        """Test that an unknown backend name raises an error."""
+        with self.assertRaisesRegex(ValueError, "Unknown XML backend: fancy"):
+            etree.use("fancy")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import os
+import warnings
+from functools import lru_cache
+from io import BytesIO
+from typing import BinaryIO, List, Union
+
+SCHEMA_DIR = os.path.join(os.path.dirname(__file__), "schemas")
+
+# ENA schema (SRA 1.5) declaring every object submitted by this plugin,
+# keyed by the tag of the object - every XML document is validated object
+# by object, i.e. one metadata TSV row at a time
+SCHEMAS = {
+    "PROJECT": "ENA.project.xsd",
+    "SAMPLE": "SRA.sample.xsd",
+    "EXPERIMENT": "SRA.experiment.xsd",
+    "RUN": "SRA.run.xsd",
+    "SUBMISSION": "SRA.submission.xsd",
+}
+
+
+@lru_cache(maxsize=None)
+def _import_lxml():
+    # lxml is only imported once the first document is validated
+    try:
+        from lxml import etree
+    except ImportError:
+        return None
+    return etree
+
+
+@lru_cache(maxsize=None)
+def _load_schema(tag: str):
+    return _import_lxml().XMLSchema(file=os.path.join(SCHEMA_DIR, SCHEMAS[tag]))
+
+
+def validate_xml(xml: Union[bytes, str, BinaryIO]) -> List[str]:
+    """
+    Validate a metadata XML document against the bundled ENA schemas.
+
+    The document is parsed incrementally and every object (e.g., SAMPLE
+    within a SAMPLE_SET) is validated and discarded as soon as it has been
+    read, so that large documents are never held in memory as a whole.
+
+    Parameters
+    ----------
+    xml : bytes, str or file-like
+        The XML document, a path to the file containing it or the binary
+        file itself (read from its beginning).
+
+    Returns
+    -------
+    list of str
+        Validation errors, each referring to the position (and alias) of the
+        object it was found in - empty if the document is valid.
+    """
+    lxml = _import_lxml()
+    if lxml is None:
+        warnings.warn(
+            "The lxml package is not installed - skipping offline validation "
+            "of the XML documents against the ENA schemas."
+        )
+        return []
+
+    source = BytesIO(xml) if isinstance(xml, bytes) else xml
+    if hasattr(source, "seek"):
+        source.seek(0)
+    errors, positions = [], {}
+    try:
+        context = lxml.iterparse(source, events=("end",), tag=tuple(SCHEMAS))
+        for _, element in context:
+            # objects nested in other objects (e.g. SUBMISSION in a receipt)
+            # are validated together with their parent
+            parent = element.getparent()
+            if parent is not None and parent.tag in SCHEMAS:
+                continue
+
+            schema = _load_schema(element.tag)
+            positions[element.tag] = position = positions.get(element.tag, 0) + 1
+            if not schema.validate(element):
+                alias = element.get("alias")
+                location = f"{element.tag} {position}" + (
+                    f" (alias '{alias}')" if alias else ""
+                )
+                errors.extend(
+                    f"{location}, line {error.line}: {error.message}"
+                    for error in schema.error_log
+                )
+
+            element.clear()
+            while element.getprevious() is not None:
+                del parent[0]
+    except lxml.XMLSyntaxError as e:
+        errors.append(f"The XML document could not be parsed: {e}")
+
+    return errors
+
+
+def assert_valid_xml(
+    xml: Union[bytes, str, BinaryIO], name: str = "metadata", strict: bool = True
+):
+    """
+    Raise an error listing all the problems found in an invalid XML document.
+
+    The bundled schemas are a snapshot of the ENA schemas, which may lag
+    behind the ones used by ENA (e.g., when new instrument models are
+    accepted) - with `strict` disabled, the problems are reported as a
+    warning and the document is submitted nevertheless.
+
+    Parameters
+    ----------
+    xml : bytes, str or file-like
+        The XML document, a path to the file containing it or the binary
+        file itself (read from its beginning).
+    name : str, optional
+        Name of the document used in the error message, by default "metadata".
+    strict : bool, optional
+        Whether to raise an error for an invalid document, by default True.
+        If False, a warning is issued instead.
+
+    Raises
+    ------
+    ValueError
+        If the document does not conform to the ENA schemas and `strict`
+        is enabled.
+    """
+    errors = validate_xml(xml)
+    if errors:
+        message = (
+            f"The {name} XML document does not conform to the ENA schemas. "
+            f"The following errors were found:\n" + "\n".join(errors)
+        )
+        if strict:
+            raise ValueError(message)
+        warnings.warn(message)
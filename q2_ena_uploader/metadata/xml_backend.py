@@ -0,0 +1,91 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import copy
+import importlib
+import importlib.util
+
+BACKENDS = ("lxml", "stdlib")
+
+# Modules implementing the backends, only imported once they are used
+MODULES = {"lxml": "lxml.etree", "stdlib": "xml.etree.ElementTree"}
+
+# Functions of the backend modules exposed by XMLBackend
+FUNCTIONS = ("Element", "SubElement", "ElementTree", "tostring")
+
+
+def available_backends() -> list:
+    """Return the names of the XML backends which can be used."""
+    return [
+        name
+        for name in BACKENDS
+        if name != "lxml" or importlib.util.find_spec("lxml") is not None
+    ]
+
+
+class XMLBackend:
+    """
+    ElementTree-compatible API of the selected XML library.
+
+    All the metadata builders create and serialize their elements through
+    this object, so that the (faster) lxml library is used when it is
+    installed, while the standard library's ElementTree remains a fallback.
+    The backend can be switched at runtime using `use`.
+    """
+
+    def __init__(self, name: str = None):
+        self.use(name or available_backends()[0])
+
+    def use(self, name: str):
+        if name not in BACKENDS:
+            raise ValueError(
+                f"Unknown XML backend: {name}. "
+                f"Supported backends are: {', '.join(BACKENDS)}."
+            )
+        if name not in available_backends():
+            raise ValueError(
+                "The lxml XML backend requires the lxml package to be installed."
+            )
+
+        self.name = name
+        # the functions of the backend are bound on first use (see
+        # __getattr__), so that its module is only imported when needed
+        for function in FUNCTIONS:
+            self.__dict__.pop(function, None)
+
+    def __getattr__(self, attr: str):
+        if attr not in FUNCTIONS or "name" not in self.__dict__:
+            raise AttributeError(attr)
+        module = importlib.import_module(MODULES[self.name])
+        for function in FUNCTIONS:
+            setattr(self, function, getattr(module, function))
+        return getattr(self, attr)
+
+    def write(self, element, file, encoding: str = "utf-8"):
+        """
+        Write an element into a binary file as a complete XML document.
+
+        The output is identical to that of `tostring` with an XML declaration,
+        which lxml would otherwise spell differently when writing to a file.
+        """
+        file.write(f"<?xml version='1.0' encoding='{encoding}'?>\n".encode(encoding))
+        self.ElementTree(element).write(file, encoding=encoding, xml_declaration=False)
+
+    def shared(self, element):
+        """
+        Return the element in a form which can be attached to a new parent.
+
+        ElementTree elements can be appended to any number of parents, so
+        memoized elements are simply reused. lxml elements can only have
+        a single parent and are therefore copied.
+        """
+        if self.name == "lxml":
+            return copy.deepcopy(element)
+        return element
+
+
+etree = XMLBackend()
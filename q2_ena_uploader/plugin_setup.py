@@ -15,16 +15,23 @@ from q2_types.per_sample_sequences import (
 from q2_types.sample_data import SampleData
 from qiime2.core.type import Choices
 from qiime2.plugin import Plugin
-from qiime2.plugin import Str, Bool
+from qiime2.plugin import Str, Bool, Int, List, Metadata, Range
 
 import q2_ena_uploader
 from q2_ena_uploader import submit_all
+from q2_ena_uploader.bundle import prepare_submission, send_submission
 from q2_ena_uploader.ftp_file_upload import transfer_files_to_ena
 from q2_ena_uploader.read_submission import submit_metadata_reads
-from q2_ena_uploader.sample_submission import submit_metadata_samples, cancel_submission
+from q2_ena_uploader.sample_submission import (
+    submit_metadata_samples,
+    cancel_submission,
+    cancel_submissions,
+)
 from q2_ena_uploader.types._types_and_formats import (
     ENAMetadataSamplesFormat,
     ENAMetadataSamplesDirFmt,
+    ENAMetadataSamplesParquetFormat,
+    ENAMetadataSamplesShardFormat,
     ENAMetadataSamples,
     ENAMetadataStudyFormat,
     ENAMetadataStudyDirFmt,
@@ -35,6 +42,10 @@ from q2_ena_uploader.types._types_and_formats import (
     ENAMetadataExperimentFormat,
     ENAMetadataExperiment,
     ENAMetadataExperimentDirFmt,
+    ENASubmissionDocumentFormat,
+    ENASubmissionBundleManifestFormat,
+    ENASubmissionBundleDirFmt,
+    ENASubmissionBundle,
 )
 
 plugin = Plugin(
@@ -54,16 +65,29 @@ plugin.methods.register_function(
     inputs={
         "study": ENAMetadataStudy,
         "samples": ENAMetadataSamples,
+        "previous_samples": ENAMetadataSamples,
+        "previous_receipts": List[ENASubmissionReceipt],
     },
     parameters={
         "submission_hold_date": Str,
         "dev": Bool,
         "action": Str % Choices(["ADD", "MODIFY"]),
+        "batch_size": Int % Range(0, None),
+        "threads": Int % Range(1, None),
+        "retries": Int % Range(0, None),
+        "validate_xml": Bool,
     },
     outputs=[("submission_receipt", ENASubmissionReceipt)],
     input_descriptions={
         "study": "Study metadata in ENA-compatible format.",
         "samples": "Sample metadata in ENA-compatible format.",
+        "previous_samples": "The previously submitted version of the sample "
+        "metadata. When provided with the MODIFY action, only the samples whose "
+        "metadata changed are submitted.",
+        "previous_receipts": "Receipts of earlier submissions of the same "
+        "metadata. When provided with the ADD action, the study and samples "
+        "which are already registered are not submitted again and their "
+        "accessions are included in the receipt.",
     },
     parameter_descriptions={
         "submission_hold_date": "Release date when the study and associated data "
@@ -71,6 +95,17 @@ plugin.methods.register_function(
         "dev": "Set to True to submit to the ENA development server for testing.",
         "action": "Submission action type (ADD for new data, MODIFY "
         "for updating existing data).",
+        "batch_size": "Maximum number of samples to submit in a single request. "
+        "When set, samples are submitted in batches and the resulting receipts "
+        "are merged into one. Set to 0 to submit all samples at once.",
+        "threads": "Number of processes used to render the XML documents and "
+        "maximum number of batches to submit concurrently.",
+        "retries": "Number of times the objects which were not registered by a "
+        "failed submission are submitted again. Objects named in the errors "
+        "of ENA are left out of the retries. Set to 0 to disable retries.",
+        "validate_xml": "Raise an error if the generated XML documents do not "
+        "conform to the ENA schemas bundled with the plugin. If disabled, the "
+        "problems are only reported as a warning.",
     },
     output_descriptions={
         "submission_receipt": "Receipt containing submission details "
@@ -101,6 +136,38 @@ plugin.methods.register_function(
 )
 
 
+plugin.methods.register_function(
+    function=cancel_submissions,
+    inputs={},
+    parameters={
+        "accession_numbers": List[Str],
+        "accessions": Metadata,
+        "dev": Bool,
+        "batch_size": Int % Range(1, None),
+        "threads": Int % Range(1, None),
+    },
+    outputs=[("submission_receipt", ENASubmissionReceipt)],
+    input_descriptions={},
+    parameter_descriptions={
+        "accession_numbers": "ENA accession numbers of the submissions to cancel.",
+        "accessions": "Metadata file listing the ENA accession numbers of the "
+        "submissions to cancel as IDs.",
+        "dev": "Set to True to use the ENA development server for testing.",
+        "batch_size": "Number of cancellations included in a single "
+        "submission document.",
+        "threads": "Maximum number of submission documents sent concurrently.",
+    },
+    output_descriptions={
+        "submission_receipt": "Receipt merged from the receipts of all "
+        "the cancellations."
+    },
+    name="Cancel many ENA submissions.",
+    description="Cancel several existing submissions to the European Nucleotide "
+    "Archive at once.",
+    citations=[],
+)
+
+
 plugin.methods.register_function(
     function=submit_metadata_reads,
     inputs={
@@ -108,11 +175,17 @@ plugin.methods.register_function(
         "experiment": ENAMetadataExperiment,
         "samples_submission_receipt": ENASubmissionReceipt,
         "file_transfer_metadata": ImmutableMetadata,
+        "previous_experiment": ENAMetadataExperiment,
+        "previous_receipts": List[ENASubmissionReceipt],
     },
     parameters={
         "submission_hold_date": Str,
         "action": Str % Choices(["ADD", "MODIFY"]),
         "dev": Bool,
+        "batch_size": Int % Range(0, None),
+        "threads": Int % Range(1, None),
+        "retries": Int % Range(0, None),
+        "validate_xml": Bool,
     },
     outputs=[("submission_receipt", ENASubmissionReceipt)],
     input_descriptions={
@@ -120,6 +193,13 @@ plugin.methods.register_function(
         "experiment": "Experiment metadata in ENA-compatible format.",
         "samples_submission_receipt": "Receipt from the sample/study submission.",
         "file_transfer_metadata": "Metadata from the file transfer operation.",
+        "previous_experiment": "The previously submitted version of the "
+        "experiment metadata. When provided with the MODIFY action, only the "
+        "experiments whose metadata changed are submitted, without their runs.",
+        "previous_receipts": "Receipts of earlier submissions of the same reads. "
+        "When provided with the ADD action, the experiments and runs which are "
+        "already registered are not submitted again and their accessions are "
+        "included in the receipt.",
     },
     parameter_descriptions={
         "submission_hold_date": "Release date when the data will become "
@@ -128,6 +208,18 @@ plugin.methods.register_function(
         "action": "Submission action type (ADD for new data, MODIFY "
         "for updating existing data).",
         "dev": "Set to True to use the ENA development server for testing.",
+        "batch_size": "Maximum number of samples whose experiments and runs are "
+        "submitted in a single request. When set, the data is submitted in "
+        "batches and the resulting receipts are merged into one. Set to 0 to "
+        "submit everything at once.",
+        "threads": "Number of processes used to render the XML documents and "
+        "maximum number of batches to submit concurrently.",
+        "retries": "Number of times the objects which were not registered by a "
+        "failed submission are submitted again. Objects named in the errors "
+        "of ENA are left out of the retries. Set to 0 to disable retries.",
+        "validate_xml": "Raise an error if the generated XML documents do not "
+        "conform to the ENA schemas bundled with the plugin. If disabled, the "
+        "problems are only reported as a warning.",
     },
     output_descriptions={
         "submission_receipt": (
@@ -164,6 +256,80 @@ plugin.methods.register_function(
     citations=[],
 )
 
+plugin.methods.register_function(
+    function=prepare_submission,
+    inputs={
+        "study": ENAMetadataStudy,
+        "samples": ENAMetadataSamples,
+        "experiment": ENAMetadataExperiment,
+        "demux": SampleData[SequencesWithQuality | PairedEndSequencesWithQuality],
+        "samples_submission_receipt": ENASubmissionReceipt,
+    },
+    parameters={
+        "submission_hold_date": Str,
+        "action": Str % Choices(["ADD", "MODIFY"]),
+        "batch_size": Int % Range(0, None),
+        "threads": Int % Range(1, None),
+        "validate_xml": Bool,
+    },
+    outputs=[("bundle", ENASubmissionBundle)],
+    input_descriptions={
+        "study": "Study metadata in ENA-compatible format.",
+        "samples": "Sample metadata in ENA-compatible format.",
+        "experiment": "Experiment metadata in ENA-compatible format. Needs to be "
+        "provided together with the demultiplexed reads.",
+        "demux": "Demultiplexed sequence data (single-end or paired-end reads) "
+        "whose runs are submitted.",
+        "samples_submission_receipt": "Receipt from an earlier sample/study "
+        "submission, against which the samples of the reads are checked.",
+    },
+    parameter_descriptions={
+        "submission_hold_date": "Release date when the study and associated data "
+        "will become publicly available (format: YYYY-MM-DD).",
+        "action": "Submission action type (ADD for new data, MODIFY "
+        "for updating existing data).",
+        "batch_size": "Maximum number of samples included in a single "
+        "submission. Set to 0 to submit everything at once.",
+        "threads": "Number of processes used to render the XML documents.",
+        "validate_xml": "Raise an error if the generated XML documents do not "
+        "conform to the ENA schemas bundled with the plugin. If disabled, the "
+        "problems are only reported as a warning.",
+    },
+    output_descriptions={
+        "bundle": "The rendered and validated submission documents, ready to "
+        "be sent to ENA with send-submission."
+    },
+    name="Prepare a submission to ENA offline.",
+    description=(
+        "Render and validate the XML documents of a submission and compute the "
+        "checksums of the read files without connecting to ENA, e.g. on a "
+        "compute node without internet access."
+    ),
+    citations=[],
+)
+
+plugin.methods.register_function(
+    function=send_submission,
+    inputs={"bundle": ENASubmissionBundle},
+    parameters={"dev": Bool, "threads": Int % Range(1, None)},
+    outputs=[("submission_receipt", ENASubmissionReceipt)],
+    input_descriptions={"bundle": "Submission prepared by prepare-submission."},
+    parameter_descriptions={
+        "dev": "Set to True to use the ENA development server for testing.",
+        "threads": "Maximum number of submissions sent concurrently.",
+    },
+    output_descriptions={
+        "submission_receipt": "Receipt merged from the receipts of all the "
+        "submissions of the bundle."
+    },
+    name="Send a prepared submission to ENA.",
+    description=(
+        "Send the documents of a submission prepared by prepare-submission to "
+        "the European Nucleotide Archive, without any further processing."
+    ),
+    citations=[],
+)
+
 plugin.pipelines.register_function(
     function=submit_all,
     inputs={
@@ -171,11 +337,16 @@ plugin.pipelines.register_function(
         "study": ENAMetadataStudy,
         "samples": ENAMetadataSamples,
         "experiment": ENAMetadataExperiment,
+        "previous_receipts": List[ENASubmissionReceipt],
     },
     parameters={
         "submission_hold_date": Str,
         "dev": Bool,
         "action": Str % Choices(["ADD", "MODIFY"]),
+        "batch_size": Int % Range(0, None),
+        "threads": Int % Range(1, None),
+        "retries": Int % Range(0, None),
+        "validate_xml": Bool,
     },
     outputs=[
         ("sample_submission_receipt", ENASubmissionReceipt),
@@ -187,6 +358,10 @@ plugin.pipelines.register_function(
         "study": "Study metadata in ENA-compatible format.",
         "samples": "Sample metadata in ENA-compatible format.",
         "experiment": "Experiment metadata in ENA-compatible format.",
+        "previous_receipts": "Sample and read submission receipts of an earlier, "
+        "partially successful run of this action. When provided with the ADD "
+        "action, the objects which are already registered are not submitted "
+        "again.",
     },
     parameter_descriptions={
         "submission_hold_date": "Release date when the study and associated data "
@@ -194,6 +369,17 @@ plugin.pipelines.register_function(
         "dev": "Set to True to submit to the ENA development server for testing.",
         "action": "Submission action type (ADD for new data, MODIFY for "
         "updating existing data).",
+        "batch_size": "Maximum number of samples to submit in a single request "
+        "(applies to both sample and read metadata submissions). Set to 0 to "
+        "submit everything at once.",
+        "threads": "Number of processes used to render the XML documents and "
+        "maximum number of batches to submit concurrently.",
+        "retries": "Number of times the objects which were not registered by a "
+        "failed submission are submitted again. Objects named in the errors "
+        "of ENA are left out of the retries. Set to 0 to disable retries.",
+        "validate_xml": "Raise an error if the generated XML documents do not "
+        "conform to the ENA schemas bundled with the plugin. If disabled, the "
+        "problems are only reported as a warning.",
     },
     output_descriptions={
         "sample_submission_receipt": "Receipt containing sample/study submission "
@@ -211,11 +397,17 @@ plugin.pipelines.register_function(
 )
 
 plugin.register_semantic_types(
-    ENAMetadataStudy, ENAMetadataSamples, ENAMetadataExperiment, ENASubmissionReceipt
+    ENAMetadataStudy,
+    ENAMetadataSamples,
+    ENAMetadataExperiment,
+    ENASubmissionReceipt,
+    ENASubmissionBundle,
 )
 
 plugin.register_formats(
     ENAMetadataSamplesFormat,
+    ENAMetadataSamplesParquetFormat,
+    ENAMetadataSamplesShardFormat,
     ENAMetadataStudyFormat,
     ENAMetadataSamplesDirFmt,
     ENAMetadataStudyDirFmt,
@@ -223,6 +415,9 @@ plugin.register_formats(
     ENASubmissionReceiptDirFmt,
     ENAMetadataExperimentFormat,
     ENAMetadataExperimentDirFmt,
+    ENASubmissionDocumentFormat,
+    ENASubmissionBundleManifestFormat,
+    ENASubmissionBundleDirFmt,
 )
 
 
@@ -233,7 +428,7 @@ plugin.register_artifact_class(
 plugin.register_artifact_class(
     ENAMetadataSamples,
     ENAMetadataSamplesDirFmt,
-    description="Samples submission tsv file.",
+    description="Samples submission tsv file, tsv shards or Parquet file.",
 )
 
 plugin.register_artifact_class(
@@ -248,4 +443,11 @@ plugin.register_artifact_class(
     description="Experiment submission tsv file.",
 )
 
+plugin.register_artifact_class(
+    ENASubmissionBundle,
+    ENASubmissionBundleDirFmt,
+    description="Pre-rendered ENA submission xml documents with a json manifest "
+    "of their checksums and of the planned read files.",
+)
+
 importlib.import_module("q2_ena_uploader.types._transformer")
@@ -6,24 +6,40 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 import hashlib
-from typing import Dict, List
-from xml.etree.ElementTree import Element, SubElement, tostring
+from contextlib import ExitStack
+from tempfile import TemporaryFile
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+from xml.etree.ElementTree import Element, SubElement, iterparse, tostring
 
 import pandas as pd
 import qiime2
-import requests
 from q2_types.per_sample_sequences import CasavaOneEightSingleLanePerSampleDirFmt
 
+from q2_ena_uploader.accessions import (
+    AccessionIndex,
+    drop_registered,
+    merge_registered,
+    skipped_message,
+)
+from q2_ena_uploader.diff import diff_rows
+from q2_ena_uploader.metadata.experiment import ExperimentSet
+from q2_ena_uploader.metadata.render import render_set
+from q2_ena_uploader.metadata.validation import assert_valid_xml
+from q2_ena_uploader.retry import Documents, retry_failed_file
 from q2_ena_uploader.types._types_and_formats import (
     ENAMetadataExperimentFormat,
     ENASubmissionReceiptFormat,
 )
 from q2_ena_uploader.utils import (
     ActionType,
-    DEV_SERVER_URL,
-    PRODUCTION_SERVER_URL,
+    annotate_receipt_file,
     assert_success,
     assert_credentials,
+    get_server_url,
+    merge_receipts,
+    post_submission,
+    split_xml_set,
+    submit_batches,
 )
 from .metadata.run import _run_set_from_dict
 
@@ -118,6 +134,81 @@ def _process_manifest(df: pd.DataFrame) -> Dict[str, Dict[str, List[str]]]:
     return parsed_data
 
 
+def _split_into_batches(
+    experiment_xml: Optional[BinaryIO],
+    parsed_data: dict,
+    batch_size: int,
+    stack: ExitStack,
+) -> List[Tuple[Optional[BinaryIO], Optional[bytes]]]:
+    """
+    Split experiments and runs into batches of samples.
+
+    The experiments are read incrementally from the spooled EXPERIMENT_SET
+    document and written into a temporary file per batch, so that neither
+    the document nor its parsed tree are ever held in memory as a whole.
+
+    Parameters
+    ----------
+    experiment_xml : file-like or None
+        Binary file containing the EXPERIMENT_SET document of all the
+        samples, None if there are no experiments to submit.
+    parsed_data : dict
+        File information of all the samples, as returned by _process_manifest.
+    batch_size : int
+        Maximum number of samples to include in every batch.
+    stack : ExitStack
+        Context the temporary files of the batches are closed with.
+
+    Returns
+    -------
+    list of tuples
+        Pairs of EXPERIMENT_SET (as a binary file) and RUN_SET documents,
+        each covering the same samples so that every run references an
+        experiment submitted in the same batch (or an already registered
+        one). Either document is None if the batch contains no such objects.
+    """
+    # registered experiments or runs are not submitted again, so either of
+    # them may be missing for some of the samples - samples without a run
+    # are batched after all the others, in the order of their experiments
+    positions = {_id: i for i, _id in enumerate(parsed_data)}
+    n_samples = len(parsed_data)
+    experiment_sets: Dict[int, BinaryIO] = {}
+    if experiment_xml is not None:
+        experiment_xml.seek(0)
+        root, depth = None, 0
+        for event, element in iterparse(experiment_xml, events=("start", "end")):
+            if event == "start":
+                root = element if root is None else root
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 1:
+                continue
+            _id = element.get("alias")[len("exp_") :]
+            if _id not in positions:
+                positions[_id] = n_samples
+                n_samples += 1
+            batch = positions[_id] // batch_size
+            if batch not in experiment_sets:
+                experiment_sets[batch] = stack.enter_context(TemporaryFile())
+                experiment_sets[batch].write(b"<EXPERIMENT_SET>")
+            experiment_sets[batch].write(
+                tostring(element, encoding="unicode").encode("utf-8")
+            )
+            root.clear()
+        for experiment_set in experiment_sets.values():
+            experiment_set.write(b"</EXPERIMENT_SET>")
+            experiment_set.seek(0)
+
+    sample_ids = list(parsed_data)
+    batches = []
+    for batch, i in enumerate(range(0, n_samples, batch_size)):
+        batch_runs = {_id: parsed_data[_id] for _id in sample_ids[i : i + batch_size]}
+        run_xml = _run_set_from_dict(batch_runs) if batch_runs else None
+        batches.append((experiment_sets.get(batch), run_xml))
+    return batches
+
+
 def _remove_suffixes(ids: set):
     base_ids = set()
     ids_with_suffixes = set()
@@ -139,8 +230,8 @@ def _remove_suffixes(ids: set):
 
 def _validate_sample_ids_match(
     demux_df: pd.DataFrame,
-    file_transfer_metadata: qiime2.Metadata,
-    submission_receipt_samples: ENASubmissionReceiptFormat,
+    file_transfer_metadata: Optional[qiime2.Metadata],
+    submission_receipt_samples: Optional[ENASubmissionReceiptFormat],
     experiment: ENAMetadataExperimentFormat,
 ) -> None:
     """
@@ -150,10 +241,12 @@ def _validate_sample_ids_match(
     ----------
     demux_df : pd.DataFrame
         The demultiplexed sequence manifest with sample IDs as index.
-    file_transfer_metadata : qiime2.Metadata
+    file_transfer_metadata : qiime2.Metadata or None
         Metadata from the file transfer operation with sample IDs as index.
-    submission_receipt_samples : ENASubmissionReceiptFormat
+        Not checked if None (e.g. before the files were transferred).
+    submission_receipt_samples : ENASubmissionReceiptFormat or None
         Receipt from the sample/study submission containing sample aliases.
+        Not checked if None (e.g. before the samples were submitted).
     experiment : ENAMetadataExperimentFormat
         Experiment metadata in ENA format.
 
@@ -167,19 +260,23 @@ def _validate_sample_ids_match(
     demux_sample_ids = set(demux_df.index)
 
     # 2. Get sample IDs from file_transfer_metadata
-    file_transfer_sample_ids = set(file_transfer_metadata.to_dataframe().index)
+    file_transfer_sample_ids = demux_sample_ids
+    if file_transfer_metadata is not None:
+        file_transfer_sample_ids = set(file_transfer_metadata.to_dataframe().index)
 
-    # if reads were paired-end, sample ids will have _f and _r suffixes - remove them
-    file_transfer_sample_ids = _remove_suffixes(file_transfer_sample_ids)
+        # if reads were paired-end, sample ids will have _f and _r suffixes
+        file_transfer_sample_ids = _remove_suffixes(file_transfer_sample_ids)
 
     # 3. Get sample aliases from submission_receipt_samples XML
-    receipt_sample_ids = set()
-    receipt_xml = ENASubmissionReceiptFormat.read_ET_from_file(
-        str(submission_receipt_samples)
-    )
-    for sample_elem in receipt_xml.findall(".//SAMPLE"):
-        if "alias" in sample_elem.attrib:
-            receipt_sample_ids.add(sample_elem.attrib["alias"])
+    receipt_sample_ids = demux_sample_ids
+    if submission_receipt_samples is not None:
+        receipt_sample_ids = set()
+        receipt_xml = ENASubmissionReceiptFormat.read_ET_from_file(
+            str(submission_receipt_samples)
+        )
+        for sample_elem in receipt_xml.findall(".//SAMPLE"):
+            if "alias" in sample_elem.attrib:
+                receipt_sample_ids.add(sample_elem.attrib["alias"])
 
     # 4. Get sample IDs from experiment DataFrame
     experiment_df = experiment.view(pd.DataFrame)
@@ -255,15 +352,100 @@ def _validate_sample_ids_match(
         raise ValueError(error_msg)
 
 
+def _retry_failed(
+    receipt: ENASubmissionReceiptFormat,
+    documents: Callable[[], Documents],
+    submission_xml: str,
+    url: str,
+    auth: Tuple[str, str],
+    retries: int,
+):
+    def _submit(retried: dict) -> bytes:
+        retried["SUBMISSION"] = ("submission.xml", submission_xml, "text/xml")
+        return post_submission(url, auth, retried).content
+
+    retry_failed_file(str(receipt), documents, _submit, retries)
+
+
+def _submit_changed_experiments(
+    experiment: ENAMetadataExperimentFormat,
+    previous_experiment: ENAMetadataExperimentFormat,
+    submission_xml: str,
+    url: str,
+    auth: Tuple[str, str],
+    batch_size: int,
+    threads: int,
+    retries: int,
+    validate_xml: bool,
+) -> ENASubmissionReceiptFormat:
+    """
+    Submit only the experiments which changed compared to their previous version.
+
+    Experiments are identified by their sample. The runs are not submitted
+    again, as their read files do not change when the experiment metadata is
+    modified.
+    """
+    diff, changed = diff_rows(
+        experiment.records(), previous_experiment.records(), "sample_description"
+    )
+    receipt = ENASubmissionReceiptFormat()
+
+    if not changed:
+        # none of the experiments changed, so there is nothing to submit
+        with receipt.open() as fh:
+            merge_receipts([], fh)
+    else:
+        experiment_xml = render_set(ExperimentSet, changed, threads)
+        assert_valid_xml(experiment_xml, "experiment", strict=validate_xml)
+        documents = (
+            split_xml_set(experiment_xml, batch_size)
+            if batch_size > 0
+            else [experiment_xml]
+        )
+        batches = [
+            {
+                "SUBMISSION": ("submission.xml", submission_xml, "text/xml"),
+                "EXPERIMENT": ("metadata.xml", document, "text/xml"),
+            }
+            for document in documents
+        ]
+        with receipt.open() as fh:
+            if batch_size > 0:
+                submit_batches(url, auth, batches, threads, fh)
+            else:
+                post_submission(url, auth, batches[0], receipt=fh)
+        if batch_size <= 0 and retries == 0:
+            with open(str(receipt), "rb") as fh:
+                assert_success(fh)
+        if retries > 0:
+            _retry_failed(
+                receipt,
+                lambda: {"EXPERIMENT": ("metadata.xml", experiment_xml)},
+                submission_xml,
+                url,
+                auth,
+                retries,
+            )
+
+    annotate_receipt_file(str(receipt), diff.summary("experiments"))
+    return receipt
+
+
 def submit_metadata_reads(
     demux: CasavaOneEightSingleLanePerSampleDirFmt,
     experiment: ENAMetadataExperimentFormat,
     samples_submission_receipt: ENASubmissionReceiptFormat,
     file_transfer_metadata: qiime2.Metadata,
+    previous_experiment: Optional[ENAMetadataExperimentFormat] = None,
+    previous_receipts: Optional[List[ENASubmissionReceiptFormat]] = None,
     submission_hold_date: str = "",
     action: str = "ADD",
     dev: bool = True,
-) -> bytes:
+    batch_size: int = 0,
+    threads: int = 1,
+    retries: int = 0,
+    validate_xml: bool = True,
+) -> ENASubmissionReceiptFormat:
     """
     Submit experiment metadata and run information to the ENA server.
 
@@ -281,6 +463,16 @@ def submit_metadata_reads(
         Receipt from the sample/study submission.
     file_transfer_metadata : qiime2.Metadata
         Metadata from the file transfer operation.
+    previous_experiment : ENAMetadataExperimentFormat, optional
+        The previously submitted version of the experiment metadata, by
+        default None. When provided with the MODIFY action, only the
+        experiments whose metadata changed are submitted (without their runs)
+        and the receipt lists how many were skipped.
+    previous_receipts : list of ENASubmissionReceiptFormat, optional
+        Receipts of earlier submissions of the same reads, by default None.
+        When provided with the ADD action, the experiments and runs which
+        were already registered are not submitted again and are added to the
+        receipt together with their accessions.
     submission_hold_date : str, optional
         Date until which the submission should be kept private, by default "".
         Format should be YYYY-MM-DD.
@@ -295,11 +487,31 @@ def submit_metadata_reads(
         Whether to use the development server, by default True.
         - True: Submit to the development server for testing
         - False: Submit to the production server for real submissions
+    batch_size : int, optional
+        Maximum number of samples whose experiments and runs are included
+        in a single submission, by default 0 (everything is submitted at
+        once). When set, the individual receipts are merged into one.
+    threads : int, optional
+        Number of worker processes used to render the XML documents and
+        maximum number of batches submitted concurrently, by default 1.
+    retries : int, optional
+        Number of times the experiments and runs which were not registered by
+        a failed submission are submitted again, by default 0. Objects named
+        in the errors of ENA (and runs of failed experiments) are left out of
+        the retries, so that they do not fail the other objects again.
+    validate_xml : bool, optional
+        Whether an error is raised if the generated XML document does not
+        conform to the ENA schemas bundled with the plugin, by default True.
+        If False, the problems are reported as a warning and the document
+        is submitted nevertheless (e.g., when ENA accepts values which are
+        not yet part of the bundled schemas).
 
     Returns
     -------
-    bytes
-        The raw response content from the ENA server
+    ENASubmissionReceiptFormat
+        The receipt returned by the ENA server, streamed to disk as it is
+        received (or the merged receipt of all the batches when `batch_size`
+        is set, or of all the attempts when objects were retried)
 
     Raises
     ------
@@ -309,9 +521,34 @@ def submit_metadata_reads(
         If ENA username or password environment variables are not set
     ValueError
         If sample IDs don't match across the required sources
+    ValueError
+        If a previous experiment is provided for an ADD
+    ValueError
+        If previous receipts are provided for a MODIFY
+    ValueError
+        If the generated experiment XML does not conform to the ENA schemas
+        and `validate_xml` is enabled
     """
     username, password = assert_credentials()
 
+    if (
+        previous_experiment is not None
+        and ActionType.from_string(action) != ActionType.MODIFY
+    ):
+        raise ValueError(
+            "Previous experiment metadata can only be compared to new "
+            "experiment metadata submitted with the MODIFY action."
+        )
+
+    index = None
+    if previous_receipts:
+        if ActionType.from_string(action) != ActionType.ADD:
+            raise ValueError(
+                "Previous receipts can only be used to skip registered objects "
+                "when submitting with the ADD action."
+            )
+        index = AccessionIndex.from_receipts(previous_receipts)
+
     # Get the manifest DataFrame
     df = demux.manifest
 
@@ -320,20 +557,120 @@ def submit_metadata_reads(
         df, file_transfer_metadata, samples_submission_receipt, experiment
     )
 
-    parsed_data = _process_manifest(df)
+    url = get_server_url(dev)
+    if previous_experiment is not None:
+        submission_xml = _create_submission_xml(
+            ActionType.from_string(action), submission_hold_date
+        )
+        return _submit_changed_experiments(
+            experiment,
+            previous_experiment,
+            submission_xml,
+            url,
+            (username, password),
+            batch_size,
+            threads,
+            retries,
+            validate_xml,
+        )
+
+    messages = []
+    if index is not None:
+        # the read files of the registered runs are not even hashed again
+        registered = [
+            _id for _id in df.index if f"run_{_id}" in index.registered("RUN")
+        ]
+        df = df.drop(index=registered)
+        messages.extend(skipped_message("runs", [f"run_{_id}" for _id in registered]))
 
-    run_xml = _run_set_from_dict(parsed_data)
+    parsed_data = _process_manifest(df)
+    receipt = ENASubmissionReceiptFormat()
     submission_xml = _create_submission_xml(
         ActionType.from_string(action), submission_hold_date
     )
-    files = {
-        "SUBMISSION": ("submission.xml", submission_xml, "text/xml"),
-        "EXPERIMENT": ("metadata.xml", experiment.to_xml(), "text/xml"),
-        "RUN": ("run.xml", run_xml, "text/xml"),
-    }
-    url = DEV_SERVER_URL if dev else PRODUCTION_SERVER_URL
-    response = requests.post(url, auth=(username, password), files=files)
 
-    assert_success(response)
-
-    return response.content
+    # the documents are spooled to temporary files and streamed to ENA from
+    # there, so that they never need to be held in memory as a whole
+    with TemporaryFile() as experiment_xml, TemporaryFile() as run_xml:
+        experiment.to_xml(processes=threads, file=experiment_xml)
+        # validate the experiments offline before anything is sent to ENA
+        assert_valid_xml(experiment_xml, "experiment", strict=validate_xml)
+
+        has_experiments = True
+        if index is not None:
+            experiment_xml.seek(0)
+            remaining, skipped = drop_registered(
+                experiment_xml.read(), index.registered("EXPERIMENT")
+            )
+            messages.extend(skipped_message("experiments", skipped))
+            experiment_xml.seek(0)
+            experiment_xml.truncate()
+            if remaining is not None:
+                experiment_xml.write(remaining)
+            has_experiments = remaining is not None
+
+        if not has_experiments and not parsed_data:
+            # all the experiments and runs are already registered
+            with receipt.open() as fh:
+                merge_receipts([], fh)
+        elif batch_size > 0:
+            with ExitStack() as stack:
+                batches = []
+                for batch_experiment_xml, batch_run_xml in _split_into_batches(
+                    experiment_xml if has_experiments else None,
+                    parsed_data,
+                    batch_size,
+                    stack,
+                ):
+                    batch = {
+                        "SUBMISSION": ("submission.xml", submission_xml, "text/xml")
+                    }
+                    if batch_experiment_xml is not None:
+                        batch["EXPERIMENT"] = (
+                            "metadata.xml",
+                            batch_experiment_xml,
+                            "text/xml",
+                        )
+                    if batch_run_xml is not None:
+                        batch["RUN"] = ("run.xml", batch_run_xml, "text/xml")
+                    batches.append(batch)
+                with receipt.open() as fh:
+                    submit_batches(url, (username, password), batches, threads, fh)
+        else:
+            files = {"SUBMISSION": ("submission.xml", submission_xml, "text/xml")}
+            if has_experiments:
+                files["EXPERIMENT"] = ("metadata.xml", experiment_xml, "text/xml")
+            if parsed_data:
+                _run_set_from_dict(parsed_data, run_xml)
+                files["RUN"] = ("run.xml", run_xml, "text/xml")
+            with receipt.open() as fh:
+                post_submission(url, (username, password), files, receipt=fh)
+
+            if retries == 0:
+                with open(str(receipt), "rb") as fh:
+                    assert_success(fh)
+
+        if retries > 0 and (has_experiments or parsed_data):
+
+            def _documents() -> Documents:
+                documents = {}
+                if has_experiments:
+                    experiment_xml.seek(0)
+                    documents["EXPERIMENT"] = ("metadata.xml", experiment_xml.read())
+                if parsed_data:
+                    documents["RUN"] = ("run.xml", _run_set_from_dict(parsed_data))
+                return documents
+
+            _retry_failed(
+                receipt,
+                _documents,
+                submission_xml,
+                url,
+                (username, password),
+                retries,
+            )
+
+    if index is not None:
+        merge_registered(str(receipt), index, ("EXPERIMENT", "RUN"))
+    annotate_receipt_file(str(receipt), messages)
+    return receipt
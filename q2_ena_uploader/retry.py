@@ -0,0 +1,186 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import re
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from xml.etree.ElementTree import Element, SubElement, fromstring, tostring
+
+from q2_ena_uploader.accessions import REGISTERED_OBJECTS, AccessionIndex
+from q2_ena_uploader.utils import assert_success, merge_receipts
+
+# ENA errors name the affected object by its alias, e.g.
+# 'In sample, alias: "sample1", accession: "". ...'
+_ERROR_ALIAS = re.compile(r'alias:?\s*"([^"]+)"')
+
+# The set documents of a submission by their part name (e.g. "SAMPLE"), with
+# their filename
+Documents = Dict[str, Tuple[str, bytes]]
+
+
+def _parse(receipt: bytes) -> Optional[Element]:
+    try:
+        return fromstring(receipt)
+    except Exception:
+        return None
+
+
+def error_aliases(receipt: Element) -> Set[str]:
+    """Aliases of the objects named in the error messages of a receipt."""
+    aliases = set()
+    for error in receipt.findall("MESSAGES/ERROR"):
+        aliases.update(_ERROR_ALIAS.findall(error.text or ""))
+    return aliases
+
+
+def _references(element: Element, aliases: Set[str]) -> bool:
+    # e.g. a run referencing a failed experiment fails as well
+    return any(child.get("refname") in aliases for child in element.iter())
+
+
+def _pending(root: Element, index: AccessionIndex) -> List[Element]:
+    return [el for el in root if el.get("alias") not in index.registered(el.tag)]
+
+
+def retry_failed_objects(
+    documents: Documents,
+    receipt: bytes,
+    submit: Callable[[Dict[str, tuple]], bytes],
+    retries: int,
+) -> bytes:
+    """
+    Submit the objects of a failed submission which were not registered again.
+
+    ENA processes every submission as a whole - a single invalid object fails
+    all the other objects submitted together with it. Every retry submits
+    the objects which were not registered yet, leaving out the objects named
+    in the error messages (and the objects referencing them), so that they
+    no longer prevent the others from being registered. If the errors name
+    no objects (e.g. a failure on the side of ENA), all of the objects which
+    were not registered are submitted again.
+
+    Parameters
+    ----------
+    documents : dict
+        The set documents of the submission (e.g. SAMPLE_SET) by their part
+        name, with their filename.
+    receipt : bytes
+        The receipt of the failed submission.
+    submit : callable
+        Function submitting the multipart `files` payload of the set
+        documents (without the SUBMISSION document) and returning the receipt.
+    retries : int
+        Maximum number of retries.
+
+    Returns
+    -------
+    bytes
+        A single receipt listing every object once (with its accession if it
+        was registered by any of the attempts) and the messages of all of
+        them. It is successful if all of the objects were registered.
+    """
+    roots = {part: fromstring(xml) for part, (_, xml) in documents.items()}
+    index, failed = AccessionIndex(), set()
+    receipts, messages = [receipt], []
+
+    for attempt in range(1, retries + 1):
+        last = _parse(receipts[-1])
+        if last is not None:
+            if last.get("success", "").lower() == "true":
+                break
+            index.add(last)
+            failed |= error_aliases(last)
+
+        files, submitted, left_out = {}, 0, 0
+        for part, root in roots.items():
+            retried = Element(root.tag, root.attrib)
+            for element in _pending(root, index):
+                if element.get("alias") in failed or _references(element, failed):
+                    left_out += 1
+                else:
+                    retried.append(element)
+            if len(retried):
+                files[part] = (
+                    documents[part][0],
+                    tostring(retried, encoding="utf8"),
+                    "text/xml",
+                )
+                submitted += len(retried)
+        if not files:
+            break
+
+        messages.append(
+            f"Retry {attempt}: {submitted} objects which were not registered were "
+            f"submitted again, {left_out} objects with errors were left out."
+        )
+        receipts.append(submit(files))
+
+    if len(receipts) == 1:
+        # nothing was submitted again
+        return receipt
+    last = _parse(receipts[-1])
+    if last is not None:
+        index.add(last)
+
+    merged = fromstring(merge_receipts(receipts))
+    # every object is listed once, registered by whichever attempt
+    objects: Dict[Tuple[str, str], Element] = {}
+    for element in list(merged):
+        if element.tag in REGISTERED_OBJECTS:
+            merged.remove(element)
+            key = (element.tag, element.get("alias"))
+            if key not in objects or element.get("accession"):
+                objects[key] = element
+    for i, element in enumerate(objects.values()):
+        merged.insert(i, element)
+
+    pending = sum(len(_pending(root, index)) for root in roots.values())
+    merged.set("success", "false" if pending else "true")
+    element = merged.find("MESSAGES")
+    if element is None:
+        element = SubElement(merged, "MESSAGES")
+    for message in messages:
+        SubElement(element, "INFO").text = message
+    return tostring(merged, encoding="utf-8", xml_declaration=True)
+
+
+def retry_failed_file(
+    path: str,
+    documents: Callable[[], Documents],
+    submit: Callable[[Dict[str, tuple]], bytes],
+    retries: int,
+):
+    """
+    Retry the failed objects of the submission whose receipt is stored in a file.
+
+    The receipt is replaced by the consolidated receipt of all the attempts
+    (see `retry_failed_objects`), and a warning is issued if some of the
+    objects could still not be registered.
+
+    Parameters
+    ----------
+    path : str
+        Path to the receipt of the submission.
+    documents : callable
+        Function returning the set documents of the submission - only called
+        if the submission failed.
+    submit : callable
+        Function submitting the multipart `files` payload of the set
+        documents and returning the receipt.
+    retries : int
+        Maximum number of retries.
+    """
+    with open(path, "rb") as fh:
+        receipt = fh.read()
+    root = _parse(receipt)
+    if root is not None and root.get("success", "").lower() == "true":
+        return
+
+    content = retry_failed_objects(documents(), receipt, submit, retries)
+    with open(path, "wb") as fh:
+        fh.write(content)
+    with open(path, "rb") as fh:
+        assert_success(fh)
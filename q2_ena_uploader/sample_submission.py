@@ -7,21 +7,38 @@
 # ----------------------------------------------------------------------------
 import os
 import warnings
-from typing import Optional
-from xml.etree.ElementTree import Element, SubElement, tostring, fromstring
+from typing import List, Optional, Tuple
+from xml.etree.ElementTree import Element, SubElement, tostring
 
-import requests
+import qiime2
 
+from q2_ena_uploader.accessions import (
+    AccessionIndex,
+    drop_registered,
+    merge_registered,
+    skipped_message,
+)
+from q2_ena_uploader.diff import diff_rows
+from q2_ena_uploader.metadata.render import render_set
+from q2_ena_uploader.metadata.sample import SampleSet
+from q2_ena_uploader.metadata.validation import assert_valid_xml
+from q2_ena_uploader.retry import retry_failed_file
 from q2_ena_uploader.types._types_and_formats import (
-    ENAMetadataSamplesFormat,
+    ENAMetadataSamplesDirFmt,
     ENAMetadataStudyFormat,
+    ENASubmissionReceiptFormat,
 )
 from q2_ena_uploader.utils import (
     ActionType,
-    DEV_SERVER_URL,
-    PRODUCTION_SERVER_URL,
+    annotate_receipt_file,
     assert_success,
     assert_credentials,
+    get_server_url,
+    merge_receipts,
+    post_submission,
+    receipt_status,
+    split_xml_set,
+    submit_batches,
 )
 
 
@@ -55,13 +72,47 @@ def _create_submission_xml(action: ActionType, hold_date: str) -> str:
     return tostring(submission, encoding="unicode", method="xml")
 
 
+def _changed_samples_xml(
+    samples: ENAMetadataSamplesDirFmt,
+    previous_samples: ENAMetadataSamplesDirFmt,
+    threads: int,
+) -> Tuple[Optional[bytes], List[str]]:
+    """
+    Render only the samples which changed compared to their previous version.
+
+    Parameters
+    ----------
+    samples : ENAMetadataSamplesDirFmt
+        The new sample metadata.
+    previous_samples : ENAMetadataSamplesDirFmt
+        The previously submitted sample metadata.
+    threads : int
+        Number of worker processes used to render the XML document.
+
+    Returns
+    -------
+    tuple
+        The SAMPLE_SET document of the changed samples (None if no sample
+        changed) and messages summarizing the skipped samples.
+    """
+    diff, changed = diff_rows(samples.records(), previous_samples.records(), "alias")
+    samples_xml = render_set(SampleSet, changed, threads) if changed else None
+    return samples_xml, diff.summary("samples")
+
+
 def submit_metadata_samples(
     study: Optional[ENAMetadataStudyFormat] = None,
-    samples: Optional[ENAMetadataSamplesFormat] = None,
+    samples: Optional[ENAMetadataSamplesDirFmt] = None,
+    previous_samples: Optional[ENAMetadataSamplesDirFmt] = None,
+    previous_receipts: Optional[List[ENASubmissionReceiptFormat]] = None,
     submission_hold_date: str = "",
     action: str = "ADD",
     dev: bool = True,
-) -> bytes:
+    batch_size: int = 0,
+    threads: int = 1,
+    retries: int = 0,
+    validate_xml: bool = True,
+) -> ENASubmissionReceiptFormat:
     """
     Submit study and/or sample metadata to the ENA server.
 
@@ -73,8 +124,19 @@ def submit_metadata_samples(
     ----------
     study : ENAMetadataStudyFormat, optional
         Study metadata in ENA format, by default None
-    samples : ENAMetadataSamplesFormat, optional
-        Sample metadata in ENA format, by default None
+    samples : ENAMetadataSamplesDirFmt, optional
+        Sample metadata in ENA format (stored as TSV or Parquet), by default
+        None
+    previous_samples : ENAMetadataSamplesDirFmt, optional
+        The previously submitted version of the sample metadata, by default
+        None. When provided with the MODIFY action, only the samples whose
+        metadata changed are submitted and the receipt lists how many were
+        skipped.
+    previous_receipts : list of ENASubmissionReceiptFormat, optional
+        Receipts of earlier submissions of the same metadata, by default None.
+        When provided with the ADD action, the study and samples which were
+        already registered are not submitted again and are added to the
+        receipt together with their accessions.
     submission_hold_date : str, optional
         Date until which the submission should be kept private, by default ""
         Format should be YYYY-MM-DD.
@@ -89,17 +151,46 @@ def submit_metadata_samples(
         Whether to use the development server, by default True
         - True: Submit to the development server for testing
         - False: Submit to the production server for real submissions
+    batch_size : int, optional
+        Maximum number of samples to include in a single submission,
+        by default 0 (all samples are submitted at once). When set, the
+        samples are split into batches which are submitted separately
+        (the study is submitted together with the first batch) and the
+        individual receipts are merged into one.
+    threads : int, optional
+        Number of worker processes used to render the XML documents and
+        maximum number of batches submitted concurrently, by default 1.
+    retries : int, optional
+        Number of times the objects which were not registered by a failed
+        submission are submitted again, by default 0. Objects named in the
+        errors of ENA are left out of the retries, so that they do not fail
+        the other objects again.
+    validate_xml : bool, optional
+        Whether an error is raised if the generated XML documents do not
+        conform to the ENA schemas bundled with the plugin, by default True.
+        If False, the problems are reported as a warning and the documents
+        are submitted nevertheless (e.g., when ENA accepts values which are
+        not yet part of the bundled schemas).
 
     Returns
     -------
-    bytes
-        The raw response content from the ENA server
+    ENASubmissionReceiptFormat
+        The receipt returned by the ENA server, streamed to disk as it is
+        received (or the merged receipt of all the batches when `batch_size`
+        is set, or of all the attempts when objects were retried)
 
     Raises
     ------
     RuntimeError
         If both study and samples are None
         If ENA username or password environment variables are not set
+    ValueError
+        If previous samples are provided without samples or for an ADD
+    ValueError
+        If previous receipts are provided for a MODIFY
+    ValueError
+        If the generated XML documents do not conform to the ENA schemas
+        and `validate_xml` is enabled
     """
 
     username = os.getenv("ENA_USERNAME")
@@ -117,34 +208,107 @@ def submit_metadata_samples(
             "Please ensure that either the Study file or the sample files are included "
             "for the ENA submission."
         )
+    if previous_samples is not None and (
+        samples is None or ActionType.from_string(action) != ActionType.MODIFY
+    ):
+        raise ValueError(
+            "Previous sample metadata can only be compared to new sample "
+            "metadata submitted with the MODIFY action."
+        )
 
-    files = {}
-    if study is not None:
-        files["PROJECT"] = ("project.xml", study.to_xml(), "text/xml")
-    if samples is not None:
-        files["SAMPLE"] = ("samples.xml", samples.to_xml(), "text/xml")
+    index = None
+    if previous_receipts:
+        if ActionType.from_string(action) != ActionType.ADD:
+            raise ValueError(
+                "Previous receipts can only be used to skip registered objects "
+                "when submitting with the ADD action."
+            )
+        index = AccessionIndex.from_receipts(previous_receipts)
 
+    url = get_server_url(dev)
     submission_xml = _create_submission_xml(
         ActionType.from_string(action), hold_date=submission_hold_date
     )
-    files["SUBMISSION"] = ("submission.xml", submission_xml, "text/xml")
-
-    url = DEV_SERVER_URL if dev else PRODUCTION_SERVER_URL
-    response = requests.post(url, auth=(username, password), files=files)
-
-    assert_success(response)
-
-    return response.content
-
 
-def _create_cancelation_xml(target_accession: str) -> str:
+    # validate all the documents offline before anything is sent to ENA
+    files, messages = {}, []
+    if study is not None:
+        study_xml = study.to_xml()
+        assert_valid_xml(study_xml, "study", strict=validate_xml)
+        if index is not None:
+            study_xml, skipped = drop_registered(study_xml, index.registered("PROJECT"))
+            messages.extend(skipped_message("studies", skipped))
+        if study_xml is not None:
+            files["PROJECT"] = ("project.xml", study_xml, "text/xml")
+
+    samples_xml = None
+    if samples is not None and previous_samples is not None:
+        samples_xml, changes = _changed_samples_xml(samples, previous_samples, threads)
+        messages.extend(changes)
+    elif samples is not None:
+        samples_xml = samples.to_xml(processes=threads)
+    if samples_xml is not None:
+        assert_valid_xml(samples_xml, "samples", strict=validate_xml)
+    if samples_xml is not None and index is not None:
+        samples_xml, skipped = drop_registered(samples_xml, index.registered("SAMPLE"))
+        messages.extend(skipped_message("samples", skipped))
+
+    # the set documents are submitted again without the registered objects
+    # if the submission fails
+    documents = {part: (filename, xml) for part, (filename, xml, _) in files.items()}
+    if samples_xml is not None:
+        documents["SAMPLE"] = ("samples.xml", samples_xml)
+
+    receipt = ENASubmissionReceiptFormat()
+    if not files and samples_xml is None:
+        # none of the objects changed or all of them are already registered,
+        # so there is nothing to submit
+        with receipt.open() as fh:
+            merge_receipts([], fh)
+    elif samples_xml is not None and batch_size > 0:
+        batches = []
+        for batch_xml in split_xml_set(samples_xml, batch_size) or [samples_xml]:
+            batch = {**files, "SAMPLE": ("samples.xml", batch_xml, "text/xml")}
+            batch["SUBMISSION"] = ("submission.xml", submission_xml, "text/xml")
+            batches.append(batch)
+            # the study only needs to be registered once
+            files.pop("PROJECT", None)
+        with receipt.open() as fh:
+            submit_batches(url, (username, password), batches, threads, fh)
+    else:
+        if samples_xml is not None:
+            files["SAMPLE"] = ("samples.xml", samples_xml, "text/xml")
+        files["SUBMISSION"] = ("submission.xml", submission_xml, "text/xml")
+
+        with receipt.open() as fh:
+            post_submission(url, (username, password), files, receipt=fh)
+
+        if retries == 0:
+            with open(str(receipt), "rb") as fh:
+                assert_success(fh)
+
+    if retries > 0 and documents:
+
+        def _submit(retried: dict) -> bytes:
+            retried["SUBMISSION"] = ("submission.xml", submission_xml, "text/xml")
+            return post_submission(url, (username, password), retried).content
+
+        retry_failed_file(str(receipt), lambda: documents, _submit, retries)
+    if index is not None:
+        merge_registered(str(receipt), index, ("PROJECT", "SAMPLE"))
+    annotate_receipt_file(str(receipt), messages)
+    return receipt
+
+
+def _create_cancelation_xml(*target_accessions: str) -> str:
     """
     Create an XML document for canceling a submission in ENA.
 
     Parameters
     ----------
-    target_accession : str
-        The accession number of the submission to cancel
+    *target_accessions : str
+        The accession number(s) of the submission(s) to cancel - one CANCEL
+        action is created for every accession
 
     Returns
     -------
@@ -153,13 +317,16 @@ def _create_cancelation_xml(target_accession: str) -> str:
     """
     submission = Element("SUBMISSION")
     actions = SubElement(submission, "ACTIONS")
-    action_element = SubElement(actions, "ACTION")
-    cancel = SubElement(action_element, "CANCEL")
-    cancel.set("target", target_accession)
+    for target_accession in target_accessions:
+        action_element = SubElement(actions, "ACTION")
+        cancel = SubElement(action_element, "CANCEL")
+        cancel.set("target", target_accession)
     return tostring(submission, encoding="unicode", method="xml")
 
 
-def cancel_submission(accession_number: str, dev: bool = True) -> bytes:
+def cancel_submission(
+    accession_number: str, dev: bool = True
+) -> ENASubmissionReceiptFormat:
     """
     Cancel a pending submission to the ENA server.
 
@@ -174,8 +341,8 @@ def cancel_submission(accession_number: str, dev: bool = True) -> bytes:
 
     Returns
     -------
-    bytes
-        The raw response content from the ENA server
+    ENASubmissionReceiptFormat
+        The receipt returned by the ENA server
 
     Raises
     ------
@@ -192,13 +359,15 @@ def cancel_submission(accession_number: str, dev: bool = True) -> bytes:
         )
     }
 
-    url = DEV_SERVER_URL if dev else PRODUCTION_SERVER_URL
-    response = requests.post(url, auth=(username, password), files=files)
+    url = get_server_url(dev)
+    receipt = ENASubmissionReceiptFormat()
+    with receipt.open() as fh:
+        post_submission(url, (username, password), files, receipt=fh)
 
     # Check if the response indicates failure
     try:
-        receipt = fromstring(response.content)
-        success = receipt.get("success", "").lower()
+        with open(str(receipt), "rb") as fh:
+            success, _ = receipt_status(fh)
         if success == "false":
             warnings.warn(
                 "ENA cancellation failed. Please inspect the returned XML "
@@ -210,4 +379,72 @@ def cancel_submission(accession_number: str, dev: bool = True) -> bytes:
             "Unable to parse ENA response. Please inspect the returned data manually."
         )
 
-    return response.content
+    return receipt
+
+
+def cancel_submissions(
+    accession_numbers: List[str] = None,
+    accessions: qiime2.Metadata = None,
+    dev: bool = True,
+    batch_size: int = 1,
+    threads: int = 1,
+) -> ENASubmissionReceiptFormat:
+    """
+    Cancel many pending submissions to the ENA server at once.
+
+    Parameters
+    ----------
+    accession_numbers : list of str, optional
+        The accession numbers of the submissions to cancel.
+    accessions : qiime2.Metadata, optional
+        Metadata whose IDs are accession numbers of the submissions to cancel,
+        e.g. loaded from a file listing one accession per line.
+    dev : bool, optional
+        Whether to use the development server, by default True.
+        - True: Submit to the development server for testing
+        - False: Submit to the production server for real submissions
+    batch_size : int, optional
+        Number of CANCEL actions included in a single submission document,
+        by default 1.
+    threads : int, optional
+        Maximum number of cancellations submitted concurrently, by default 1.
+
+    Returns
+    -------
+    ENASubmissionReceiptFormat
+        A single receipt merged from the receipts of all the cancellations
+
+    Raises
+    ------
+    RuntimeError
+        If ENA credentials are not set in environment variables
+        If no accession numbers were provided
+    """
+    username, password = assert_credentials()
+
+    targets = list(accession_numbers or [])
+    if accessions is not None:
+        targets.extend(accessions.ids)
+    # the same accession can only be cancelled once
+    targets = list(dict.fromkeys(targets))
+    if not targets:
+        raise RuntimeError(
+            "Please provide the accession numbers of the submissions to cancel."
+        )
+
+    batches = [
+        {
+            "SUBMISSION": (
+                "submission.xml",
+                _create_cancelation_xml(*targets[i : i + batch_size]),
+                "text/xml",
+            )
+        }
+        for i in range(0, len(targets), batch_size)
+    ]
+
+    url = get_server_url(dev)
+    receipt = ENASubmissionReceiptFormat()
+    with receipt.open() as fh:
+        submit_batches(url, (username, password), batches, threads, fh)
+    return receipt
@@ -0,0 +1,129 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import unittest
+from xml.etree.ElementTree import fromstring
+
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_ena_uploader.accessions import (
+    AccessionIndex,
+    drop_registered,
+    merge_registered,
+    skipped_message,
+)
+from q2_ena_uploader.types import ENASubmissionReceiptFormat
+
+FIRST_RECEIPT = (
+    b'<RECEIPT receiptDate="2025-01-01" submissionFile="submission.xml" '
+    b'success="false">'
+    b'<PROJECT accession="PRJEB1" alias="study1" status="PRIVATE"/>'
+    b'<SAMPLE accession="ERS1" alias="s1" status="PRIVATE">'
+    b'<EXT_ID accession="SAMEA1" type="biosample"/></SAMPLE>'
+    b'<SAMPLE alias="s2" status="PRIVATE"/>'
+    b"<MESSAGES><ERROR>s2 failed</ERROR></MESSAGES>"
+    b"</RECEIPT>"
+)
+SECOND_RECEIPT = (
+    b'<RECEIPT receiptDate="2025-01-02" submissionFile="submission.xml" '
+    b'success="true">'
+    b'<SAMPLE accession="ERS2" alias="s2" status="PRIVATE"/>'
+    b'<EXPERIMENT accession="ERX1" alias="exp_s1" status="PRIVATE"/>'
+    b"<MESSAGES/>"
+    b"</RECEIPT>"
+)
+
+
+class TestAccessionIndex(TestPluginBase):
+    package = "q2_ena_uploader.tests"
+
+    def _receipt(self, content: bytes) -> ENASubmissionReceiptFormat:
+        receipt = ENASubmissionReceiptFormat()
+        with receipt.open() as fh:
+            fh.write(content)
+        return receipt
+
+    def setUp(self):
+        super().setUp()
+        self.index = AccessionIndex.from_receipts(
+            [self._receipt(FIRST_RECEIPT), self._receipt(SECOND_RECEIPT)]
+        )
+
+    def test_registered_objects(self):
+        self.assertEqual(self.index.accession("PROJECT", "study1"), "PRJEB1")
+        self.assertEqual(self.index.accession("SAMPLE", "s1"), "ERS1")
+        self.assertEqual(self.index.accession("SAMPLE", "s2"), "ERS2")
+        self.assertEqual(self.index.accession("EXPERIMENT", "exp_s1"), "ERX1")
+        self.assertIsNone(self.index.accession("SAMPLE", "s3"))
+        self.assertEqual(set(self.index.registered("SAMPLE")), {"s1", "s2"})
+        self.assertEqual(set(self.index.registered("RUN")), set())
+
+    def test_objects_without_accession_not_registered(self):
+        index = AccessionIndex.from_receipts([self._receipt(FIRST_RECEIPT)])
+
+        self.assertEqual(set(index.registered("SAMPLE")), {"s1"})
+
+    def test_receipt(self):
+        receipt = fromstring(self.index.receipt(["SAMPLE"]))
+
+        self.assertEqual(receipt.get("success"), "true")
+        self.assertEqual(
+            [(el.get("alias"), el.get("accession")) for el in receipt.iter("SAMPLE")],
+            [("s1", "ERS1"), ("s2", "ERS2")],
+        )
+        self.assertIsNotNone(receipt.find("SAMPLE/EXT_ID"))
+        self.assertIsNone(receipt.find("PROJECT"))
+
+    def test_merge_registered(self):
+        receipt = self._receipt(
+            b'<RECEIPT receiptDate="2025-01-03" submissionFile="submission.xml" '
+            b'success="true"><SAMPLE accession="ERS3" alias="s3"/>'
+            b'<SUBMISSION accession="ERA3" alias="sub3"/><MESSAGES/></RECEIPT>'
+        )
+
+        merge_registered(str(receipt), self.index, ("PROJECT", "SAMPLE"))
+
+        with open(str(receipt), "rb") as fh:
+            merged = fromstring(fh.read())
+        self.assertEqual(merged.get("success"), "true")
+        self.assertEqual(merged.get("receiptDate"), "2025-01-03")
+        self.assertEqual(
+            [el.get("accession") for el in merged.iter("SAMPLE")],
+            ["ERS3", "ERS1", "ERS2"],
+        )
+        self.assertEqual(merged.find("PROJECT").get("accession"), "PRJEB1")
+        self.assertEqual(merged.find("SUBMISSION").get("accession"), "ERA3")
+
+
+class TestDropRegistered(unittest.TestCase):
+    XML = b'<SAMPLE_SET><SAMPLE alias="s1"/><SAMPLE alias="s2"/></SAMPLE_SET>'
+
+    def test_drop_registered(self):
+        xml, skipped = drop_registered(self.XML, {"s1", "s3"})
+
+        self.assertEqual([el.get("alias") for el in fromstring(xml)], ["s2"])
+        self.assertEqual(skipped, ["s1"])
+
+    def test_nothing_registered(self):
+        self.assertEqual(drop_registered(self.XML, set()), (self.XML, []))
+
+    def test_all_registered(self):
+        self.assertEqual(drop_registered(self.XML, {"s1", "s2"}), (None, ["s1", "s2"]))
+
+    def test_skipped_message(self):
+        self.assertEqual(skipped_message("samples", []), [])
+        self.assertEqual(
+            skipped_message("samples", ["s1", "s2"]),
+            [
+                "2 samples already registered in the previous receipts were not "
+                "submitted again."
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
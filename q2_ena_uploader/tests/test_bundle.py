@@ -0,0 +1,354 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+from xml.etree.ElementTree import fromstring
+
+import pandas as pd
+from qiime2.plugin import ValidationError
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_ena_uploader.bundle import prepare_submission, send_submission
+from q2_ena_uploader.metadata.validation import validate_xml
+from q2_ena_uploader.types import (
+    ENAMetadataExperimentFormat,
+    ENAMetadataSamplesDirFmt,
+    ENAMetadataSamplesFormat,
+    ENAMetadataStudyFormat,
+    ENASubmissionBundleDirFmt,
+)
+from q2_ena_uploader.types._render_cache import RENDER_CACHE_ENABLED_ENV
+from q2_ena_uploader.types._validation_cache import CACHE_ENABLED_ENV
+from q2_ena_uploader.utils import PRODUCTION_SERVER_URL
+
+SAMPLES_XML = (
+    b"<SAMPLE_SET>"
+    b'<SAMPLE alias="sample0"/><SAMPLE alias="sample1"/><SAMPLE alias="sample2"/>'
+    b"</SAMPLE_SET>"
+)
+EXPERIMENT_XML = (
+    b"<EXPERIMENT_SET>"
+    b'<EXPERIMENT alias="exp_sample0"/>'
+    b'<EXPERIMENT alias="exp_sample1"/>'
+    b'<EXPERIMENT alias="exp_sample2"/>'
+    b"</EXPERIMENT_SET>"
+)
+# the example metadata files of the documentation
+DOCS_DIR = os.path.join(
+    os.path.dirname(__file__), os.pardir, os.pardir, "docs", "_static"
+)
+PARSED_DATA = {
+    f"sample{i}": {"filename": [f"sample{i}.fastq.gz"], "checksum": [f"md5-{i}"]}
+    for i in range(3)
+}
+
+
+def _receipt(alias: str) -> bytes:
+    return (
+        b'<RECEIPT receiptDate="2025-01-01" submissionFile="submission.xml" '
+        b'success="true"><SAMPLE alias="' + alias.encode() + b'"/></RECEIPT>'
+    )
+
+
+@patch("q2_ena_uploader.bundle.assert_valid_xml")
+@patch("q2_ena_uploader.bundle._validate_sample_ids_match")
+@patch("q2_ena_uploader.bundle._process_manifest", return_value=PARSED_DATA)
+class TestPrepareSubmission(TestPluginBase):
+    package = "q2_ena_uploader.tests"
+
+    def _inputs(self):
+        study = MagicMock()
+        study.to_xml.return_value = b"<PROJECT_SET><PROJECT/></PROJECT_SET>"
+        samples = MagicMock()
+        samples.to_xml.return_value = SAMPLES_XML
+        experiment = MagicMock()
+        experiment.to_xml.side_effect = lambda processes, file: file.write(
+            EXPERIMENT_XML
+        )
+        demux = MagicMock()
+        demux.manifest = pd.DataFrame(index=list(PARSED_DATA))
+        return study, samples, experiment, demux
+
+    def _read(self, bundle, path) -> bytes:
+        with open(os.path.join(str(bundle), path), "rb") as fh:
+            return fh.read()
+
+    def test_prepare_everything(self, mock_process, mock_validate, mock_assert_valid):
+        study, samples, experiment, demux = self._inputs()
+
+        bundle = prepare_submission(
+            study=study,
+            samples=samples,
+            experiment=experiment,
+            demux=demux,
+            submission_hold_date="2025-12-31",
+        )
+
+        manifest = bundle.read_manifest()
+        self.assertEqual(manifest["action"], "ADD")
+        self.assertEqual(manifest["submission_hold_date"], "2025-12-31")
+        self.assertEqual(manifest["files"], PARSED_DATA)
+        self.assertEqual(
+            [(s["stage"], list(s["documents"])) for s in manifest["submissions"]],
+            [
+                ("samples", ["PROJECT", "SAMPLE", "SUBMISSION"]),
+                ("reads", ["SUBMISSION", "EXPERIMENT", "RUN"]),
+            ],
+        )
+        samples_docs, reads_docs = (s["documents"] for s in manifest["submissions"])
+        self.assertEqual(samples_docs["SAMPLE"]["path"], "samples_1_sample.xml")
+        self.assertEqual(samples_docs["SAMPLE"]["filename"], "samples.xml")
+        self.assertEqual(self._read(bundle, "samples_1_sample.xml"), SAMPLES_XML)
+        self.assertEqual(self._read(bundle, "reads_1_experiment.xml"), EXPERIMENT_XML)
+        runs = fromstring(self._read(bundle, "reads_1_run.xml"))
+        self.assertEqual(
+            [run.get("alias") for run in runs], [f"run_{i}" for i in PARSED_DATA]
+        )
+        submission = fromstring(self._read(bundle, "reads_1_submission.xml"))
+        self.assertIsNotNone(submission.find("ACTIONS/ACTION/ADD"))
+        self.assertEqual(
+            submission.find("ACTIONS/ACTION/HOLD").get("HoldUntilDate"), "2025-12-31"
+        )
+
+        # the sample IDs are checked without the transfer metadata and receipt
+        self.assertEqual(mock_validate.call_args[0][1:], (None, None, experiment))
+        self.assertEqual(
+            [c[0][1] for c in mock_assert_valid.call_args_list],
+            ["study", "samples", "experiment"],
+        )
+        bundle.validate(level="max")
+
+    def test_prepare_in_batches(self, mock_process, mock_validate, mock_assert_valid):
+        study, samples, experiment, demux = self._inputs()
+
+        bundle = prepare_submission(
+            study=study,
+            samples=samples,
+            experiment=experiment,
+            demux=demux,
+            action="MODIFY",
+            batch_size=2,
+        )
+
+        submissions = bundle.submissions()
+        self.assertEqual(
+            [(stage, sorted(docs)) for stage, docs in submissions],
+            [
+                ("samples", ["PROJECT", "SAMPLE", "SUBMISSION"]),
+                ("samples", ["SAMPLE", "SUBMISSION"]),
+                ("reads", ["EXPERIMENT", "RUN", "SUBMISSION"]),
+                ("reads", ["EXPERIMENT", "RUN", "SUBMISSION"]),
+            ],
+        )
+        _, reads = submissions[3]
+        with open(reads["RUN"][1], "rb") as fh:
+            runs = fromstring(fh.read())
+        self.assertEqual([run.get("alias") for run in runs], ["run_sample2"])
+        self.assertEqual(bundle.read_manifest()["action"], "MODIFY")
+
+    def test_prepare_samples_only(self, mock_process, mock_validate, mock_assert_valid):
+        _, samples, _, _ = self._inputs()
+
+        bundle = prepare_submission(samples=samples, threads=4)
+
+        manifest = bundle.read_manifest()
+        self.assertEqual(len(manifest["submissions"]), 1)
+        self.assertEqual(manifest["files"], {})
+        samples.to_xml.assert_called_once_with(processes=4)
+        mock_process.assert_not_called()
+
+    def test_prepare_nothing(self, mock_process, mock_validate, mock_assert_valid):
+        with self.assertRaisesRegex(RuntimeError, "Please ensure"):
+            prepare_submission()
+
+    def test_prepare_experiment_without_demux(
+        self, mock_process, mock_validate, mock_assert_valid
+    ):
+        _, _, experiment, _ = self._inputs()
+        with self.assertRaisesRegex(ValueError, "provided together"):
+            prepare_submission(experiment=experiment)
+
+    def test_modified_document(self, mock_process, mock_validate, mock_assert_valid):
+        _, samples, _, _ = self._inputs()
+        bundle = prepare_submission(samples=samples)
+        with open(os.path.join(str(bundle), "samples_1_sample.xml"), "ab") as fh:
+            fh.write(b"<!-- modified -->")
+
+        bundle.validate(level="min")
+        with self.assertRaisesRegex(ValidationError, "checksum"):
+            bundle.validate(level="max")
+
+
+class TestSendSubmission(TestPluginBase):
+    package = "q2_ena_uploader.tests"
+
+    @patch("q2_ena_uploader.bundle.assert_valid_xml")
+    @patch("q2_ena_uploader.bundle._validate_sample_ids_match")
+    @patch("q2_ena_uploader.bundle._process_manifest", return_value=PARSED_DATA)
+    def _bundle(self, *_) -> ENASubmissionBundleDirFmt:
+        samples = MagicMock()
+        samples.to_xml.return_value = SAMPLES_XML
+        experiment = MagicMock()
+        experiment.to_xml.side_effect = lambda processes, file: file.write(
+            EXPERIMENT_XML
+        )
+        demux = MagicMock()
+        demux.manifest = pd.DataFrame(index=list(PARSED_DATA))
+        return prepare_submission(
+            samples=samples, experiment=experiment, demux=demux, batch_size=2
+        )
+
+    @patch.dict(os.environ, {"ENA_USERNAME": "test_user", "ENA_PASSWORD": "pass"})
+    @patch("q2_ena_uploader.bundle.submit_batches")
+    def test_send_submission(self, mock_submit_batches):
+        bundle = self._bundle()
+        sent = []
+
+        def _submit(url, auth, batches, threads):
+            # the documents are streamed from the files of the bundle
+            sent.append(
+                [
+                    {
+                        part: content if isinstance(content, bytes) else content.read()
+                        for part, (_, content, _) in batch.items()
+                    }
+                    for batch in batches
+                ]
+            )
+            return _receipt(f"stage{len(sent)}")
+
+        mock_submit_batches.side_effect = _submit
+
+        receipt = send_submission(bundle, dev=False, threads=3)
+
+        self.assertEqual(len(sent), 2)
+        samples_batches, reads_batches = sent
+        self.assertEqual(len(samples_batches), 2)
+        self.assertEqual(len(reads_batches), 2)
+        self.assertEqual(
+            [el.get("alias") for el in fromstring(samples_batches[1]["SAMPLE"])],
+            ["sample2"],
+        )
+        self.assertIn(b"<ADD", reads_batches[0]["SUBMISSION"])
+        for call in mock_submit_batches.call_args_list:
+            url, auth, _, threads = call[0]
+            self.assertEqual(url, PRODUCTION_SERVER_URL)
+            self.assertEqual(auth, ("test_user", "pass"))
+            self.assertEqual(threads, 3)
+
+        with open(str(receipt), "rb") as fh:
+            merged = fromstring(fh.read())
+        self.assertEqual(merged.get("success"), "true")
+        self.assertEqual(
+            [el.get("alias") for el in merged.findall("SAMPLE")], ["stage1", "stage2"]
+        )
+
+    @patch.dict(os.environ, {"ENA_USERNAME": "test_user", "ENA_PASSWORD": "pass"})
+    @patch("q2_ena_uploader.bundle.submit_batches")
+    def test_send_failed_samples(self, mock_submit_batches):
+        bundle = self._bundle()
+        mock_submit_batches.return_value = (
+            b'<RECEIPT receiptDate="2025-01-01" submissionFile="submission.xml" '
+            b'success="false"><MESSAGES><ERROR>Invalid sample.</ERROR></MESSAGES>'
+            b"</RECEIPT>"
+        )
+
+        with self.assertRaisesRegex(ValueError, "Invalid sample"):
+            send_submission(bundle)
+
+        # the reads referring to the samples are not sent
+        mock_submit_batches.assert_called_once()
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_send_missing_credentials(self):
+        with self.assertRaisesRegex(RuntimeError, "Missing username or password"):
+            send_submission(MagicMock())
+
+
+@unittest.skipUnless(os.path.isdir(DOCS_DIR), "documentation is not available")
+@patch.dict(
+    os.environ,
+    {
+        "ENA_USERNAME": "test_user",
+        "ENA_PASSWORD": "pass",
+        CACHE_ENABLED_ENV: "false",
+        RENDER_CACHE_ENABLED_ENV: "false",
+    },
+)
+class TestDocumentedExamples(TestPluginBase):
+    package = "q2_ena_uploader.tests"
+
+    def _samples(self, filename: str) -> ENAMetadataSamplesDirFmt:
+        dirfmt = ENAMetadataSamplesDirFmt()
+        dirfmt.append_shard(
+            ENAMetadataSamplesFormat(os.path.join(DOCS_DIR, filename), "r")
+        )
+        return dirfmt
+
+    @patch("q2_ena_uploader.bundle._validate_sample_ids_match")
+    @patch("q2_ena_uploader.bundle.submit_batches")
+    def test_examples_submitted(self, mock_submit_batches, mock_validate):
+        """Test that the example metadata of the documentation is submitted."""
+        mock_submit_batches.side_effect = lambda *_: _receipt("sample_name1")
+
+        for study, samples, experiment in [
+            ("study-minimal.tsv", "sample-minimal.tsv", "experiment-minimal.tsv"),
+            (
+                "study-extended.tsv",
+                "sample-extended.tsv",
+                "experiment-extended-paired-reads.tsv",
+            ),
+            (
+                "study-extended.tsv",
+                "sample-extended.tsv",
+                "experiment-extended-single-reads.tsv",
+            ),
+        ]:
+            with self.subTest(experiment=experiment):
+                experiment = ENAMetadataExperimentFormat(
+                    os.path.join(DOCS_DIR, experiment), "r"
+                )
+                demux = MagicMock()
+                demux.manifest = pd.DataFrame(index=list(PARSED_DATA))
+                with patch(
+                    "q2_ena_uploader.bundle._process_manifest",
+                    return_value=PARSED_DATA,
+                ):
+                    bundle = prepare_submission(
+                        study=ENAMetadataStudyFormat(
+                            os.path.join(DOCS_DIR, study), "r"
+                        ),
+                        samples=self._samples(samples),
+                        experiment=experiment,
+                        demux=demux,
+                    )
+                for _, documents in bundle.submissions():
+                    for part, (_, path) in documents.items():
+                        self.assertEqual(validate_xml(path), [], part)
+
+                receipt = send_submission(bundle)
+
+                with open(str(receipt), "rb") as fh:
+                    self.assertEqual(fromstring(fh.read()).get("success"), "true")
+
+    @patch("q2_ena_uploader.metadata.validation.validate_xml")
+    def test_invalid_example_warns(self, mock_validate_xml):
+        """Test that schema errors only warn when validation is not strict."""
+        mock_validate_xml.return_value = ["SAMPLE 1 (alias 'sample_name1'): error"]
+        samples = self._samples("sample-minimal.tsv")
+
+        with self.assertRaisesRegex(ValueError, "does not conform"):
+            prepare_submission(samples=samples)
+        with self.assertWarnsRegex(UserWarning, "alias 'sample_name1'"):
+            bundle = prepare_submission(samples=samples, validate_xml=False)
+        self.assertEqual(len(list(bundle.submissions())), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
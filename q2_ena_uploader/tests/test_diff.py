@@ -0,0 +1,68 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import unittest
+
+from q2_ena_uploader.diff import MAX_LISTED_ALIASES, MetadataDiff, diff_rows, row_digest
+
+
+class TestRowDigest(unittest.TestCase):
+    def test_column_order_ignored(self):
+        self.assertEqual(
+            row_digest({"alias": "s1", "taxon_id": "9606"}),
+            row_digest({"taxon_id": "9606", "alias": "s1"}),
+        )
+
+    def test_missing_values_ignored(self):
+        digest = row_digest({"alias": "s1"})
+        self.assertEqual(row_digest({"alias": "s1", "country": None}), digest)
+        self.assertEqual(row_digest({"alias": "s1", "country": ""}), digest)
+        self.assertNotEqual(row_digest({"alias": "s1", "country": "Peru"}), digest)
+
+    def test_values_compared_as_strings(self):
+        self.assertEqual(
+            row_digest({"alias": "s1", "taxon_id": 9606}),
+            row_digest({"alias": "s1", "taxon_id": "9606"}),
+        )
+
+
+class TestDiffRows(unittest.TestCase):
+    def test_diff_rows(self):
+        rows = [
+            {"alias": "s3", "country": "Chile"},
+            {"alias": "s1", "country": "Peru"},
+            {"alias": "s2", "country": "Brazil"},
+        ]
+        previous = [
+            {"alias": "s1", "country": "Peru"},
+            {"alias": "s2", "country": "Chile"},
+            {"alias": "s4", "country": "Chile"},
+        ]
+
+        diff, changed = diff_rows(rows, iter(previous), "alias")
+
+        self.assertEqual(diff, MetadataDiff(["s2"], ["s1"], ["s3"], ["s4"]))
+        self.assertEqual(changed, [rows[2]])
+
+    def test_summary(self):
+        aliases = [f"s{i}" for i in range(MAX_LISTED_ALIASES + 2)]
+        diff = MetadataDiff(["s1"], [], aliases, [])
+
+        messages = diff.summary("samples")
+
+        self.assertEqual(len(messages), 2)
+        self.assertEqual(
+            messages[0],
+            "Differential MODIFY: 1 changed samples were submitted, "
+            "0 unchanged samples were skipped.",
+        )
+        self.assertIn(f"s{MAX_LISTED_ALIASES - 1} and 2 more.", messages[1])
+        self.assertNotIn(f"s{MAX_LISTED_ALIASES},", messages[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,217 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import os
+import unittest
+from unittest.mock import patch, MagicMock
+from xml.etree.ElementTree import fromstring, parse
+
+import requests
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_ena_uploader.drop_box_server import DropBox, DropBoxServer
+from q2_ena_uploader.sample_submission import (
+    _create_cancelation_xml,
+    submit_metadata_samples,
+)
+from q2_ena_uploader.utils import (
+    DEV_SERVER_URL,
+    PRODUCTION_SERVER_URL,
+    get_server_url,
+    post_submission,
+)
+
+SUBMISSION_ADD = (
+    "<SUBMISSION><ACTIONS><ACTION><ADD /></ACTION>"
+    '<ACTION><HOLD HoldUntilDate="2030-01-01" /></ACTION></ACTIONS></SUBMISSION>'
+)
+SUBMISSION_MODIFY = (
+    "<SUBMISSION><ACTIONS><ACTION><MODIFY /></ACTION></ACTIONS></SUBMISSION>"
+)
+SAMPLES = b'<SAMPLE_SET><SAMPLE alias="s1"/><SAMPLE alias="s2"/></SAMPLE_SET>'
+
+
+class TestDropBox(TestPluginBase):
+    """Tests for the state of the stand-in drop-box."""
+
+    package = "q2_ena_uploader.tests"
+
+    def setUp(self):
+        super().setUp()
+        self.drop_box = DropBox()
+
+    def _submit(self, submission, **documents):
+        return fromstring(self.drop_box.submit({"SUBMISSION": submission, **documents}))
+
+    def test_add(self):
+        """Test that added objects are assigned accessions."""
+        receipt = self._submit(
+            SUBMISSION_ADD,
+            PROJECT=b'<PROJECT_SET><PROJECT alias="p1"/></PROJECT_SET>',
+            SAMPLE=SAMPLES,
+        )
+
+        self.assertEqual(receipt.get("success"), "true")
+        project = receipt.find("PROJECT")
+        self.assertEqual(project.get("accession"), "PRJEB000001")
+        self.assertEqual(project.get("holdUntilDate"), "2030-01-01")
+        self.assertEqual(
+            [(s.get("alias"), s.get("accession")) for s in receipt.iter("SAMPLE")],
+            [("s1", "ERS000001"), ("s2", "ERS000002")],
+        )
+        self.assertEqual(receipt.find("SAMPLE/EXT_ID").get("type"), "biosample")
+        self.assertEqual(receipt.find("SUBMISSION").get("accession"), "ERA000001")
+        self.assertEqual(receipt.find("ACTIONS").text, "ADD HOLD")
+
+    def test_add_existing_is_atomic(self):
+        """Test that nothing is registered if any added object exists."""
+        self._submit(
+            SUBMISSION_ADD, SAMPLE=b'<SAMPLE_SET><SAMPLE alias="s1"/></SAMPLE_SET>'
+        )
+
+        receipt = self._submit(SUBMISSION_ADD, SAMPLE=SAMPLES)
+
+        self.assertEqual(receipt.get("success"), "false")
+        self.assertIsNone(receipt.find("SAMPLE"))
+        self.assertIn(
+            'already exists in the submission account with accession: "ERS000001"',
+            receipt.find("MESSAGES/ERROR").text,
+        )
+        self.assertNotIn(("", "SAMPLE", "s2"), self.drop_box.accessions)
+
+    def test_modify(self):
+        """Test that modified objects keep their accessions."""
+        self._submit(SUBMISSION_ADD, SAMPLE=SAMPLES)
+
+        receipt = self._submit(SUBMISSION_MODIFY, SAMPLE=SAMPLES)
+
+        self.assertEqual(receipt.get("success"), "true")
+        self.assertEqual(
+            [s.get("accession") for s in receipt.iter("SAMPLE")],
+            ["ERS000001", "ERS000002"],
+        )
+
+    def test_modify_unknown(self):
+        """Test that objects which were never added cannot be modified."""
+        receipt = self._submit(SUBMISSION_MODIFY, SAMPLE=SAMPLES)
+
+        self.assertEqual(receipt.get("success"), "false")
+        self.assertEqual(len(receipt.findall("MESSAGES/ERROR")), 2)
+
+    def test_cancel(self):
+        """Test that registered objects can only be cancelled once."""
+        self._submit(SUBMISSION_ADD, SAMPLE=SAMPLES)
+        cancellation = _create_cancelation_xml("ERS000001")
+
+        first = self._submit(cancellation)
+        second = self._submit(cancellation)
+
+        self.assertEqual(first.get("success"), "true")
+        self.assertEqual(second.get("success"), "false")
+
+    def test_missing_submission(self):
+        """Test that submissions without a submission document fail."""
+        receipt = fromstring(self.drop_box.submit({"SAMPLE": SAMPLES}))
+
+        self.assertEqual(receipt.get("success"), "false")
+        self.assertIn("missing", receipt.find("MESSAGES/ERROR").text)
+
+
+class TestDropBoxServer(TestPluginBase):
+    """Tests for the stand-in drop-box server."""
+
+    package = "q2_ena_uploader.tests"
+
+    def _files(self, submission=SUBMISSION_ADD):
+        return {
+            "SUBMISSION": ("submission.xml", submission, "text/xml"),
+            "SAMPLE": ("samples.xml", SAMPLES, "text/xml"),
+        }
+
+    def test_submission(self):
+        """Test that multipart submissions are processed."""
+        with DropBoxServer() as server:
+            response = post_submission(server.url, ("user", "pass"), self._files())
+
+        self.assertEqual(response.status_code, 200)
+        receipt = fromstring(response.content)
+        self.assertEqual(len(receipt.findall("SAMPLE")), 2)
+        self.assertEqual(server.stats, {"requests": 1, "errors": 0})
+
+    def test_unauthorized(self):
+        """Test that requests without credentials are rejected."""
+        with DropBoxServer() as server:
+            response = requests.post(server.url, files=self._files())
+
+        self.assertEqual(response.status_code, 401)
+
+    @patch("q2_ena_uploader.utils.time.sleep")
+    def test_injected_errors(self, mock_sleep):
+        """Test that injected server errors are retried by the client."""
+        with DropBoxServer(error_rate=1.0, error_status=502) as server:
+            response = post_submission(
+                server.url,
+                ("user", "pass"),
+                self._files(SUBMISSION_MODIFY),
+                retries=2,
+            )
+
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(server.stats, {"requests": 3, "errors": 3})
+        self.assertEqual(server.drop_box.accessions, {})
+
+    @patch("q2_ena_uploader.utils.time.sleep")
+    def test_injected_errors_add(self, mock_sleep):
+        """Test that an ADD which reached the server is not sent again."""
+        with DropBoxServer(error_rate=1.0, error_status=502) as server:
+            response = post_submission(
+                server.url, ("user", "pass"), self._files(), retries=2
+            )
+
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(server.stats, {"requests": 1, "errors": 1})
+
+    @patch("q2_ena_uploader.sample_submission.assert_valid_xml")
+    def test_submit_metadata_samples(self, mock_assert_valid):
+        """Test a batched sample submission end-to-end."""
+        samples = MagicMock()
+        samples.to_xml.return_value = SAMPLES
+
+        with DropBoxServer(latency=0.01) as server:
+            env = {
+                "ENA_USERNAME": "user",
+                "ENA_PASSWORD": "pass",
+                "ENA_SERVER_URL": server.url,
+            }
+            with patch.dict(os.environ, env):
+                result = submit_metadata_samples(
+                    samples=samples, batch_size=1, threads=2
+                )
+
+        receipt = parse(str(result)).getroot()
+        self.assertEqual(receipt.get("success"), "true")
+        self.assertEqual(
+            sorted(s.get("alias") for s in receipt.iter("SAMPLE")), ["s1", "s2"]
+        )
+        self.assertEqual(server.stats["requests"], 2)
+
+
+class TestGetServerUrl(unittest.TestCase):
+    """Tests for the get_server_url function."""
+
+    def test_default_urls(self):
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(get_server_url(dev=True), DEV_SERVER_URL)
+            self.assertEqual(get_server_url(dev=False), PRODUCTION_SERVER_URL)
+
+    def test_url_from_environment(self):
+        with patch.dict(os.environ, {"ENA_SERVER_URL": "http://localhost/submit"}):
+            self.assertEqual(get_server_url(dev=False), "http://localhost/submit")
+
+
+if __name__ == "__main__":
+    unittest.main()
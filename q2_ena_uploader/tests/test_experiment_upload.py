@@ -6,7 +6,8 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 import unittest
-from unittest.mock import patch, mock_open, MagicMock
+from unittest.mock import patch, MagicMock
+from xml.etree.ElementTree import fromstring
 
 import pandas as pd
 import qiime2
@@ -16,20 +17,20 @@ from q2_ena_uploader import submit_metadata_reads
 
 class TestUploadReadsToEna(unittest.TestCase):
 
+    @patch("q2_ena_uploader.read_submission.assert_valid_xml")
     @patch("q2_ena_uploader.read_submission._validate_sample_ids_match")
-    @patch("requests.post")
+    @patch("requests.Session.post")
     @patch("os.getenv")
-    @patch("builtins.open", new_callable=mock_open, read_data=b"binary_data_for_md5")
     @patch("q2_ena_uploader.read_submission._process_manifest")
     @patch("q2_ena_uploader.metadata.run._run_set_from_dict")
     def test_upload_reads_to_ena(
         self,
         mock_run_from_dict,
         mock_process_manifest,
-        mock_open_file,
         mock_getenv,
         mock_post,
         mock_validate,
+        mock_assert_valid,
     ):
         # Arrange
         demux = MagicMock()
@@ -65,9 +66,20 @@ class TestUploadReadsToEna(unittest.TestCase):
         mock_getenv.side_effect = lambda key: (
             "mock_user" if key == "ENA_USERNAME" else "mock_pass"
         )
-        mock_post.return_value = MagicMock(
-            status_code=200, content=b"<RECEIPT>Success</RECEIPT>"
+        experiment.to_xml.side_effect = lambda processes, file: file.write(
+            b'<EXPERIMENT_SET><EXPERIMENT alias="exp_0"/></EXPERIMENT_SET>'
         )
+        # the documents are streamed from temporary files, so the request
+        # body has to be read while the request is being sent
+        bodies = []
+
+        def _post(url, **kwargs):
+            bodies.append(kwargs["data"].read())
+            response = MagicMock(status_code=200)
+            response.iter_content.return_value = [b"<RECEIPT>Success</RECEIPT>"]
+            return response
+
+        mock_post.side_effect = _post
 
         # Act
         result = submit_metadata_reads(
@@ -89,30 +101,28 @@ class TestUploadReadsToEna(unittest.TestCase):
         # Check the POST request (auth and URL remain the same)
         mock_post.assert_called_once()
 
-        # Retrieve actual call details
-        actual_call_args = mock_post.call_args[
-            1
-        ]  # This gives us the kwargs dictionary from the call
+        body = bodies[0]
 
-        # Assert critical components in the 'files' dictionary
-        self.assertIn("SUBMISSION", actual_call_args["files"])
-        self.assertIn("EXPERIMENT", actual_call_args["files"])
-        self.assertIn("RUN", actual_call_args["files"])
+        # Assert critical components of the multipart body
+        self.assertIn(b'name="SUBMISSION"', body)
+        self.assertIn(b'name="EXPERIMENT"', body)
+        self.assertIn(b'name="RUN"', body)
+        self.assertIn(b'<EXPERIMENT alias="exp_0"/>', body)
 
         # Assert that file content exists and its structure looks correct
-        submission_content = actual_call_args["files"]["SUBMISSION"][1]
-        self.assertIn("<SUBMISSION>", submission_content)
-        self.assertIn("<ACTION><ADD /></ACTION>", submission_content)
+        self.assertIn(b"<SUBMISSION>", body)
+        self.assertIn(b"<ACTION><ADD /></ACTION>", body)
 
-        # Since RUN is a byte string and can differ in format,
-        # we can still check key parts
-        run_content = actual_call_args["files"]["RUN"][1]
-        self.assertIn(b"<RUN_SET>", run_content)
-        self.assertIn(b'<FILE filename="forward.fastq"', run_content)
-        self.assertIn(b'<FILE filename="reverse.fastq"', run_content)
+        # Since RUN can differ in format, we can still check key parts
+        self.assertIn(b"<RUN_SET>", body)
+        self.assertIn(b'<FILE filename="forward.fastq"', body)
+        self.assertIn(b'<FILE filename="reverse.fastq"', body)
 
         # Check if response was successful
-        self.assertEqual(result, b"<RECEIPT>Success</RECEIPT>")
+        with open(str(result), "rb") as fh:
+            receipt = fromstring(fh.read())
+        self.assertEqual(receipt.text, "Success")
+        self.assertIn("Submission attempt 1", receipt.find("MESSAGES/INFO").text)
 
 
 if __name__ == "__main__":
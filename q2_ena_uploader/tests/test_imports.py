@@ -0,0 +1,90 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+from qiime2.plugin.testing import TestPluginBase
+
+# Modules imported by every QIIME 2 plugin, which are loaded anyway
+FRAMEWORK = [
+    "pandas",
+    "qiime2.plugin",
+    "q2_types.metadata",
+    "q2_types.per_sample_sequences",
+    "q2_types.sample_data",
+]
+
+# Dependencies which are only imported once they are used
+LAZY = ["lxml", "multiprocessing", "pyarrow.parquet", "requests", "socks", "urllib3"]
+
+
+class TestLazyImports(TestPluginBase):
+    package = "q2_ena_uploader.tests"
+
+    def _imported(self, preload: list, module: str) -> list:
+        # modules newly imported by importing a module in a fresh interpreter
+        code = (
+            "import json, sys\n"
+            + "".join(f"import {name}\n" for name in preload)
+            + "before = set(sys.modules)\n"
+            + f"import {module}\n"
+            + "print(json.dumps(sorted(set(sys.modules) - before)))\n"
+        )
+        env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return json.loads(result.stdout.splitlines()[-1])
+
+    def _assert_not_imported(self, imported: list, modules: list):
+        eager = [
+            name
+            for name in modules
+            if any(x == name or x.startswith(name + ".") for x in imported)
+        ]
+        self.assertEqual(eager, [])
+
+    def test_package_import(self):
+        imported = self._imported([], "q2_ena_uploader")
+
+        self._assert_not_imported(
+            imported,
+            LAZY
+            + [
+                "pandas",
+                "q2_ena_uploader.ftp_file_upload",
+                "q2_ena_uploader.read_submission",
+                "q2_ena_uploader.sample_submission",
+            ],
+        )
+
+    def test_plugin_load(self):
+        imported = self._imported(FRAMEWORK, "q2_ena_uploader.plugin_setup")
+
+        self.assertIn("q2_ena_uploader.types._transformer", imported)
+        self._assert_not_imported(imported, LAZY)
+
+    def test_actions_available(self):
+        import q2_ena_uploader
+        from q2_ena_uploader.sample_submission import submit_metadata_samples
+
+        self.assertIs(q2_ena_uploader.submit_metadata_samples, submit_metadata_samples)
+        self.assertIn("submit_all", dir(q2_ena_uploader))
+        with self.assertRaises(AttributeError):
+            q2_ena_uploader.submit_nothing
+
+
+if __name__ == "__main__":
+    unittest.main()
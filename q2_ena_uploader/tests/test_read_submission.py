@@ -7,8 +7,10 @@
 # ----------------------------------------------------------------------------
 import os
 import unittest
+from contextlib import ExitStack
+from io import BytesIO
 import xml.etree.ElementTree as ET
-from unittest.mock import patch, MagicMock, mock_open, call
+from unittest.mock import ANY, patch, MagicMock, mock_open, call
 from xml.etree.ElementTree import fromstring
 
 import pandas as pd
@@ -19,12 +21,17 @@ from q2_ena_uploader.read_submission import (
     _create_submission_xml,
     _calculate_md5,
     _process_manifest,
+    _split_into_batches,
     submit_metadata_reads,
     _validate_sample_ids_match,
-    PRODUCTION_SERVER_URL,
 )
 from q2_ena_uploader.types import ENASubmissionReceiptFormat
-from q2_ena_uploader.utils import ActionType
+from q2_ena_uploader.utils import (
+    ActionType,
+    CONNECT_TIMEOUT,
+    PRODUCTION_SERVER_URL,
+    READ_TIMEOUT,
+)
 
 
 class TestCreateSubmissionXML(unittest.TestCase):
@@ -196,31 +203,47 @@ class TestSubmitMetadataReads(TestPluginBase):
     package = "q2_ena_uploader.tests"
 
     @patch.dict(os.environ, {"ENA_USERNAME": "test_user", "ENA_PASSWORD": "test_pass"})
+    @patch("q2_ena_uploader.read_submission.assert_valid_xml")
     @patch("q2_ena_uploader.read_submission._validate_sample_ids_match")
     @patch("q2_ena_uploader.read_submission._create_submission_xml")
     @patch("q2_ena_uploader.read_submission._process_manifest")
     @patch("q2_ena_uploader.read_submission._run_set_from_dict")
-    @patch("q2_ena_uploader.read_submission.requests.post")
+    @patch("requests.Session.post")
     def test_submit_metadata_reads(
-        self, mock_post, mock_run_set, mock_process, mock_create_xml, mock_validate
+        self,
+        mock_post,
+        mock_run_set,
+        mock_process,
+        mock_create_xml,
+        mock_validate,
+        mock_assert_valid,
     ):
         """Test submitting metadata reads with all necessary parameters."""
-        # Create mock response
-        mock_response = MagicMock()
-        mock_response.content = b"<xml>Success</xml>"
-        mock_post.return_value = mock_response
+        # Create mock response - the streamed body can only be read while
+        # the spooled documents are still open
+        mock_response = MagicMock(status_code=200)
+        mock_response.iter_content.return_value = [b"<xml>Success</xml>"]
+        bodies = []
+
+        def _post(url, **kwargs):
+            bodies.append(kwargs["data"].read())
+            return mock_response
+
+        mock_post.side_effect = _post
 
         # Set up other mocks
         mock_create_xml.return_value = "<SUBMISSION>test-submission</SUBMISSION>"
         mock_process.return_value = {
             "sample1": {"filename": ["file1.fastq"], "checksum": ["md5"]}
         }
-        mock_run_set.return_value = "<RUN_SET>test-run-set</RUN_SET>"
+        mock_run_set.side_effect = lambda data, file: file.write(
+            b"<RUN_SET>test-run-set</RUN_SET>"
+        )
 
         # Create mock experiment and demux objects
         mock_experiment = MagicMock()
-        mock_experiment.to_xml.return_value = (
-            "<EXPERIMENT_SET>test-experiment</EXPERIMENT_SET>"
+        mock_experiment.to_xml.side_effect = lambda processes, file: file.write(
+            b"<EXPERIMENT_SET>test-experiment</EXPERIMENT_SET>"
         )
 
         # Create mock receipt and transfer metadata
@@ -245,7 +268,8 @@ class TestSubmitMetadataReads(TestPluginBase):
         )
 
         # Check result
-        self.assertEqual(result, b"<xml>Success</xml>")
+        with open(str(result), "rb") as fh:
+            self.assertEqual(fh.read(), b"<xml>Success</xml>")
 
         # Verify all mocks were called with the correct arguments
         mock_validate.assert_called_once_with(
@@ -256,28 +280,333 @@ class TestSubmitMetadataReads(TestPluginBase):
         )
         mock_process.assert_called_once_with(mock_demux.manifest)
         mock_run_set.assert_called_once_with(
-            {"sample1": {"filename": ["file1.fastq"], "checksum": ["md5"]}}
+            {"sample1": {"filename": ["file1.fastq"], "checksum": ["md5"]}}, ANY
         )
         mock_create_xml.assert_called_once_with(ActionType.MODIFY, "2023-12-31")
-        mock_experiment.to_xml.assert_called_once_with()
+        mock_experiment.to_xml.assert_called_once_with(processes=1, file=ANY)
+        mock_assert_valid.assert_called_once_with(ANY, "experiment", strict=True)
 
-        # Verify the POST request
+        # Verify the POST request - the documents are streamed from disk
         mock_post.assert_called_once_with(
             PRODUCTION_SERVER_URL,  # Using production URL as dev=False
             auth=("test_user", "test_pass"),
-            files={
-                "SUBMISSION": (
-                    "submission.xml",
-                    "<SUBMISSION>test-submission</SUBMISSION>",
-                    "text/xml",
-                ),
-                "EXPERIMENT": (
-                    "metadata.xml",
-                    "<EXPERIMENT_SET>test-experiment</EXPERIMENT_SET>",
-                    "text/xml",
-                ),
-                "RUN": ("run.xml", "<RUN_SET>test-run-set</RUN_SET>", "text/xml"),
-            },
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+            stream=True,
+            data=ANY,
+            headers={"Content-Type": ANY},
+        )
+        for part in [
+            b'name="SUBMISSION"; filename="submission.xml"',
+            b"<SUBMISSION>test-submission</SUBMISSION>",
+            b'name="EXPERIMENT"; filename="metadata.xml"',
+            b"<EXPERIMENT_SET>test-experiment</EXPERIMENT_SET>",
+            b'name="RUN"; filename="run.xml"',
+            b"<RUN_SET>test-run-set</RUN_SET>",
+        ]:
+            self.assertIn(part, bodies[0])
+
+    @patch.dict(os.environ, {"ENA_USERNAME": "test_user", "ENA_PASSWORD": "test_pass"})
+    @patch("q2_ena_uploader.read_submission.assert_valid_xml")
+    @patch("q2_ena_uploader.read_submission._validate_sample_ids_match")
+    @patch("q2_ena_uploader.read_submission._process_manifest")
+    @patch("q2_ena_uploader.read_submission.submit_batches")
+    def test_submit_metadata_reads_in_batches(
+        self, mock_submit_batches, mock_process, mock_validate, mock_assert_valid
+    ):
+        """Test that experiments and their runs are submitted in batches."""
+        submitted = []
+
+        def _submit(url, auth, batches, threads, receipt):
+            # the experiments of every batch are streamed from a temporary file
+            for batch in batches:
+                experiments = batch["EXPERIMENT"][1]
+                submitted.append((experiments.read(), batch["RUN"][1]))
+            receipt.write(b"<RECEIPT>merged</RECEIPT>")
+
+        mock_submit_batches.side_effect = _submit
+        mock_process.return_value = {
+            f"sample{i}": {"filename": [f"file{i}.fastq"], "checksum": ["md5"]}
+            for i in range(3)
+        }
+        mock_experiment = MagicMock()
+        mock_experiment.to_xml.side_effect = lambda processes, file: file.write(
+            b"<EXPERIMENT_SET>"
+            b'<EXPERIMENT alias="exp_sample2"/>'
+            b'<EXPERIMENT alias="exp_sample0"/>'
+            b'<EXPERIMENT alias="exp_sample1"/>'
+            b"</EXPERIMENT_SET>"
+        )
+
+        result = submit_metadata_reads(
+            demux=MagicMock(),
+            experiment=mock_experiment,
+            samples_submission_receipt=MagicMock(),
+            file_transfer_metadata=MagicMock(spec=qiime2.Metadata),
+            dev=False,
+            batch_size=2,
+        )
+
+        with open(str(result), "rb") as fh:
+            self.assertEqual(fh.read(), b"<RECEIPT>merged</RECEIPT>")
+        url, auth, batches, threads, _ = mock_submit_batches.call_args[0]
+        self.assertEqual(url, PRODUCTION_SERVER_URL)
+        self.assertEqual(threads, 1)
+        self.assertEqual(len(batches), 2)
+        self.assertTrue(all("SUBMISSION" in batch for batch in batches))
+
+        for (experiments, runs), ids in zip(
+            submitted, (["sample0", "sample1"], ["sample2"])
+        ):
+            experiments, runs = fromstring(experiments), fromstring(runs)
+            self.assertEqual(
+                [el.get("alias") for el in experiments], [f"exp_{i}" for i in ids]
+            )
+            self.assertEqual(
+                [el.find("EXPERIMENT_REF").get("refname") for el in runs],
+                [f"exp_{i}" for i in ids],
+            )
+
+    @patch.dict(os.environ, {"ENA_USERNAME": "test_user", "ENA_PASSWORD": "test_pass"})
+    @patch("q2_ena_uploader.read_submission.assert_valid_xml")
+    @patch("q2_ena_uploader.read_submission._validate_sample_ids_match")
+    @patch("q2_ena_uploader.read_submission._process_manifest")
+    @patch("requests.Session.post")
+    def test_submit_changed_experiments_only(
+        self, mock_post, mock_process, mock_validate, mock_assert_valid
+    ):
+        """Test that only the changed experiments are submitted, without runs."""
+        mock_response = MagicMock(status_code=200)
+        mock_response.iter_content.return_value = [
+            b'<RECEIPT success="true"><MESSAGES/></RECEIPT>'
+        ]
+        mock_post.return_value = mock_response
+
+        def _row(sample_id, **kwargs):
+            return {
+                "study_ref": "study1",
+                "sample_description": sample_id,
+                "platform": "ILLUMINA",
+                "instrument_model": "Illumina MiSeq",
+                "library_strategy": "AMPLICON",
+                "library_source": "METAGENOMIC",
+                "library_selection": "PCR",
+                "library_layout": "SINGLE",
+                **kwargs,
+            }
+
+        mock_experiment = MagicMock()
+        mock_experiment.records.return_value = [_row("sample0"), _row("sample1")]
+        mock_previous = MagicMock()
+        mock_previous.records.return_value = [
+            _row("sample0"),
+            _row("sample1", instrument_model="Illumina HiSeq 2500"),
+        ]
+
+        result = submit_metadata_reads(
+            demux=MagicMock(),
+            experiment=mock_experiment,
+            samples_submission_receipt=MagicMock(),
+            file_transfer_metadata=MagicMock(spec=qiime2.Metadata),
+            previous_experiment=mock_previous,
+            action="MODIFY",
+        )
+
+        mock_process.assert_not_called()
+        mock_experiment.to_xml.assert_not_called()
+        files = mock_post.call_args[1]["files"]
+        self.assertEqual(set(files), {"SUBMISSION", "EXPERIMENT"})
+        experiments = fromstring(files["EXPERIMENT"][1])
+        self.assertEqual([el.get("alias") for el in experiments], ["exp_sample1"])
+
+        with open(str(result), "rb") as fh:
+            info = fromstring(fh.read()).findall("MESSAGES/INFO")[-1].text
+        self.assertIn("1 changed experiments were submitted", info)
+        self.assertIn("1 unchanged experiments were skipped", info)
+
+    @patch.dict(os.environ, {"ENA_USERNAME": "test_user", "ENA_PASSWORD": "test_pass"})
+    def test_previous_experiment_requires_modify(self):
+        """Test that a previous experiment can only be provided with MODIFY."""
+        with self.assertRaisesRegex(ValueError, "MODIFY action"):
+            submit_metadata_reads(
+                demux=MagicMock(),
+                experiment=MagicMock(),
+                samples_submission_receipt=MagicMock(),
+                file_transfer_metadata=MagicMock(spec=qiime2.Metadata),
+                previous_experiment=MagicMock(),
+            )
+
+    @patch.dict(os.environ, {"ENA_USERNAME": "test_user", "ENA_PASSWORD": "test_pass"})
+    @patch("q2_ena_uploader.read_submission.assert_valid_xml")
+    @patch("q2_ena_uploader.read_submission._validate_sample_ids_match")
+    @patch("q2_ena_uploader.read_submission._process_manifest")
+    @patch("q2_ena_uploader.read_submission.submit_batches")
+    def test_submit_skips_registered_reads(
+        self, mock_submit_batches, mock_process, mock_validate, mock_assert_valid
+    ):
+        """Test that registered experiments and runs are not resent."""
+        mock_submit_batches.side_effect = (
+            lambda url, auth, batches, threads, receipt: receipt.write(
+                b'<RECEIPT receiptDate="2025-01-02" submissionFile="submission.xml" '
+                b'success="true"><RUN accession="ERR1" alias="run_sample1"/>'
+                b"<MESSAGES/></RECEIPT>"
+            )
+        )
+        mock_process.side_effect = lambda df: {
+            _id: {"filename": [f"{_id}.fastq"], "checksum": ["md5"]} for _id in df.index
+        }
+        mock_experiment = MagicMock()
+        mock_experiment.to_xml.side_effect = lambda processes, file: file.write(
+            b"<EXPERIMENT_SET>"
+            b'<EXPERIMENT alias="exp_sample0"/><EXPERIMENT alias="exp_sample1"/>'
+            b"</EXPERIMENT_SET>"
+        )
+        mock_demux = MagicMock()
+        mock_demux.manifest = pd.DataFrame(
+            {"forward": ["s0.fastq", "s1.fastq"], "reverse": [None, None]},
+            index=["sample0", "sample1"],
+        )
+        previous = ENASubmissionReceiptFormat()
+        with previous.open() as fh:
+            fh.write(
+                b'<RECEIPT receiptDate="2025-01-01" submissionFile="submission.xml" '
+                b'success="false"><EXPERIMENT accession="ERX0" alias="exp_sample0"/>'
+                b'<EXPERIMENT accession="ERX1" alias="exp_sample1"/>'
+                b'<RUN accession="ERR0" alias="run_sample0"/>'
+                b'<RUN alias="run_sample1"/><MESSAGES/></RECEIPT>'
+            )
+
+        result = submit_metadata_reads(
+            demux=mock_demux,
+            experiment=mock_experiment,
+            samples_submission_receipt=MagicMock(),
+            file_transfer_metadata=MagicMock(spec=qiime2.Metadata),
+            previous_receipts=[previous],
+            batch_size=10,
+        )
+
+        # only the manifest of the unregistered run is hashed
+        self.assertEqual(list(mock_process.call_args[0][0].index), ["sample1"])
+        (batch,) = mock_submit_batches.call_args[0][2]
+        self.assertEqual(set(batch), {"SUBMISSION", "RUN"})
+        runs = fromstring(batch["RUN"][1])
+        self.assertEqual([el.get("alias") for el in runs], ["run_sample1"])
+
+        with open(str(result), "rb") as fh:
+            receipt = fromstring(fh.read())
+        self.assertEqual(
+            [el.get("accession") for el in receipt.findall("EXPERIMENT")],
+            ["ERX0", "ERX1"],
+        )
+        self.assertEqual(
+            [el.get("accession") for el in receipt.findall("RUN")], ["ERR1", "ERR0"]
+        )
+
+    @patch.dict(os.environ, {"ENA_USERNAME": "test_user", "ENA_PASSWORD": "test_pass"})
+    @patch("q2_ena_uploader.read_submission.assert_valid_xml")
+    @patch("q2_ena_uploader.read_submission._validate_sample_ids_match")
+    @patch("q2_ena_uploader.read_submission._process_manifest")
+    @patch("requests.Session.post")
+    def test_submit_retries_failed_reads(
+        self, mock_post, mock_process, mock_validate, mock_assert_valid
+    ):
+        """Test that the runs of failed experiments are left out of retries."""
+        failed = (
+            b'<RECEIPT receiptDate="2025-01-01" submissionFile="submission.xml" '
+            b'success="false"><MESSAGES><ERROR>In experiment, alias: '
+            b'"exp_sample1", accession: "". Invalid.</ERROR></MESSAGES></RECEIPT>'
+        )
+        registered = (
+            b'<RECEIPT receiptDate="2025-01-02" submissionFile="submission.xml" '
+            b'success="true"><EXPERIMENT accession="ERX0" alias="exp_sample0"/>'
+            b'<RUN accession="ERR0" alias="run_sample0"/><MESSAGES/></RECEIPT>'
+        )
+        # the first attempt is streamed, the retry is not
+        mock_response = MagicMock(status_code=200, content=registered)
+        mock_response.iter_content.return_value = [failed]
+        mock_post.return_value = mock_response
+        mock_process.return_value = {
+            f"sample{i}": {"filename": [f"file{i}.fastq"], "checksum": ["md5"]}
+            for i in range(2)
+        }
+        mock_experiment = MagicMock()
+        mock_experiment.to_xml.side_effect = lambda processes, file: file.write(
+            b"<EXPERIMENT_SET>"
+            b'<EXPERIMENT alias="exp_sample0"/><EXPERIMENT alias="exp_sample1"/>'
+            b"</EXPERIMENT_SET>"
+        )
+
+        with self.assertWarnsRegex(UserWarning, "exp_sample1"):
+            result = submit_metadata_reads(
+                demux=MagicMock(),
+                experiment=mock_experiment,
+                samples_submission_receipt=MagicMock(),
+                file_transfer_metadata=MagicMock(spec=qiime2.Metadata),
+                retries=1,
+            )
+
+        self.assertEqual(mock_post.call_count, 2)
+        retried = mock_post.call_args[1]["files"]
+        self.assertEqual(
+            [el.get("alias") for el in fromstring(retried["EXPERIMENT"][1])],
+            ["exp_sample0"],
+        )
+        self.assertEqual(
+            [el.get("alias") for el in fromstring(retried["RUN"][1])],
+            ["run_sample0"],
+        )
+        with open(str(result), "rb") as fh:
+            receipt = fromstring(fh.read())
+        self.assertEqual(receipt.get("success"), "false")
+        self.assertEqual(receipt.find("RUN").get("accession"), "ERR0")
+
+    @patch("q2_ena_uploader.read_submission._run_set_from_dict")
+    def test_split_into_batches_with_registered_objects(self, mock_run_set):
+        """Test batches of samples whose experiment or run is registered."""
+        mock_run_set.side_effect = lambda data: b"<RUN_SET>%d</RUN_SET>" % len(data)
+        experiment_xml = (
+            b'<EXPERIMENT_SET><EXPERIMENT alias="exp_sample1"/></EXPERIMENT_SET>'
+        )
+
+        with ExitStack() as stack:
+            batches = _split_into_batches(
+                BytesIO(experiment_xml), {"sample0": {}}, 1, stack
+            )
+
+            self.assertEqual(batches[0], (None, b"<RUN_SET>1</RUN_SET>"))
+            self.assertEqual(
+                [el.get("alias") for el in fromstring(batches[1][0].read())],
+                ["exp_sample1"],
+            )
+            self.assertIsNone(batches[1][1])
+            self.assertEqual(_split_into_batches(None, {}, 1, stack), [])
+
+    @patch("q2_ena_uploader.read_submission._run_set_from_dict")
+    def test_split_into_batches_streamed(self, mock_run_set):
+        """Test that the experiments are split in the order of the samples."""
+        mock_run_set.side_effect = lambda data: ",".join(data).encode("utf-8")
+        experiment_xml = (
+            "<EXPERIMENT_SET>"
+            '<EXPERIMENT alias="exp_sample2"><TITLE>Zürich</TITLE></EXPERIMENT>'
+            '<EXPERIMENT alias="exp_sample3"/>'
+            '<EXPERIMENT alias="exp_sample0"/>'
+            '<EXPERIMENT alias="exp_sample1"/>'
+            "</EXPERIMENT_SET>"
+        ).encode("utf-8")
+        parsed_data = {f"sample{i}": {} for i in range(3)}
+
+        with ExitStack() as stack:
+            batches = _split_into_batches(
+                BytesIO(experiment_xml), parsed_data, 2, stack
+            )
+            experiments = [fromstring(batch[0].read()) for batch in batches]
+
+        self.assertEqual(
+            [[el.get("alias") for el in batch] for batch in experiments],
+            [["exp_sample0", "exp_sample1"], ["exp_sample2", "exp_sample3"]],
+        )
+        self.assertEqual(experiments[1].find("EXPERIMENT/TITLE").text, "Zürich")
+        self.assertEqual(
+            [batch[1] for batch in batches], [b"sample0,sample1", b"sample2"]
         )
 
     @patch.dict(os.environ, {}, clear=True)
@@ -344,6 +673,17 @@ class TestValidateSampleIDsMatch(TestPluginBase):
             self.experiment,
         )
 
+    def test_sources_not_provided(self):
+        """Test that only the provided sources are checked."""
+
+        _validate_sample_ids_match(self.demux_df, None, None, self.experiment)
+
+        self.experiment.view.return_value = pd.DataFrame(
+            index=pd.Index(["sample1"], name="id")
+        )
+        with self.assertRaisesRegex(ValueError, "missing in experiment metadata"):
+            _validate_sample_ids_match(self.demux_df, None, None, self.experiment)
+
     def test_mismatch_in_file_transfer_metadata(self):
         """Test mismatch between demux and file transfer metadata."""
 
@@ -0,0 +1,226 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import unittest
+from unittest.mock import MagicMock
+from xml.etree.ElementTree import fromstring
+
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_ena_uploader.retry import (
+    error_aliases,
+    retry_failed_file,
+    retry_failed_objects,
+)
+from q2_ena_uploader.types import ENASubmissionReceiptFormat
+
+SAMPLES = (
+    b'<SAMPLE_SET><SAMPLE alias="s1"/><SAMPLE alias="s2"/>'
+    b'<SAMPLE alias="s3"/></SAMPLE_SET>'
+)
+EXPERIMENTS = (
+    b'<EXPERIMENT_SET><EXPERIMENT alias="exp_s1"/><EXPERIMENT alias="exp_s2"/>'
+    b"</EXPERIMENT_SET>"
+)
+RUNS = (
+    b'<RUN_SET><RUN alias="run_s1"><EXPERIMENT_REF refname="exp_s1"/></RUN>'
+    b'<RUN alias="run_s2"><EXPERIMENT_REF refname="exp_s2"/></RUN></RUN_SET>'
+)
+
+
+def _receipt(success: bool, objects: str = "", errors: str = "") -> bytes:
+    return (
+        '<RECEIPT receiptDate="2025-01-01" submissionFile="submission.xml" '
+        f'success="{str(success).lower()}">{objects}'
+        f"<MESSAGES>{errors}</MESSAGES></RECEIPT>"
+    ).encode("utf-8")
+
+
+def _aliases(files: dict, part: str) -> list:
+    return [el.get("alias") for el in fromstring(files[part][1])]
+
+
+class TestRetryFailedObjects(unittest.TestCase):
+    def test_error_aliases(self):
+        receipt = fromstring(
+            _receipt(
+                False,
+                errors='<ERROR>In sample, alias: "s2", accession: "". Invalid.</ERROR>'
+                "<ERROR>Sample s3 is missing a taxon.</ERROR>"
+                '<INFO>alias: "s1"</INFO>',
+            )
+        )
+
+        self.assertEqual(error_aliases(receipt), {"s2"})
+
+    def test_failed_objects_left_out(self):
+        # the batch with s2 failed because of it, so s3 was not registered
+        receipt = _receipt(
+            False,
+            '<SAMPLE accession="ERS1" alias="s1"/>'
+            '<SAMPLE alias="s2"/><SAMPLE alias="s3"/>',
+            '<ERROR>In sample, alias: "s2", accession: "". Invalid.</ERROR>',
+        )
+        submit = MagicMock(
+            return_value=_receipt(True, '<SAMPLE accession="ERS3" alias="s3"/>')
+        )
+
+        result = fromstring(
+            retry_failed_objects(
+                {"SAMPLE": ("samples.xml", SAMPLES)}, receipt, submit, retries=2
+            )
+        )
+
+        submit.assert_called_once()
+        files = submit.call_args[0][0]
+        self.assertEqual(files["SAMPLE"][0], "samples.xml")
+        self.assertEqual(_aliases(files, "SAMPLE"), ["s3"])
+
+        self.assertEqual(result.get("success"), "false")
+        self.assertEqual(
+            [(el.get("alias"), el.get("accession")) for el in result.findall("SAMPLE")],
+            [("s1", "ERS1"), ("s2", None), ("s3", "ERS3")],
+        )
+        self.assertIn(
+            "Retry 1: 1 objects which were not registered were submitted again, "
+            "1 objects with errors were left out.",
+            [el.text for el in result.findall("MESSAGES/INFO")],
+        )
+        self.assertIsNotNone(result.find("MESSAGES/ERROR"))
+
+    def test_all_objects_retried(self):
+        # an error naming no object - everything not registered is retried
+        receipt = _receipt(False, errors="<ERROR>Internal server error.</ERROR>")
+        submit = MagicMock(
+            side_effect=[
+                _receipt(False, errors="<ERROR>Internal server error.</ERROR>"),
+                _receipt(
+                    True,
+                    '<EXPERIMENT accession="ERX1" alias="exp_s1"/>'
+                    '<EXPERIMENT accession="ERX2" alias="exp_s2"/>'
+                    '<RUN accession="ERR1" alias="run_s1"/>'
+                    '<RUN accession="ERR2" alias="run_s2"/>',
+                ),
+            ]
+        )
+
+        result = fromstring(
+            retry_failed_objects(
+                {
+                    "EXPERIMENT": ("metadata.xml", EXPERIMENTS),
+                    "RUN": ("run.xml", RUNS),
+                },
+                receipt,
+                submit,
+                retries=3,
+            )
+        )
+
+        self.assertEqual(submit.call_count, 2)
+        for call in submit.call_args_list:
+            self.assertEqual(_aliases(call[0][0], "RUN"), ["run_s1", "run_s2"])
+        self.assertEqual(result.get("success"), "true")
+        self.assertEqual(len(result.findall("RUN")), 2)
+
+    def test_references_to_failed_objects_left_out(self):
+        receipt = _receipt(
+            False,
+            errors='<ERROR>In experiment, alias: "exp_s2". Invalid.</ERROR>',
+        )
+        submit = MagicMock(return_value=_receipt(True))
+
+        retry_failed_objects(
+            {"EXPERIMENT": ("metadata.xml", EXPERIMENTS), "RUN": ("run.xml", RUNS)},
+            receipt,
+            submit,
+            retries=1,
+        )
+
+        files = submit.call_args[0][0]
+        self.assertEqual(_aliases(files, "EXPERIMENT"), ["exp_s1"])
+        self.assertEqual(_aliases(files, "RUN"), ["run_s1"])
+
+    def test_retry_budget(self):
+        failed = _receipt(False, errors="<ERROR>Internal server error.</ERROR>")
+        submit = MagicMock(return_value=failed)
+
+        result = fromstring(
+            retry_failed_objects(
+                {"SAMPLE": ("samples.xml", SAMPLES)}, failed, submit, retries=2
+            )
+        )
+
+        self.assertEqual(submit.call_count, 2)
+        self.assertEqual(result.get("success"), "false")
+
+    def test_nothing_to_retry(self):
+        receipt = _receipt(
+            False,
+            errors='<ERROR>In sample, alias: "s1". Invalid.</ERROR>',
+        )
+        submit = MagicMock()
+
+        result = retry_failed_objects(
+            {
+                "SAMPLE": (
+                    "samples.xml",
+                    b'<SAMPLE_SET><SAMPLE alias="s1"/></SAMPLE_SET>',
+                )
+            },
+            receipt,
+            submit,
+            retries=2,
+        )
+
+        submit.assert_not_called()
+        self.assertEqual(result, receipt)
+
+
+class TestRetryFailedFile(TestPluginBase):
+    package = "q2_ena_uploader.tests"
+
+    def _receipt(self, content: bytes) -> ENASubmissionReceiptFormat:
+        receipt = ENASubmissionReceiptFormat()
+        with receipt.open() as fh:
+            fh.write(content)
+        return receipt
+
+    def test_successful_submission_not_retried(self):
+        content = _receipt(True, '<SAMPLE accession="ERS1" alias="s1"/>')
+        receipt = self._receipt(content)
+        documents, submit = MagicMock(), MagicMock()
+
+        retry_failed_file(str(receipt), documents, submit, retries=2)
+
+        documents.assert_not_called()
+        submit.assert_not_called()
+        with open(str(receipt), "rb") as fh:
+            self.assertEqual(fh.read(), content)
+
+    def test_failed_submission_retried(self):
+        receipt = self._receipt(_receipt(False, errors="<ERROR>Failed.</ERROR>"))
+        submit = MagicMock(
+            return_value=_receipt(
+                True,
+                '<SAMPLE accession="ERS1" alias="s1"/>'
+                '<SAMPLE accession="ERS2" alias="s2"/>'
+                '<SAMPLE accession="ERS3" alias="s3"/>',
+            )
+        )
+
+        retry_failed_file(
+            str(receipt), lambda: {"SAMPLE": ("samples.xml", SAMPLES)}, submit, 1
+        )
+
+        with open(str(receipt), "rb") as fh:
+            result = fromstring(fh.read())
+        self.assertEqual(result.get("success"), "true")
+        self.assertEqual(len(result.findall("SAMPLE")), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
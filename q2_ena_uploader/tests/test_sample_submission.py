@@ -7,7 +7,7 @@
 # ----------------------------------------------------------------------------
 import os
 import unittest
-from unittest.mock import patch, MagicMock, mock_open
+from unittest.mock import patch, MagicMock
 from xml.etree.ElementTree import fromstring
 
 from qiime2.plugin.testing import TestPluginBase
@@ -17,8 +17,22 @@ from q2_ena_uploader.sample_submission import (
     submit_metadata_samples,
     _create_cancelation_xml,
     cancel_submission,
+    cancel_submissions,
 )
-from q2_ena_uploader.utils import ActionType, DEV_SERVER_URL, PRODUCTION_SERVER_URL
+from q2_ena_uploader.metadata.validation import validate_xml
+from q2_ena_uploader.types import ENASubmissionReceiptFormat
+from q2_ena_uploader.utils import (
+    ActionType,
+    CONNECT_TIMEOUT,
+    DEV_SERVER_URL,
+    PRODUCTION_SERVER_URL,
+    READ_TIMEOUT,
+)
+
+
+def _read(receipt) -> bytes:
+    with open(str(receipt), "rb") as fh:
+        return fh.read()
 
 
 class TestActionType(unittest.TestCase):
@@ -101,14 +115,16 @@ class TestSubmitMetadataSamples(TestPluginBase):
     package = "q2_ena_uploader.tests"
 
     @patch.dict(os.environ, {"ENA_USERNAME": "test_user", "ENA_PASSWORD": "test_pass"})
+    @patch("q2_ena_uploader.sample_submission.assert_valid_xml")
     @patch("q2_ena_uploader.sample_submission._create_submission_xml")
-    @patch("q2_ena_uploader.sample_submission.requests.post")
-    @patch("builtins.open", new_callable=mock_open)
-    def test_submit_metadata_study_only(self, mock_file, mock_post, mock_create_xml):
+    @patch("requests.Session.post")
+    def test_submit_metadata_study_only(
+        self, mock_post, mock_create_xml, mock_assert_valid
+    ):
         """Test submitting only study metadata."""
         # Mock response
-        mock_response = MagicMock()
-        mock_response.content = b"<xml>Success</xml>"
+        mock_response = MagicMock(status_code=200)
+        mock_response.iter_content.return_value = [b"<xml>Success</xml>"]
         mock_post.return_value = mock_response
 
         # Mock study format
@@ -122,13 +138,15 @@ class TestSubmitMetadataSamples(TestPluginBase):
         result = submit_metadata_samples(study=mock_study, dev=True)
 
         # Check result
-        self.assertEqual(result, b"<xml>Success</xml>")
+        self.assertEqual(_read(result), b"<xml>Success</xml>")
 
         # Verify calls with specific arguments
         mock_create_xml.assert_called_once_with(ActionType.ADD, hold_date="")
         mock_post.assert_called_once_with(
             DEV_SERVER_URL,
             auth=("test_user", "test_pass"),
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+            stream=True,
             files={
                 "SUBMISSION": (
                     "submission.xml",
@@ -141,14 +159,16 @@ class TestSubmitMetadataSamples(TestPluginBase):
         mock_study.to_xml.assert_called_once()
 
     @patch.dict(os.environ, {"ENA_USERNAME": "test_user", "ENA_PASSWORD": "test_pass"})
+    @patch("q2_ena_uploader.sample_submission.assert_valid_xml")
     @patch("q2_ena_uploader.sample_submission._create_submission_xml")
-    @patch("q2_ena_uploader.sample_submission.requests.post")
-    @patch("builtins.open", new_callable=mock_open)
-    def test_submit_metadata_samples_only(self, mock_file, mock_post, mock_create_xml):
+    @patch("requests.Session.post")
+    def test_submit_metadata_samples_only(
+        self, mock_post, mock_create_xml, mock_assert_valid
+    ):
         """Test submitting only sample metadata."""
         # Mock response
-        mock_response = MagicMock()
-        mock_response.content = b"<xml>Success</xml>"
+        mock_response = MagicMock(status_code=200)
+        mock_response.iter_content.return_value = [b"<xml>Success</xml>"]
         mock_post.return_value = mock_response
 
         # Mock samples format
@@ -162,13 +182,15 @@ class TestSubmitMetadataSamples(TestPluginBase):
         result = submit_metadata_samples(samples=mock_samples, dev=True)
 
         # Check result
-        self.assertEqual(result, b"<xml>Success</xml>")
+        self.assertEqual(_read(result), b"<xml>Success</xml>")
 
         # Verify calls with specific arguments
         mock_create_xml.assert_called_once_with(ActionType.ADD, hold_date="")
         mock_post.assert_called_once_with(
             DEV_SERVER_URL,
             auth=("test_user", "test_pass"),
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+            stream=True,
             files={
                 "SUBMISSION": (
                     "submission.xml",
@@ -178,17 +200,22 @@ class TestSubmitMetadataSamples(TestPluginBase):
                 "SAMPLE": ("samples.xml", "<SAMPLE>test-sample</SAMPLE>", "text/xml"),
             },
         )
-        mock_samples.to_xml.assert_called_once_with()
+        mock_samples.to_xml.assert_called_once_with(processes=1)
+        mock_assert_valid.assert_called_once_with(
+            "<SAMPLE>test-sample</SAMPLE>", "samples", strict=True
+        )
 
     @patch.dict(os.environ, {"ENA_USERNAME": "test_user", "ENA_PASSWORD": "test_pass"})
+    @patch("q2_ena_uploader.sample_submission.assert_valid_xml")
     @patch("q2_ena_uploader.sample_submission._create_submission_xml")
-    @patch("q2_ena_uploader.sample_submission.requests.post")
-    @patch("builtins.open", new_callable=mock_open)
-    def test_submit_both_study_and_samples(self, mock_file, mock_post, mock_create_xml):
+    @patch("requests.Session.post")
+    def test_submit_both_study_and_samples(
+        self, mock_post, mock_create_xml, mock_assert_valid
+    ):
         """Test submitting both study and sample metadata."""
         # Mock response
-        mock_response = MagicMock()
-        mock_response.content = b"<xml>Success</xml>"
+        mock_response = MagicMock(status_code=200)
+        mock_response.iter_content.return_value = [b"<xml>Success</xml>"]
         mock_post.return_value = mock_response
 
         # Mock study and samples format
@@ -211,7 +238,7 @@ class TestSubmitMetadataSamples(TestPluginBase):
         )
 
         # Check result
-        self.assertEqual(result, b"<xml>Success</xml>")
+        self.assertEqual(_read(result), b"<xml>Success</xml>")
 
         # Verify all mocks were called with the correct arguments
         mock_create_xml.assert_called_once_with(
@@ -220,6 +247,8 @@ class TestSubmitMetadataSamples(TestPluginBase):
         mock_post.assert_called_once_with(
             PRODUCTION_SERVER_URL,
             auth=("test_user", "test_pass"),
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+            stream=True,
             files={
                 "SUBMISSION": (
                     "submission.xml",
@@ -231,7 +260,235 @@ class TestSubmitMetadataSamples(TestPluginBase):
             },
         )
         mock_study.to_xml.assert_called_once_with()
-        mock_samples.to_xml.assert_called_once_with()
+        mock_samples.to_xml.assert_called_once_with(processes=1)
+
+    @patch.dict(os.environ, {"ENA_USERNAME": "test_user", "ENA_PASSWORD": "test_pass"})
+    @patch("q2_ena_uploader.sample_submission.assert_valid_xml")
+    @patch("q2_ena_uploader.sample_submission.submit_batches")
+    def test_submit_samples_in_batches(self, mock_submit_batches, mock_assert_valid):
+        """Test that samples are split into batches with the study in the first."""
+        mock_submit_batches.side_effect = (
+            lambda url, auth, batches, threads, receipt: receipt.write(
+                b"<RECEIPT>merged</RECEIPT>"
+            )
+        )
+
+        mock_study = MagicMock()
+        mock_study.to_xml.return_value = "<PROJECT>test-study</PROJECT>"
+        mock_samples = MagicMock()
+        mock_samples.to_xml.return_value = (
+            b"<SAMPLE_SET>"
+            b'<SAMPLE alias="s1"/><SAMPLE alias="s2"/><SAMPLE alias="s3"/>'
+            b"</SAMPLE_SET>"
+        )
+
+        result = submit_metadata_samples(
+            study=mock_study, samples=mock_samples, dev=True, batch_size=2, threads=3
+        )
+
+        self.assertEqual(_read(result), b"<RECEIPT>merged</RECEIPT>")
+        url, auth, batches, threads, _ = mock_submit_batches.call_args[0]
+        self.assertEqual(url, DEV_SERVER_URL)
+        self.assertEqual(auth, ("test_user", "test_pass"))
+        self.assertEqual(threads, 3)
+        self.assertEqual(len(batches), 2)
+
+        self.assertIn("PROJECT", batches[0])
+        self.assertNotIn("PROJECT", batches[1])
+        for batch, aliases in zip(batches, (["s1", "s2"], ["s3"])):
+            self.assertIn("SUBMISSION", batch)
+            sample_set = fromstring(batch["SAMPLE"][1])
+            self.assertEqual([el.get("alias") for el in sample_set], aliases)
+
+    @patch.dict(os.environ, {"ENA_USERNAME": "test_user", "ENA_PASSWORD": "test_pass"})
+    @patch("q2_ena_uploader.sample_submission.assert_valid_xml")
+    @patch("requests.Session.post")
+    def test_submit_changed_samples_only(self, mock_post, mock_assert_valid):
+        """Test that only the changed samples are submitted with MODIFY."""
+        mock_response = MagicMock(status_code=200)
+        mock_response.iter_content.return_value = [
+            b'<RECEIPT success="true"><MESSAGES/></RECEIPT>'
+        ]
+        mock_post.return_value = mock_response
+
+        mock_samples = MagicMock()
+        mock_samples.records.return_value = [
+            {"alias": "s1", "taxon_id": "9606", "country": "Brazil"},
+            {"alias": "s2", "taxon_id": "9606", "country": "Chile"},
+            {"alias": "s3", "taxon_id": "9606"},
+        ]
+        mock_previous = MagicMock()
+        mock_previous.records.return_value = [
+            {"country": "Brazil", "taxon_id": "9606", "alias": "s1"},
+            {"alias": "s2", "taxon_id": "9606", "country": "Peru"},
+            {"alias": "s4", "taxon_id": "9606"},
+        ]
+
+        result = submit_metadata_samples(
+            samples=mock_samples, previous_samples=mock_previous, action="MODIFY"
+        )
+
+        mock_samples.to_xml.assert_not_called()
+        samples_xml = mock_post.call_args[1]["files"]["SAMPLE"][1]
+        self.assertEqual([el.get("alias") for el in fromstring(samples_xml)], ["s2"])
+        mock_assert_valid.assert_called_once_with(samples_xml, "samples", strict=True)
+
+        messages = [el.text for el in fromstring(_read(result)).find("MESSAGES")]
+        self.assertEqual(len(messages), 4)
+        self.assertIn("Submission attempt 1", messages[0])
+        self.assertIn("1 changed samples were submitted", messages[1])
+        self.assertIn("1 unchanged samples were skipped", messages[1])
+        self.assertIn("s3", messages[2])
+        self.assertIn("s4", messages[3])
+
+    @patch.dict(os.environ, {"ENA_USERNAME": "test_user", "ENA_PASSWORD": "test_pass"})
+    @patch("requests.Session.post")
+    def test_submit_unchanged_samples(self, mock_post):
+        """Test that nothing is sent to ENA when no sample changed."""
+        mock_samples = MagicMock()
+        mock_samples.records.return_value = [{"alias": "s1", "taxon_id": "9606"}]
+        mock_previous = MagicMock()
+        mock_previous.records.return_value = [
+            {"alias": "s1", "taxon_id": "9606", "country": ""}
+        ]
+
+        result = submit_metadata_samples(
+            samples=mock_samples, previous_samples=mock_previous, action="MODIFY"
+        )
+
+        mock_post.assert_not_called()
+        receipt = fromstring(_read(result))
+        self.assertEqual(receipt.get("success"), "true")
+        self.assertIn(
+            "0 changed samples were submitted", receipt.find("MESSAGES/INFO").text
+        )
+
+    @patch.dict(os.environ, {"ENA_USERNAME": "test_user", "ENA_PASSWORD": "test_pass"})
+    def test_previous_samples_require_modify(self):
+        """Test that previous samples can only be provided with MODIFY."""
+        for samples, action in ((MagicMock(), "ADD"), (None, "MODIFY")):
+            with self.subTest(action=action):
+                with self.assertRaisesRegex(ValueError, "MODIFY action"):
+                    submit_metadata_samples(
+                        study=MagicMock(),
+                        samples=samples,
+                        previous_samples=MagicMock(),
+                        action=action,
+                    )
+
+    @patch.dict(os.environ, {"ENA_USERNAME": "test_user", "ENA_PASSWORD": "test_pass"})
+    @patch("q2_ena_uploader.sample_submission.assert_valid_xml")
+    @patch("q2_ena_uploader.sample_submission._create_submission_xml")
+    @patch("requests.Session.post")
+    def test_submit_skips_registered_objects(
+        self, mock_post, mock_create_xml, mock_assert_valid
+    ):
+        """Test that objects registered in previous receipts are not resent."""
+        mock_response = MagicMock(status_code=200)
+        mock_response.iter_content.return_value = [
+            b'<RECEIPT receiptDate="2025-01-02" submissionFile="submission.xml" '
+            b'success="true"><SAMPLE accession="ERS2" alias="s2"/>'
+            b"<MESSAGES/></RECEIPT>"
+        ]
+        mock_post.return_value = mock_response
+        mock_create_xml.return_value = "<SUBMISSION>test-submission</SUBMISSION>"
+
+        previous = ENASubmissionReceiptFormat()
+        with previous.open() as fh:
+            fh.write(
+                b'<RECEIPT receiptDate="2025-01-01" submissionFile="submission.xml" '
+                b'success="false"><PROJECT accession="PRJEB1" alias="study1"/>'
+                b'<SAMPLE accession="ERS1" alias="s1"/><SAMPLE alias="s2"/>'
+                b"<MESSAGES/></RECEIPT>"
+            )
+        mock_study = MagicMock()
+        mock_study.to_xml.return_value = (
+            b'<PROJECT_SET><PROJECT alias="study1"/></PROJECT_SET>'
+        )
+        mock_samples = MagicMock()
+        mock_samples.to_xml.return_value = (
+            b'<SAMPLE_SET><SAMPLE alias="s1"/><SAMPLE alias="s2"/></SAMPLE_SET>'
+        )
+
+        result = submit_metadata_samples(
+            study=mock_study, samples=mock_samples, previous_receipts=[previous]
+        )
+
+        files = mock_post.call_args[1]["files"]
+        self.assertNotIn("PROJECT", files)
+        self.assertEqual(
+            [el.get("alias") for el in fromstring(files["SAMPLE"][1])], ["s2"]
+        )
+
+        receipt = fromstring(_read(result))
+        self.assertEqual(receipt.get("success"), "true")
+        self.assertEqual(receipt.find("PROJECT").get("accession"), "PRJEB1")
+        self.assertEqual(
+            [el.get("accession") for el in receipt.findall("SAMPLE")],
+            ["ERS2", "ERS1"],
+        )
+        # the submission attempt and the skipped objects
+        self.assertEqual(len(receipt.findall("MESSAGES/INFO")), 3)
+
+    @patch.dict(os.environ, {"ENA_USERNAME": "test_user", "ENA_PASSWORD": "test_pass"})
+    def test_previous_receipts_require_add(self):
+        """Test that previous receipts can only be provided with ADD."""
+        with self.assertRaisesRegex(ValueError, "ADD action"):
+            submit_metadata_samples(
+                samples=MagicMock(), previous_receipts=[MagicMock()], action="MODIFY"
+            )
+
+    @patch.dict(os.environ, {"ENA_USERNAME": "test_user", "ENA_PASSWORD": "test_pass"})
+    @patch("q2_ena_uploader.sample_submission.assert_valid_xml")
+    @patch("q2_ena_uploader.sample_submission._create_submission_xml")
+    @patch("requests.Session.post")
+    def test_submit_retries_failed_samples(
+        self, mock_post, mock_create_xml, mock_assert_valid
+    ):
+        """Test that the samples of failed batches are submitted again."""
+        # the first batch fails because of s2, so s1 is not registered either
+        receipts = [
+            b'<RECEIPT receiptDate="2025-01-01" submissionFile="submission.xml" '
+            b'success="false"><SAMPLE alias="s1"/><SAMPLE alias="s2"/><MESSAGES>'
+            b'<ERROR>In sample, alias: "s2", accession: "". Invalid.</ERROR>'
+            b"</MESSAGES></RECEIPT>",
+            b'<RECEIPT receiptDate="2025-01-01" submissionFile="submission.xml" '
+            b'success="true"><SAMPLE accession="ERS3" alias="s3"/>'
+            b"<MESSAGES/></RECEIPT>",
+            b'<RECEIPT receiptDate="2025-01-02" submissionFile="submission.xml" '
+            b'success="true"><SAMPLE accession="ERS1" alias="s1"/>'
+            b"<MESSAGES/></RECEIPT>",
+        ]
+        mock_post.side_effect = [
+            MagicMock(status_code=200, content=receipt) for receipt in receipts
+        ]
+        mock_create_xml.return_value = "<SUBMISSION>test-submission</SUBMISSION>"
+        mock_samples = MagicMock()
+        mock_samples.to_xml.return_value = (
+            b'<SAMPLE_SET><SAMPLE alias="s1"/><SAMPLE alias="s2"/>'
+            b'<SAMPLE alias="s3"/></SAMPLE_SET>'
+        )
+
+        with self.assertWarnsRegex(UserWarning, "s2"):
+            result = submit_metadata_samples(
+                samples=mock_samples, batch_size=2, retries=2
+            )
+
+        self.assertEqual(mock_post.call_count, 3)
+        retried = mock_post.call_args[1]["files"]
+        self.assertEqual(
+            retried["SUBMISSION"][1], "<SUBMISSION>test-submission</SUBMISSION>"
+        )
+        self.assertEqual(
+            [el.get("alias") for el in fromstring(retried["SAMPLE"][1])], ["s1"]
+        )
+
+        receipt = fromstring(_read(result))
+        self.assertEqual(receipt.get("success"), "false")
+        self.assertEqual(
+            [el.get("accession") for el in receipt.findall("SAMPLE")],
+            ["ERS1", None, "ERS3"],
+        )
 
     @patch.dict(os.environ, {})
     def test_missing_credentials(self):
@@ -282,13 +539,12 @@ class TestCancelSubmission(TestPluginBase):
 
     @patch.dict(os.environ, {"ENA_USERNAME": "test_user", "ENA_PASSWORD": "test_pass"})
     @patch("q2_ena_uploader.sample_submission._create_cancelation_xml")
-    @patch("q2_ena_uploader.sample_submission.requests.post")
-    @patch("builtins.open", new_callable=mock_open)
-    def test_cancel_submission(self, mock_file, mock_post, mock_create_xml):
+    @patch("requests.Session.post")
+    def test_cancel_submission(self, mock_post, mock_create_xml):
         """Test canceling a submission."""
         # Mock response
-        mock_response = MagicMock()
-        mock_response.content = b"<xml>Canceled</xml>"
+        mock_response = MagicMock(status_code=200)
+        mock_response.iter_content.return_value = [b"<xml>Canceled</xml>"]
         mock_post.return_value = mock_response
 
         # Mock XML creation
@@ -303,13 +559,15 @@ class TestCancelSubmission(TestPluginBase):
         result = cancel_submission("ERP123456", dev=True)
 
         # Check result
-        self.assertEqual(result, b"<xml>Canceled</xml>")
+        self.assertEqual(_read(result), b"<xml>Canceled</xml>")
 
         # Verify calls with specific arguments
         mock_create_xml.assert_called_once_with("ERP123456")
         mock_post.assert_called_once_with(
             DEV_SERVER_URL,
             auth=("test_user", "test_pass"),
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+            stream=True,
             files={"SUBMISSION": ("submission.xml", cancel_xml, "text/xml")},
         )
 
@@ -323,5 +581,57 @@ class TestCancelSubmission(TestPluginBase):
             cancel_submission("ERP123456")
 
 
+class TestCancelSubmissions(TestPluginBase):
+    """Tests for the cancel_submissions function."""
+
+    package = "q2_ena_uploader.tests"
+
+    def test_create_cancelation_xml_many_targets(self):
+        """Test creating a valid cancelation XML with several CANCEL actions."""
+        xml_str = _create_cancelation_xml("ERS1", "ERS2")
+
+        root = fromstring(xml_str)
+        self.assertEqual(
+            [el.get("target") for el in root.findall("ACTIONS/ACTION/CANCEL")],
+            ["ERS1", "ERS2"],
+        )
+        self.assertEqual(validate_xml(xml_str.encode("utf-8")), [])
+
+    @patch.dict(os.environ, {"ENA_USERNAME": "test_user", "ENA_PASSWORD": "test_pass"})
+    @patch("q2_ena_uploader.sample_submission.submit_batches")
+    def test_cancel_submissions(self, mock_submit_batches):
+        """Test that the accessions are cancelled in batches."""
+        mock_submit_batches.side_effect = (
+            lambda url, auth, batches, threads, receipt: receipt.write(
+                b"<RECEIPT>merged</RECEIPT>"
+            )
+        )
+        accessions = MagicMock(ids=["ERS3", "ERS1"])
+
+        result = cancel_submissions(
+            ["ERS1", "ERS2"], accessions, dev=False, batch_size=2, threads=4
+        )
+
+        self.assertEqual(_read(result), b"<RECEIPT>merged</RECEIPT>")
+        url, auth, batches, threads, _ = mock_submit_batches.call_args.args
+        self.assertEqual(url, PRODUCTION_SERVER_URL)
+        self.assertEqual(auth, ("test_user", "test_pass"))
+        self.assertEqual(threads, 4)
+        targets = [
+            [
+                el.get("target")
+                for el in fromstring(batch["SUBMISSION"][1]).iter("CANCEL")
+            ]
+            for batch in batches
+        ]
+        self.assertEqual(targets, [["ERS1", "ERS2"], ["ERS3"]])
+
+    @patch.dict(os.environ, {"ENA_USERNAME": "test_user", "ENA_PASSWORD": "test_pass"})
+    def test_cancel_submissions_no_accessions(self):
+        """Test that an error is raised when no accessions are provided."""
+        with self.assertRaisesRegex(RuntimeError, "provide the accession numbers"):
+            cancel_submissions()
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -6,14 +6,34 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 import os
+import threading
 import unittest
 import warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
 from unittest.mock import patch, Mock
+from xml.etree.ElementTree import fromstring
 
 import requests
 from qiime2.plugin.testing import TestPluginBase
 
-from q2_ena_uploader.utils import assert_credentials, assert_success, ActionType
+from q2_ena_uploader.utils import (
+    assert_credentials,
+    assert_success,
+    ActionType,
+    CONNECT_TIMEOUT,
+    READ_TIMEOUT,
+    MultipartStream,
+    configure_session,
+    connection_stats,
+    get_session,
+    merge_receipts,
+    post_submission,
+    receipt_status,
+    recover_existing_objects,
+    split_xml_set,
+    submit_batches,
+)
 
 
 class TestActionType(TestPluginBase):
@@ -122,6 +142,42 @@ class TestAssertSuccess(TestPluginBase):
             self.assertEqual(len(w), 1)
             self.assertIn("Unable to parse ENA response", str(w[0].message))
 
+    def test_assert_success_with_receipt_file(self):
+        """Test that assert_success reads the outcome from a receipt file."""
+        receipt = BytesIO(
+            b'<RECEIPT success="false"><MESSAGES>'
+            b"<ERROR>Sample already exists</ERROR>"
+            b"</MESSAGES></RECEIPT>"
+        )
+
+        with self.assertWarnsRegex(UserWarning, "Sample already exists"):
+            assert_success(receipt)
+
+    def test_receipt_status_stops_at_first_error(self):
+        """Test that failed receipts are only read up to their first error."""
+        # anything following the first error is never parsed
+        receipt = BytesIO(
+            b'<RECEIPT success="false"><SAMPLE alias="s1"/><MESSAGES>'
+            b"<ERROR>first</ERROR><ERROR>second</ERROR><</MESSAGES>"
+        )
+
+        self.assertEqual(receipt_status(receipt), ("false", "first"))
+
+    def test_receipt_status_successful(self):
+        """Test that successful receipts report no error."""
+        receipt = BytesIO(
+            b'<RECEIPT success="true">'
+            + b'<SAMPLE accession="ERS1" alias="s1"/>' * 1000
+            + b"<MESSAGES><INFO>TEST submission</INFO></MESSAGES></RECEIPT>"
+        )
+
+        self.assertEqual(receipt_status(receipt), ("true", None))
+
+    def test_receipt_status_truncated(self):
+        """Test that truncated receipts are not reported as successful."""
+        with self.assertRaises(Exception):
+            receipt_status(BytesIO(b'<RECEIPT success="true"><SAMPLE alias='))
+
     def test_assert_success_with_malformed_xml(self):
         """Test that assert_success handles malformed XML responses."""
         # Create a mock response with malformed XML
@@ -134,5 +190,572 @@ class TestAssertSuccess(TestPluginBase):
             self.assertIn("Unable to parse ENA response", str(w[0].message))
 
 
+class TestSplitXmlSet(TestPluginBase):
+    """Tests for the split_xml_set function."""
+
+    package = "q2_ena_uploader.tests"
+
+    def test_split_xml_set(self):
+        """Test that children are split into batches in their original order."""
+        xml = (
+            b"<SAMPLE_SET>"
+            b'<SAMPLE alias="s1"/><SAMPLE alias="s2"/><SAMPLE alias="s3"/>'
+            b"</SAMPLE_SET>"
+        )
+
+        batches = split_xml_set(xml, 2)
+
+        self.assertEqual(len(batches), 2)
+        roots = [fromstring(batch) for batch in batches]
+        self.assertTrue(all(root.tag == "SAMPLE_SET" for root in roots))
+        self.assertEqual([el.get("alias") for el in roots[0]], ["s1", "s2"])
+        self.assertEqual([el.get("alias") for el in roots[1]], ["s3"])
+
+    def test_split_xml_set_single_batch(self):
+        """Test that a small document results in a single batch."""
+        xml = b'<SAMPLE_SET><SAMPLE alias="s1"/></SAMPLE_SET>'
+
+        batches = split_xml_set(xml, 10)
+
+        self.assertEqual(len(batches), 1)
+        self.assertEqual([el.get("alias") for el in fromstring(batches[0])], ["s1"])
+
+
+class TestMergeReceipts(TestPluginBase):
+    """Tests for the merge_receipts function."""
+
+    package = "q2_ena_uploader.tests"
+
+    def setUp(self):
+        super().setUp()
+        self.receipt1 = (
+            b'<RECEIPT receiptDate="2024-06-13T09:04:59" '
+            b'submissionFile="submission.xml" success="true">'
+            b'<SAMPLE accession="ERS1" alias="s1" status="PRIVATE"/>'
+            b'<SUBMISSION accession="ERA1" alias="sub1"/>'
+            b"<MESSAGES><INFO>TEST submission</INFO></MESSAGES>"
+            b"<ACTIONS>ADD</ACTIONS>"
+            b"</RECEIPT>"
+        )
+        self.receipt2 = (
+            b'<RECEIPT receiptDate="2024-06-13T09:05:10" '
+            b'submissionFile="submission.xml" success="true">'
+            b'<SAMPLE accession="ERS2" alias="s2" status="PRIVATE"/>'
+            b'<SUBMISSION accession="ERA2" alias="sub2"/>'
+            b"<MESSAGES><INFO>TEST submission</INFO></MESSAGES>"
+            b"<ACTIONS>ADD</ACTIONS>"
+            b"</RECEIPT>"
+        )
+
+    def test_merge_single_receipt(self):
+        """Test that a single receipt is returned unchanged."""
+        self.assertEqual(merge_receipts([self.receipt1]), self.receipt1)
+
+    def test_merge_receipts_to_file(self):
+        """Test that the merged receipt can be written to a file."""
+        for receipts in ([self.receipt1], [self.receipt1, self.receipt2]):
+            with self.subTest(n_receipts=len(receipts)):
+                file = BytesIO()
+
+                self.assertIsNone(merge_receipts(receipts, file))
+                self.assertEqual(file.getvalue(), merge_receipts(receipts))
+
+    def test_merge_successful_receipts(self):
+        """Test merging of successful receipts."""
+        merged = fromstring(merge_receipts([self.receipt1, self.receipt2]))
+
+        self.assertEqual(merged.tag, "RECEIPT")
+        self.assertEqual(merged.get("success"), "true")
+        self.assertEqual(merged.get("receiptDate"), "2024-06-13T09:04:59")
+        self.assertEqual(merged.get("submissionFile"), "submission.xml")
+        self.assertEqual(
+            [el.get("accession") for el in merged.findall("SAMPLE")], ["ERS1", "ERS2"]
+        )
+        self.assertEqual(len(merged.findall("SUBMISSION")), 2)
+        self.assertEqual(len(merged.findall("MESSAGES/INFO")), 1)
+        self.assertEqual(len(merged.findall("ACTIONS")), 1)
+
+    def test_merge_failed_receipt(self):
+        """Test that the merged receipt fails when any batch failed."""
+        failed = (
+            b'<RECEIPT receiptDate="2024-06-13T09:05:10" '
+            b'submissionFile="submission.xml" success="false">'
+            b"<MESSAGES><ERROR>Invalid sample</ERROR></MESSAGES>"
+            b"</RECEIPT>"
+        )
+
+        merged = fromstring(merge_receipts([self.receipt1, failed]))
+
+        self.assertEqual(merged.get("success"), "false")
+        self.assertEqual(merged.find("MESSAGES/ERROR").text, "Invalid sample")
+        self.assertEqual(len(merged.findall("SAMPLE")), 1)
+
+    def test_merge_unparseable_receipt(self):
+        """Test that unparseable receipts are reported as errors."""
+        merged = fromstring(merge_receipts([b"<html>Bad gateway", self.receipt2]))
+
+        self.assertEqual(merged.get("success"), "false")
+        self.assertIn("batch 1", merged.find("MESSAGES/ERROR").text)
+        self.assertEqual(len(merged.findall("SAMPLE")), 1)
+
+    @patch("requests.Session.post")
+    def test_submit_batches(self, mock_post):
+        """Test that every batch is posted and the receipts are merged."""
+        mock_post.side_effect = [
+            Mock(status_code=200, content=self.receipt1),
+            Mock(status_code=200, content=self.receipt2),
+        ]
+        batches = [
+            {"SAMPLE": ("samples.xml", b"1", "text/xml")},
+            {"SAMPLE": ("samples.xml", b"2", "text/xml")},
+        ]
+
+        merged = fromstring(submit_batches("url", ("user", "pass"), batches, 2))
+
+        self.assertEqual(mock_post.call_count, 2)
+        for batch in batches:
+            mock_post.assert_any_call(
+                "url",
+                auth=("user", "pass"),
+                files=batch,
+                timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+            )
+        self.assertEqual(len(merged.findall("SAMPLE")), 2)
+
+    @patch("q2_ena_uploader.utils.post_submission")
+    def test_submit_batches_failed_batch(self, mock_post):
+        """Test that the receipts of the other batches are kept on errors."""
+        mock_post.side_effect = [
+            Mock(status_code=200, content=self.receipt1),
+            requests.exceptions.ConnectionError("Connection reset"),
+        ]
+        batches = [
+            {"SAMPLE": ("samples.xml", b"1", "text/xml")},
+            {"SAMPLE": ("samples.xml", b"2", "text/xml")},
+        ]
+
+        with self.assertWarnsRegex(UserWarning, "Batch 2 of 2"):
+            merged = fromstring(submit_batches("url", ("user", "pass"), batches))
+
+        self.assertEqual(merged.get("success"), "false")
+        self.assertEqual(
+            [el.get("accession") for el in merged.findall("SAMPLE")], ["ERS1"]
+        )
+        self.assertEqual(
+            merged.find("MESSAGES/ERROR").text,
+            "Batch 2 of 2 could not be submitted: Connection reset",
+        )
+
+    @patch("q2_ena_uploader.utils.post_submission")
+    def test_submit_batches_all_failed(self, mock_post):
+        """Test that the error is raised if no batch could be submitted."""
+        mock_post.side_effect = requests.exceptions.ConnectionError("Unreachable")
+        batches = [{"SAMPLE": ("samples.xml", b"1", "text/xml")}]
+
+        with self.assertRaisesRegex(requests.exceptions.ConnectionError, "Unreach"):
+            submit_batches("url", ("user", "pass"), batches)
+
+
+def _response(status_code: int, content: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response.raw = BytesIO(content)
+    return response
+
+
+class TestPostSubmission(TestPluginBase):
+    """Tests for the post_submission function."""
+
+    package = "q2_ena_uploader.tests"
+
+    def setUp(self):
+        super().setUp()
+        self.receipt = (
+            b'<RECEIPT receiptDate="2024-06-13T09:04:59" '
+            b'submissionFile="submission.xml" success="true">'
+            b'<SAMPLE accession="ERS1" alias="s1" status="PRIVATE"/>'
+            b"<MESSAGES><INFO>TEST submission</INFO></MESSAGES>"
+            b"</RECEIPT>"
+        )
+        self.files = {
+            "SUBMISSION": (
+                "submission.xml",
+                "<SUBMISSION><ACTIONS><ACTION><MODIFY /></ACTION></ACTIONS>"
+                "</SUBMISSION>",
+                "text/xml",
+            )
+        }
+        self.add_files = {
+            "SUBMISSION": (
+                "submission.xml",
+                "<SUBMISSION><ACTIONS><ACTION><ADD /></ACTION></ACTIONS></SUBMISSION>",
+                "text/xml",
+            ),
+            "SAMPLE": ("sample.xml", BytesIO(b"<SAMPLE_SET/>"), "text/xml"),
+        }
+        patcher = patch("q2_ena_uploader.utils.time.sleep")
+        self.mock_sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch("requests.Session.post")
+    def test_success_first_attempt(self, mock_post):
+        """Test that successful submissions are not retried but timed."""
+        mock_post.return_value = _response(200, self.receipt)
+
+        response = post_submission("url", ("user", "pass"), self.files)
+
+        mock_post.assert_called_once_with(
+            "url",
+            auth=("user", "pass"),
+            files=self.files,
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+        )
+        self.mock_sleep.assert_not_called()
+        root = fromstring(response.content)
+        self.assertEqual(root.find("SAMPLE").get("accession"), "ERS1")
+        messages = [el.text for el in root.iter("INFO")]
+        self.assertEqual(messages[0], "TEST submission")
+        self.assertRegex(
+            messages[1], r"^Submission attempt 1 took \d+\.\d{2} s \(HTTP 200\)\.$"
+        )
+
+    @patch("requests.Session.post")
+    def test_retry_server_error(self, mock_post):
+        """Test that server errors are retried and the attempts recorded."""
+        mock_post.side_effect = [
+            _response(502, b"Bad gateway"),
+            _response(200, self.receipt),
+        ]
+
+        response = post_submission("url", ("user", "pass"), self.files)
+
+        self.assertEqual(mock_post.call_count, 2)
+        self.mock_sleep.assert_called_once_with(2.0)
+        messages = [el.text for el in fromstring(response.content).iter("INFO")]
+        self.assertEqual(messages[0], "TEST submission")
+        self.assertRegex(messages[1], r"^Submission attempt 1 took .* \(HTTP 502\)")
+        self.assertRegex(messages[2], r"^Submission attempt 2 took .* \(HTTP 200\)")
+
+    @patch("requests.Session.post")
+    def test_client_error_not_retried(self, mock_post):
+        """Test that client errors are returned without retrying."""
+        mock_post.return_value = _response(401, b"Unauthorized")
+
+        response = post_submission("url", ("user", "pass"), self.files)
+
+        mock_post.assert_called_once()
+        self.assertEqual(response.status_code, 401)
+
+    @patch("requests.Session.post")
+    def test_retries_exhausted(self, mock_post):
+        """Test that the last error is raised after all retries failed."""
+        mock_post.side_effect = requests.ConnectTimeout("timed out")
+
+        with self.assertRaises(requests.ConnectTimeout):
+            post_submission("url", ("user", "pass"), self.files, retries=2)
+
+        self.assertEqual(mock_post.call_count, 3)
+        self.assertEqual(
+            [c.args[0] for c in self.mock_sleep.call_args_list], [2.0, 4.0]
+        )
+
+    @patch("requests.Session.post")
+    def test_add_not_retried_after_read_timeout(self, mock_post):
+        """Test that an ADD which may have reached ENA is not sent again."""
+        mock_post.side_effect = requests.ReadTimeout("timed out")
+
+        with self.assertRaises(requests.ReadTimeout):
+            post_submission("url", ("user", "pass"), self.add_files)
+
+        mock_post.assert_called_once()
+        self.mock_sleep.assert_not_called()
+
+    @patch("requests.Session.post")
+    def test_add_not_retried_after_server_error(self, mock_post):
+        """Test that an ADD failing with a server error is not sent again."""
+        mock_post.return_value = _response(502, b"Bad gateway")
+
+        response = post_submission("url", ("user", "pass"), self.add_files)
+
+        mock_post.assert_called_once()
+        self.assertEqual(response.status_code, 502)
+
+    @patch("requests.Session.post")
+    def test_add_not_retried_after_body_sent(self, mock_post):
+        """Test that an ADD whose body was sent before it failed is not retried."""
+
+        def _post(url, **kwargs):
+            kwargs["data"].read()
+            raise requests.ConnectionError("connection reset")
+
+        mock_post.side_effect = _post
+
+        with self.assertRaises(requests.ConnectionError):
+            post_submission("url", ("user", "pass"), self.add_files)
+
+        mock_post.assert_called_once()
+
+    @patch("requests.Session.post")
+    def test_add_retried_after_connect_error(self, mock_post):
+        """Test that an ADD is retried if the connection failed."""
+        mock_post.side_effect = [
+            requests.ConnectTimeout("timed out"),
+            requests.ConnectionError("connection refused"),
+            _response(200, self.receipt),
+        ]
+
+        response = post_submission("url", ("user", "pass"), self.add_files)
+
+        self.assertEqual(mock_post.call_count, 3)
+        self.assertEqual(fromstring(response.content).get("success"), "true")
+
+    @patch("requests.Session.post")
+    def test_retried_add_existing_objects(self, mock_post):
+        """Test that objects added by an earlier attempt are recovered."""
+        failed = (
+            b'<RECEIPT receiptDate="2024-06-13T09:04:59" '
+            b'submissionFile="submission.xml" success="false">'
+            b"<MESSAGES><ERROR>In sample, alias: &quot;s1&quot;. The object being "
+            b"added already exists in the submission account with accession: "
+            b"&quot;ERS1&quot;.</ERROR></MESSAGES>"
+            b"</RECEIPT>"
+        )
+        mock_post.side_effect = [
+            requests.ConnectTimeout("timed out"),
+            _response(200, failed),
+        ]
+
+        response = post_submission("url", ("user", "pass"), self.add_files)
+
+        receipt = fromstring(response.content)
+        self.assertEqual(receipt.get("success"), "true")
+        self.assertEqual(
+            receipt.find("SAMPLE").attrib, {"alias": "s1", "accession": "ERS1"}
+        )
+        self.assertIsNone(receipt.find("MESSAGES/ERROR"))
+        self.assertIn(
+            "already registered with the accession ERS1",
+            receipt.find("MESSAGES/INFO").text,
+        )
+
+    @patch("requests.Session.post")
+    def test_receipt_streamed_to_file(self, mock_post):
+        """Test that the receipt is written to the given file in chunks."""
+        mock_post.return_value = _response(200, self.receipt)
+        receipt = BytesIO()
+
+        with patch("q2_ena_uploader.utils.RECEIPT_CHUNK_SIZE", 16):
+            post_submission("url", ("user", "pass"), self.files, receipt=receipt)
+
+        self.assertTrue(mock_post.call_args.kwargs["stream"])
+        root = fromstring(receipt.getvalue())
+        self.assertEqual(root.find("SAMPLE").get("accession"), "ERS1")
+        self.assertIn("Submission attempt 1", root.findall("MESSAGES/INFO")[-1].text)
+
+    @patch("requests.Session.post")
+    def test_receipt_streamed_to_write_only_file(self, mock_post):
+        """Test that the attempts are recorded in a file opened for writing."""
+        mock_post.return_value = _response(200, self.receipt)
+        path = os.path.join(self.temp_dir.name, "receipt.xml")
+
+        with open(path, "wb") as receipt:
+            post_submission("url", ("user", "pass"), self.files, receipt=receipt)
+
+        with open(path, "rb") as fh:
+            root = fromstring(fh.read())
+        self.assertEqual(root.find("SAMPLE").get("accession"), "ERS1")
+        self.assertIn("Submission attempt 1", root.findall("MESSAGES/INFO")[-1].text)
+
+    @patch("requests.Session.post")
+    def test_retried_receipt_streamed_to_file(self, mock_post):
+        """Test that the attempts are recorded in a streamed receipt."""
+        mock_post.side_effect = [
+            _response(503, b"Service unavailable"),
+            _response(200, self.receipt),
+        ]
+        receipt = BytesIO()
+
+        post_submission("url", ("user", "pass"), self.files, receipt=receipt)
+
+        messages = [el.text for el in fromstring(receipt.getvalue()).iter("INFO")]
+        self.assertEqual(len(messages), 3)
+        self.assertRegex(messages[1], r"^Submission attempt 1 took .* \(HTTP 503\)")
+
+    @patch("requests.Session.post")
+    def test_streamed_files_retried(self, mock_post):
+        """Test that file parts are streamed and re-read on every attempt."""
+        bodies = []
+
+        def _post(url, **kwargs):
+            bodies.append(kwargs["data"].read())
+            if len(bodies) == 1:
+                raise requests.ConnectionError("connection reset")
+            return _response(200, self.receipt)
+
+        mock_post.side_effect = _post
+        files = {
+            **self.files,
+            "SAMPLE": ("sample.xml", BytesIO(b"<SAMPLE_SET/>"), "text/xml"),
+        }
+
+        post_submission("url", ("user", "pass"), files)
+
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertNotIn("files", mock_post.call_args.kwargs)
+        self.assertIn(b"<SAMPLE_SET/>", bodies[0])
+        # each attempt uses a new boundary but sends the same parts
+        parts = [body.split(body[2:34]) for body in bodies]
+        self.assertEqual(parts[0], parts[1])
+
+
+class TestRecoverExistingObjects(TestPluginBase):
+    """Tests for the recover_existing_objects function."""
+
+    package = "q2_ena_uploader.tests"
+
+    def test_other_errors_kept(self):
+        """Test that a receipt with other errors still fails."""
+        receipt = (
+            b'<RECEIPT success="false"><MESSAGES>'
+            b'<ERROR>In project, alias: "p1", accession: "". The object being '
+            b"added already exists in the submission account with accession: "
+            b'"PRJEB1".</ERROR>'
+            b"<ERROR>Invalid sample.</ERROR>"
+            b"</MESSAGES></RECEIPT>"
+        )
+
+        recovered = fromstring(recover_existing_objects(receipt))
+
+        self.assertEqual(recovered.get("success"), "false")
+        self.assertEqual(recovered.find("PROJECT").get("accession"), "PRJEB1")
+        self.assertEqual(
+            [el.text for el in recovered.findall("MESSAGES/ERROR")],
+            ["Invalid sample."],
+        )
+
+    def test_no_existing_objects(self):
+        """Test that other receipts are returned unchanged."""
+        receipt = b'<RECEIPT success="false"><MESSAGES><ERROR>x</ERROR></MESSAGES>'
+        self.assertEqual(
+            recover_existing_objects(receipt + b"</RECEIPT>"), receipt + b"</RECEIPT>"
+        )
+        self.assertEqual(recover_existing_objects(b"Bad gateway"), b"Bad gateway")
+
+
+class TestMultipartStream(TestPluginBase):
+    """Tests for the MultipartStream request body."""
+
+    package = "q2_ena_uploader.tests"
+
+    def setUp(self):
+        super().setUp()
+        self.files = {
+            "SUBMISSION": ("submission.xml", "<SUBMISSION/>", "text/xml"),
+            "EXPERIMENT": ("metadata.xml", b"<EXPERIMENT_SET/>", "text/xml"),
+            "RUN": ("run.xml", BytesIO(b"<RUN_SET/>" * 1000), "text/xml"),
+        }
+
+    def test_body_matches_requests_encoding(self):
+        """Test that the streamed body is the one requests would send."""
+        stream = MultipartStream(self.files)
+        boundary = stream.content_type.split("boundary=")[1]
+
+        body = stream.read()
+        self.files["RUN"][1].seek(0)
+        with patch("urllib3.filepost.choose_boundary", return_value=boundary):
+            expected, content_type = requests.models.RequestEncodingMixin._encode_files(
+                self.files, {}
+            )
+
+        self.assertEqual(body, expected)
+        self.assertEqual(stream.content_type, content_type)
+        self.assertEqual(stream.len, len(body))
+
+    def test_read_in_chunks(self):
+        """Test that the body can be read in chunks spanning several parts."""
+        expected = MultipartStream(self.files).read()
+        self.files["RUN"][1].seek(0)
+        stream = MultipartStream(self.files)
+
+        chunks = iter(lambda: stream.read(100), b"")
+        body = b"".join(chunks)
+
+        # boundaries are random - compare everything around them
+        self.assertEqual(len(body), len(expected))
+        self.assertEqual(body.count(b"<RUN_SET/>"), 1000)
+        self.assertEqual(stream.read(100), b"")
+
+
+class _ReceiptHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        body = b'<RECEIPT success="true"/>'
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestSession(TestPluginBase):
+    """Tests for the shared HTTP session."""
+
+    package = "q2_ena_uploader.tests"
+
+    def setUp(self):
+        super().setUp()
+        self.session = configure_session()
+        self.addCleanup(configure_session)
+
+    def _serve(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _ReceiptHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return f"http://127.0.0.1:{server.server_port}/submit"
+
+    def test_get_session_is_shared(self):
+        """Test that the same session is returned by every call."""
+        self.assertIs(get_session(), self.session)
+        self.assertIs(get_session(), get_session())
+
+    def test_configure_session(self):
+        """Test that the pool size and keep-alive settings are applied."""
+        session = configure_session(pool_size=3, keep_alive=False)
+
+        adapter = session.get_adapter("https://www.ebi.ac.uk")
+        self.assertEqual(adapter._pool_maxsize, 3)
+        self.assertEqual(session.headers["Connection"], "close")
+        self.assertIs(get_session(), session)
+
+    def test_connections_reused(self):
+        """Test that consecutive requests reuse a single connection."""
+        url = self._serve()
+
+        for _ in range(3):
+            get_session().post(url, files={"SAMPLE": b"<SAMPLE_SET/>"})
+
+        (stats,) = connection_stats().values()
+        self.assertEqual(stats, {"connections": 1, "requests": 3})
+
+    def test_connections_not_reused_without_keep_alive(self):
+        """Test that every request opens a new connection without keep-alive."""
+        configure_session(keep_alive=False)
+        url = self._serve()
+
+        for _ in range(3):
+            get_session().post(url, files={"SAMPLE": b"<SAMPLE_SET/>"})
+
+        (stats,) = connection_stats().values()
+        self.assertEqual(stats, {"connections": 3, "requests": 3})
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -8,6 +8,8 @@
 from ._types_and_formats import (
     ENAMetadataSamplesFormat,
     ENAMetadataSamplesDirFmt,
+    ENAMetadataSamplesParquetFormat,
+    ENAMetadataSamplesShardFormat,
     ENAMetadataSamples,
     ENAMetadataStudyFormat,
     ENAMetadataStudyDirFmt,
@@ -18,11 +20,17 @@ from ._types_and_formats import (
     ENASubmissionReceiptFormat,
     ENASubmissionReceiptDirFmt,
     ENASubmissionReceipt,
+    ENASubmissionDocumentFormat,
+    ENASubmissionBundleManifestFormat,
+    ENASubmissionBundleDirFmt,
+    ENASubmissionBundle,
 )
 
 __all__ = [
     ENAMetadataSamplesFormat,
     ENAMetadataSamplesDirFmt,
+    ENAMetadataSamplesParquetFormat,
+    ENAMetadataSamplesShardFormat,
     ENAMetadataSamples,
     ENAMetadataStudyFormat,
     ENAMetadataStudyDirFmt,
@@ -33,4 +41,8 @@ __all__ = [
     ENASubmissionReceiptFormat,
     ENASubmissionReceiptDirFmt,
     ENASubmissionReceipt,
+    ENASubmissionDocumentFormat,
+    ENASubmissionBundleManifestFormat,
+    ENASubmissionBundleDirFmt,
+    ENASubmissionBundle,
 ]
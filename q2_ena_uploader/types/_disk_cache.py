@@ -0,0 +1,105 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import hashlib
+import os
+import tempfile
+from typing import Optional
+
+# Size of the chunks the cached files are read in to compute their digest
+DIGEST_CHUNK_SIZE = 2**20
+
+
+def file_digest(path: str) -> str:
+    """Compute the SHA-256 digest of the content of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(DIGEST_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def default_cache_dir(name: str) -> str:
+    """Directory of a cache in the user's cache directory."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "q2-ena-uploader", name)
+
+
+class _DiskCache:
+    """
+    Directory of entries stored under the digest of the content of a file
+    and a key, e.g. the format it was processed as. The least recently used
+    entries are evicted once the entries exceed the maximum size.
+    """
+
+    SUFFIX = ""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def _entry_name(self, digest: str, key: str) -> str:
+        # entries of a file share the prefix of its digest, so that they can
+        # be invalidated without knowing the keys they were stored under
+        key = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+        return f"{digest}-{key}{self.SUFFIX}"
+
+    def lookup(self, digest: str, key: str) -> Optional[str]:
+        """Path to an entry, or None if it is not stored."""
+        path = os.path.join(self.path, self._entry_name(digest, key))
+        try:
+            # the modification time marks the last use of the entry
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def reserve(self) -> tuple:
+        """Open a temporary file in the cache, to be committed as an entry."""
+        os.makedirs(self.path, exist_ok=True)
+        return tempfile.mkstemp(dir=self.path, suffix=".tmp")
+
+    def commit(self, tmp: str, digest: str, key: str):
+        """Store a temporary file (see `reserve`) as an entry."""
+        # replaced atomically, as other processes may read the entry meanwhile
+        os.replace(tmp, os.path.join(self.path, self._entry_name(digest, key)))
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        with os.scandir(self.path) as it:
+            for entry in it:
+                if entry.name.endswith(self.SUFFIX):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        nbytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if nbytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            nbytes -= size
+
+    def _remove(self, predicate):
+        if not os.path.isdir(self.path):
+            return
+        for name in os.listdir(self.path):
+            if name.endswith(self.SUFFIX) and predicate(name):
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    pass
+
+    def invalidate(self, digest: str):
+        self._remove(lambda name: name.startswith(f"{digest}-"))
+
+    def clear(self):
+        self._remove(lambda name: True)
@@ -0,0 +1,149 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+from typing import Iterator, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from q2_ena_uploader.types._parse_cache import NA_VALUES, records, to_cell
+
+# Number of rows read from a Parquet file at once when rendering its XML
+BATCH_SIZE = 10_000
+
+
+def is_string_type(data_type: pa.DataType) -> bool:
+    """Whether a column of the given type holds strings."""
+    if pa.types.is_dictionary(data_type):
+        data_type = data_type.value_type
+    return pa.types.is_string(data_type) or pa.types.is_large_string(data_type)
+
+
+def read_schema(path: str) -> pa.Schema:
+    """Read the schema of a Parquet file (only its footer is read)."""
+    return pq.read_schema(path)
+
+
+def _chunk_has_missing(chunk: pq.ColumnChunkMetaData) -> Optional[bool]:
+    # whether a column chunk contains missing values according to its
+    # statistics, or None if the statistics cannot tell
+    if chunk.num_values == 0:
+        return False
+    stats = chunk.statistics
+    if stats is None or not stats.has_null_count:
+        return None
+    if stats.null_count > 0:
+        return True
+    if not stats.has_min_max:
+        return None
+    if stats.min in NA_VALUES or stats.max in NA_VALUES:
+        return True
+    # only values between the smallest and the largest one may be missing
+    if any(stats.min < value < stats.max for value in NA_VALUES):
+        return None
+    return False
+
+
+def _column_has_missing(column: pa.ChunkedArray) -> bool:
+    if column.null_count > 0:
+        return True
+    na_values = pa.array(NA_VALUES, type=pa.string())
+    return pc.any(pc.is_in(column.cast(pa.string()), na_values)).as_py() or False
+
+
+def columns_with_missing(path: str, columns: List[str]) -> List[str]:
+    """
+    Find the columns of a Parquet file which contain missing values.
+
+    Nulls and the strings which pandas.read_csv reads as NaN (see NA_VALUES),
+    e.g. empty strings, are considered missing - the same values as in the
+    TSV files. The row group statistics stored in the file are used where
+    available - only the row groups of the columns without usable statistics
+    are read.
+
+    Parameters
+    ----------
+    path : str
+        Path to the Parquet file.
+    columns : list of str
+        Names of the columns to check.
+
+    Returns
+    -------
+    list of str
+        The checked columns which contain missing values.
+    """
+    parquet = pq.ParquetFile(path)
+    names = parquet.schema_arrow.names
+    missing = []
+    for column in columns:
+        index = names.index(column)
+        for row_group in range(parquet.num_row_groups):
+            chunk = parquet.metadata.row_group(row_group).column(index)
+            has_missing = _chunk_has_missing(chunk)
+            if has_missing is None:
+                table = parquet.read_row_group(row_group, columns=[column])
+                has_missing = _column_has_missing(table.column(0))
+            if has_missing:
+                missing.append(column)
+                break
+    return missing
+
+
+def iter_records(path: str, batch_size: int = BATCH_SIZE) -> Iterator[List[dict]]:
+    """
+    Read the rows of a Parquet file in batches.
+
+    Parameters
+    ----------
+    path : str
+        Path to the Parquet file.
+    batch_size : int, optional
+        Maximum number of rows per batch, by default BATCH_SIZE.
+
+    Yields
+    ------
+    list of dict
+        Rows of the batch as dictionaries of verbatim cell values, the same
+        as the rows of a TSV file - nulls are None.
+    """
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        columns = [column.to_pylist() for column in batch.columns]
+        yield records(batch.schema.names, zip(*columns))
+
+
+def read_table(path: str) -> pd.DataFrame:
+    """Read a Parquet file into a DataFrame of strings."""
+    return pq.read_table(path).to_pandas()
+
+
+def write_table(df: pd.DataFrame, path: str):
+    """
+    Write a DataFrame into a Parquet file with all the columns as strings.
+
+    The values are converted the same way as when they are written into a
+    TSV file, with None and NaN stored as nulls. Columns with few distinct
+    values are dictionary-encoded by Parquet.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The table to write - its index is not written.
+    path : str
+        Path to the Parquet file.
+    """
+    columns = {
+        str(name): pa.array(
+            df.iloc[:, i].map(to_cell).astype(object),
+            type=pa.string(),
+            from_pandas=True,
+        )
+        for i, name in enumerate(df.columns)
+    }
+    pq.write_table(pa.table(columns), path)
@@ -0,0 +1,331 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import csv
+import importlib.util
+import io
+import os
+import threading
+from collections import OrderedDict
+from itertools import islice
+from typing import Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+# Maximum memory (in bytes) taken by the parsed tables kept in the cache -
+# the least recently used tables are evicted first
+MAX_CACHE_BYTES = 256 * 2**20
+
+# Engines parsing the TSV files, in the order of preference
+ENGINES = ("pyarrow", "c", "csv")
+
+# Columns with at most this many distinct values per row are categorical
+CATEGORY_MAX_RATIO = 0.5
+
+# Values interpreted as missing by pandas.read_csv by default
+NA_VALUES = [
+    "",
+    "#N/A",
+    "#N/A N/A",
+    "#NA",
+    "-1.#IND",
+    "-1.#QNAN",
+    "-NaN",
+    "-nan",
+    "1.#IND",
+    "1.#QNAN",
+    "<NA>",
+    "N/A",
+    "NA",
+    "NULL",
+    "NaN",
+    "None",
+    "n/a",
+    "nan",
+    "null",
+]
+
+
+def missing_values(table: pd.DataFrame) -> pd.DataFrame:
+    """Cells of a table of strings which pandas.read_csv would read as NaN."""
+    return table.isna() | table.isin(NA_VALUES)
+
+
+def to_cell(value) -> Optional[str]:
+    """
+    Convert a value of a metadata table into the verbatim string of its cell.
+
+    Values are converted the way they are written into a TSV file, e.g. 1.0
+    stays "1.0", while the strings of missing values (see NA_VALUES) are kept
+    verbatim. None and NaN are cells without any value (None), like the
+    values missing from short TSV rows.
+    """
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    return str(value)
+
+
+def records(columns: List[str], rows: Iterable[Iterable]) -> List[dict]:
+    """Rows of a metadata table as dictionaries of verbatim cell values."""
+    return [dict(zip(columns, map(to_cell, row))) for row in rows]
+
+
+def string_frame(table: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert a table of strings into a DataFrame as read by pandas.read_csv
+    with dtype=object.
+
+    Missing values are replaced by NaN, while all the other values stay
+    strings - no column is converted to numbers, so that e.g. taxon IDs keep
+    their exact value. The table itself is not modified.
+    """
+    return table.astype(object).mask(missing_values(table))
+
+
+def available_engines() -> List[str]:
+    """Return the names of the TSV parsing engines which can be used."""
+    return [
+        name
+        for name in ENGINES
+        if name != "pyarrow" or importlib.util.find_spec("pyarrow") is not None
+    ]
+
+
+def _read_strings(data: bytes, n_columns: int, engine: str) -> pd.DataFrame:
+    # every value is read as a (categorical) string - without any type
+    # inference or NA parsing
+    if engine == "pyarrow":
+        # pandas.read_csv would let pyarrow infer the column types first
+        import pyarrow as pa
+        from pyarrow import csv as pa_csv
+
+        names = [str(i) for i in range(n_columns)]
+        string = pa.dictionary(pa.int32(), pa.string())
+        table = pa_csv.read_csv(
+            io.BytesIO(data),
+            read_options=pa_csv.ReadOptions(skip_rows=1, column_names=names),
+            parse_options=pa_csv.ParseOptions(delimiter="\t"),
+            convert_options=pa_csv.ConvertOptions(
+                column_types={name: string for name in names}
+            ),
+        )
+        return table.to_pandas()
+    return pd.read_csv(
+        io.BytesIO(data),
+        sep="\t",
+        header=None,
+        names=range(n_columns),
+        skiprows=1,
+        dtype="category",
+        keep_default_na=False,
+        # blank lines become rows, caught by the check of short rows
+        skip_blank_lines=False,
+        engine=engine,
+    )
+
+
+def _read_csv(data: bytes, engine: str) -> Optional[pd.DataFrame]:
+    # quoted values may contain tabs and line breaks, which would break the
+    # check of short rows below - such files are left to the csv module
+    if b'"' in data:
+        return None
+    header = data.split(b"\n", 1)[0].rstrip(b"\r").decode("utf-8-sig")
+    header = header.split("\t")
+    # files with a single column have no separators to check
+    if len(header) < 2:
+        return None
+    try:
+        df = _read_strings(data, len(header), engine)
+    except ValueError:
+        # e.g. rows with more values than the header
+        return None
+    # short rows are padded with empty strings by pandas, while their
+    # missing values need to stay None - a file is only parsed by pandas
+    # if it contains no short rows, i.e. every row has all the separators
+    if data.count(b"\t") != (len(df) + 1) * (len(header) - 1) or df.isna().any(
+        axis=None
+    ):
+        return None
+    df.columns = header
+    return df
+
+
+def _read_csv_module(path: str, n_rows: Optional[int]) -> pd.DataFrame:
+    with open(path, "r", newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f, delimiter="\t")
+        header = next(reader, [])
+        # like csv.DictReader, blank lines are skipped and values missing
+        # from the end of short rows are None
+        padding = [None] * len(header)
+        rows = []
+        for row in islice(filter(None, reader), n_rows):
+            # trailing empty values (e.g. exported by spreadsheets) are
+            # dropped, while any other extra value would be lost silently
+            if any(row[len(header) :]):
+                raise ValueError(
+                    f"Line {reader.line_num} of {os.path.basename(path)} has "
+                    f"{len(row)} values, but its header only has {len(header)} "
+                    "columns. Please make sure that no value contains a tab."
+                )
+            rows.append((row + padding)[: len(header)])
+    return pd.DataFrame(rows, columns=header, dtype=object)
+
+
+def _categorize(table: pd.DataFrame) -> pd.DataFrame:
+    # values repeated across rows (typical for checklist fields) are stored
+    # only once, together with an integer code per row
+    for i in range(table.shape[1]):
+        values = pd.Categorical(table.iloc[:, i])
+        if len(values.categories) <= CATEGORY_MAX_RATIO * len(values):
+            table.isetitem(i, values)
+        else:
+            table.isetitem(i, table.iloc[:, i].astype(object))
+    return table
+
+
+class ParsedTSV:
+    """
+    A metadata TSV file parsed into a table of the verbatim cell values.
+
+    The table is shared by the validation of the file, its transformation
+    into a DataFrame/Metadata and the generation of its XML, so that every
+    file only needs to be parsed once. All the values are read as strings,
+    and columns with few distinct values are stored as categoricals.
+
+    Parameters
+    ----------
+    path : str
+        Path to the TSV file.
+    n_rows : int, optional
+        Only parse the header and the first `n_rows` rows of the file,
+        by default the whole file is parsed.
+    engine : str, optional
+        Name of the parsing engine: "pyarrow" or "c" (parsing with
+        pandas.read_csv) or "csv" (the csv module). By default the first of
+        the available engines is used. Files which pandas would parse
+        differently from the csv module (quoted values, short rows) are
+        always parsed by the csv module.
+
+    Raises
+    ------
+    ValueError
+        If a row has more (non-empty) values than the header has columns.
+    """
+
+    def __init__(
+        self, path: str, n_rows: Optional[int] = None, engine: Optional[str] = None
+    ):
+        engine = engine or available_engines()[0]
+        if engine not in ENGINES:
+            raise ValueError(
+                f"Unknown TSV parsing engine: {engine}. "
+                f"Supported engines are: {', '.join(ENGINES)}."
+            )
+
+        df = None
+        if engine != "csv" and n_rows is None:
+            with open(path, "rb") as f:
+                df = _read_csv(f.read(), engine)
+        if df is None:
+            df = _read_csv_module(path, n_rows)
+
+        self.table = _categorize(df)
+        self.nbytes = int(self.table.memory_usage(deep=True).sum())
+
+    def missing(self) -> pd.DataFrame:
+        """Cells which pandas.read_csv would read as missing (NaN)."""
+        return missing_values(self.table)
+
+    def records(self) -> List[dict]:
+        """Rows of the file as dictionaries of verbatim cell values."""
+        columns = [
+            self.table.iloc[:, i].astype(object).tolist()
+            for i in range(self.table.shape[1])
+        ]
+        return records(self.table.columns.tolist(), zip(*columns))
+
+    def frame(self) -> pd.DataFrame:
+        """
+        The file as a DataFrame, as read by pandas.read_csv with dtype=object.
+
+        Missing values are replaced by NaN and all the other values are
+        strings - a new DataFrame is returned every time, so it can be
+        modified freely.
+        """
+        return string_frame(self.table)
+
+
+class _ParseCache:
+    def __init__(self, max_bytes: int = MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._lock = threading.Lock()
+        # {path: ((size, mtime), ParsedTSV)} in the order of last use
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def _signature(path: str) -> Tuple[int, int]:
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def get(self, path: str) -> ParsedTSV:
+        path = os.path.realpath(path)
+        signature = self._signature(path)
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached is not None and cached[0] == signature:
+                self._entries.move_to_end(path)
+                return cached[1]
+
+        parsed = ParsedTSV(path)
+        with self._lock:
+            self._discard(path)
+            # tables which would not fit are never cached
+            if parsed.nbytes <= self.max_bytes:
+                self._entries[path] = (signature, parsed)
+                self.nbytes += parsed.nbytes
+                while self.nbytes > self.max_bytes:
+                    self._discard(next(iter(self._entries)))
+        return parsed
+
+    def _discard(self, path: str):
+        cached = self._entries.pop(path, None)
+        if cached is not None:
+            self.nbytes -= cached[1].nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+_cache = _ParseCache()
+
+
+def parse_tsv(path: str) -> ParsedTSV:
+    """
+    Get a parsed metadata TSV file, parsing it only if it is not cached.
+
+    Files are cached under their path, size and modification time, so a
+    file which changed on disk is parsed again.
+
+    Parameters
+    ----------
+    path : str
+        Path to the TSV file.
+
+    Returns
+    -------
+    ParsedTSV
+        The parsed file.
+    """
+    return _cache.get(str(path))
+
+
+def clear_parse_cache():
+    """Remove all the parsed files from the cache."""
+    _cache.clear()
@@ -0,0 +1,203 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import builtins
+import hashlib
+import json
+import os
+import warnings
+from typing import BinaryIO, Callable, List, Optional
+
+import qiime2
+
+import q2_ena_uploader
+from q2_ena_uploader.metadata.xml_backend import etree
+from q2_ena_uploader.types._disk_cache import _DiskCache, default_cache_dir, file_digest
+
+# Environment variable with the directory the rendered XML documents are
+# stored in - by default a directory in the user's cache directory
+RENDER_CACHE_DIR_ENV = "ENA_RENDER_CACHE_DIR"
+
+# Environment variable enabling the cache when set to "true" - the cache is
+# disabled by default
+RENDER_CACHE_ENABLED_ENV = "ENA_RENDER_CACHE"
+
+# Maximum size (in bytes) of the stored XML documents - the least recently
+# used documents are evicted first
+MAX_RENDER_CACHE_BYTES = 512 * 2**20
+
+# Size of the chunks the stored XML documents are copied in
+COPY_CHUNK_SIZE = 2**20
+
+# Every stored entry ends with the size of its document, written as a
+# fixed number of digits - the document is followed by the warnings issued
+# while it was rendered
+_SIZE_DIGITS = 16
+
+
+class _RenderCache(_DiskCache):
+    SUFFIX = ".xml"
+
+    def __init__(self, path: str, max_bytes: int = MAX_RENDER_CACHE_BYTES):
+        super().__init__(path, max_bytes)
+
+
+def _get_cache() -> Optional[_RenderCache]:
+    # the environment is read on every use, so that it can be changed at
+    # runtime (e.g. by the tests)
+    if os.environ.get(RENDER_CACHE_ENABLED_ENV, "false").lower() != "true":
+        return None
+    return _RenderCache(
+        os.environ.get(RENDER_CACHE_DIR_ENV) or default_cache_dir("xml")
+    )
+
+
+def _digest(paths: List[str]) -> str:
+    if len(paths) == 1:
+        return file_digest(paths[0])
+    # a document rendered from several files (e.g. shards), in their order
+    digests = "\n".join(file_digest(path) for path in paths)
+    return hashlib.sha256(digests.encode("utf-8")).hexdigest()
+
+
+def _copy(source: BinaryIO, file: Optional[BinaryIO], size: int) -> Optional[bytes]:
+    if file is None:
+        return source.read(size)
+    while size > 0:
+        chunk = source.read(min(COPY_CHUNK_SIZE, size))
+        if not chunk:
+            break
+        file.write(chunk)
+        size -= len(chunk)
+    return None
+
+
+def _warn(caught: List[list]):
+    # warnings are issued again the way they were issued while rendering
+    for category, message, filename, lineno in caught:
+        category = getattr(builtins, category, UserWarning)
+        if not (isinstance(category, type) and issubclass(category, Warning)):
+            category = UserWarning
+        warnings.warn_explicit(message, category, filename, lineno)
+
+
+def _render(
+    render: Callable[[Optional[BinaryIO]], Optional[bytes]], fh: BinaryIO
+) -> List[list]:
+    # the warnings issued while rendering are recorded, to be stored together
+    # with the document and issued again whenever it is used
+    try:
+        with warnings.catch_warnings(record=True) as recorded:
+            warnings.simplefilter("always")
+            render(fh)
+    finally:
+        caught = [
+            [w.category.__name__, str(w.message), w.filename, w.lineno]
+            for w in recorded
+        ]
+        _warn(caught)
+    return caught
+
+
+def _read_entry(path: str, file: Optional[BinaryIO]) -> Optional[bytes]:
+    with open(path, "rb") as fh:
+        fh.seek(-_SIZE_DIGITS, os.SEEK_END)
+        end = fh.tell()
+        size = int(fh.read(_SIZE_DIGITS))
+        fh.seek(size)
+        caught = json.loads(fh.read(end - size))
+        fh.seek(0)
+        result = _copy(fh, file, size)
+    _warn(caught)
+    return result
+
+
+def cached_render(
+    paths: List[str],
+    format_cls: type,
+    render: Callable[[Optional[BinaryIO]], Optional[bytes]],
+    file: Optional[BinaryIO] = None,
+) -> Optional[bytes]:
+    """
+    Render the XML document of metadata files, unless it is already stored.
+
+    Documents are stored on disk, under the digest of the files' content, the
+    format class, the versions of the plugin and of QIIME 2 (which are
+    recorded in the documents) and the XML backend, so that the same metadata
+    is only rendered once - e.g. when it is submitted to the development
+    server first and to the production server afterwards, or submitted again
+    after a failure. The warnings issued while rendering a document are
+    stored with it and issued again whenever the stored document is used.
+
+    The cache is only used if it is enabled by setting the ENA_RENDER_CACHE
+    environment variable to "true".
+
+    Parameters
+    ----------
+    paths : list of str
+        Paths to the files the document is rendered from.
+    format_cls : type
+        The format of the files.
+    render : callable
+        Function rendering the document into the given binary file, or
+        returning it if no file is given.
+    file : file-like, optional
+        Binary file the document is written to instead of being returned.
+
+    Returns
+    -------
+    bytes or None
+        The XML document, or None if it was written to `file`.
+    """
+    cache = _get_cache()
+    if cache is None:
+        return render(file)
+
+    try:
+        digest = _digest(paths)
+    except OSError:
+        return render(file)
+    key = (
+        f"{format_cls.__module__}.{format_cls.__qualname__}|"
+        f"{q2_ena_uploader.__version__}|{qiime2.__version__}|{etree.name}"
+    )
+
+    path = cache.lookup(digest, key)
+    if path is not None:
+        try:
+            return _read_entry(path, file)
+        except (OSError, ValueError):
+            # evicted by another process meanwhile, or stored by an earlier
+            # version of the plugin without its warnings
+            pass
+
+    try:
+        fd, tmp = cache.reserve()
+    except OSError:
+        # e.g. a read-only cache directory - the document is not stored
+        return render(file)
+    try:
+        with os.fdopen(fd, "w+b") as fh:
+            caught = _render(render, fh)
+            size = fh.tell()
+            fh.write(json.dumps(caught).encode("utf-8"))
+            fh.write(b"%0*d" % (_SIZE_DIGITS, size))
+            fh.seek(0)
+            result = _copy(fh, file, size)
+        # only stored once the document was rendered completely
+        cache.commit(tmp, digest, key)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return result
+
+
+def clear_render_cache():
+    """Remove all the stored XML documents."""
+    cache = _get_cache()
+    if cache is not None:
+        cache.clear()
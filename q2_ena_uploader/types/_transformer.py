@@ -5,11 +5,16 @@
 #
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
+from typing import List
+
 import pandas as pd
 import qiime2
 
+from ._parse_cache import parse_tsv, string_frame
 from ._types_and_formats import (
+    ENAMetadataSamplesDirFmt,
     ENAMetadataSamplesFormat,
+    ENAMetadataSamplesParquetFormat,
     ENAMetadataStudyFormat,
     ENASubmissionReceiptFormat,
     ENAMetadataExperimentFormat,
@@ -18,31 +23,44 @@ from ..plugin_setup import plugin
 
 
 def _samples_fmt_to_metadata(ff: ENAMetadataSamplesFormat) -> qiime2.Metadata:
-    with ff.open() as fh:
-        df = pd.read_csv(fh, sep="\t")
-        df = df.rename(columns={"alias": "id"}).set_index("id")
-        return qiime2.Metadata(df)
+    df = parse_tsv(str(ff)).frame()
+    df = df.rename(columns={"alias": "id"}).set_index("id")
+    return qiime2.Metadata(df)
 
 
 def study_fmt_to_metadata(ff: ENAMetadataStudyFormat) -> qiime2.Metadata:
     with ff.open() as fh:
-        df = pd.read_csv(fh, header=None, index_col=0, delimiter="\t")
+        df = pd.read_csv(fh, header=None, index_col=0, delimiter="\t", dtype=str)
         df = df.T.rename(columns={"alias": "id"}).set_index("id")
         return qiime2.Metadata(df)
 
 
+def _samples_shards_to_tsv(paths: List[str]) -> ENAMetadataSamplesFormat:
+    # the shards share their header, which is only written once
+    ff = ENAMetadataSamplesFormat()
+    with open(str(ff), "wb") as out:
+        for i, path in enumerate(paths):
+            with open(path, "rb") as shard:
+                header = shard.readline()
+                if i == 0:
+                    out.write(header)
+                rows = shard.read()
+            if rows and not rows.endswith(b"\n"):
+                rows += b"\n"
+            out.write(rows)
+    return ff
+
+
 @plugin.register_transformer
 def _1(ff: ENAMetadataSamplesFormat) -> pd.DataFrame:
-    with ff.open() as fh:
-        df = pd.read_csv(fh, delimiter="\t")
-        return df
+    return parse_tsv(str(ff)).frame()
 
 
 @plugin.register_transformer
 def _2(ff: ENAMetadataStudyFormat) -> dict:
     with ff.open() as fh:
         df_dict = (
-            pd.read_csv(fh, header=None, index_col=0, delimiter="\t")
+            pd.read_csv(fh, header=None, index_col=0, delimiter="\t", dtype=str)
             .squeeze("columns")
             .to_dict()
         )
@@ -69,19 +87,127 @@ def _5(ff: ENAMetadataStudyFormat) -> qiime2.Metadata:
 
 @plugin.register_transformer
 def _6(ff: ENAMetadataExperimentFormat) -> pd.DataFrame:
-    with ff.open() as fh:
-        df = pd.read_csv(fh, delimiter="\t")
-        df = df.rename(columns={"sample_description": "id"}).set_index("id")
-        return df
+    df = parse_tsv(str(ff)).frame()
+    return df.rename(columns={"sample_description": "id"}).set_index("id")
 
 
 def _experiment_fmt_to_metadata(ff: ENAMetadataExperimentFormat) -> qiime2.Metadata:
-    with ff.open() as fh:
-        df = pd.read_csv(fh, sep="\t")
-        df = df.rename(columns={"sample_description": "id"}).set_index("id")
-        return qiime2.Metadata(df)
+    df = parse_tsv(str(ff)).frame()
+    df = df.rename(columns={"sample_description": "id"}).set_index("id")
+    return qiime2.Metadata(df)
 
 
 @plugin.register_transformer
 def _7(ff: ENAMetadataExperimentFormat) -> qiime2.Metadata:
     return _experiment_fmt_to_metadata(ff)
+
+
+def _samples_parquet_to_df(ff: ENAMetadataSamplesParquetFormat) -> pd.DataFrame:
+    # pyarrow is only imported when a Parquet file is transformed
+    from ._parquet import read_table
+
+    return string_frame(read_table(str(ff)))
+
+
+def _samples_parquet_to_tsv(
+    ff: ENAMetadataSamplesParquetFormat,
+) -> ENAMetadataSamplesFormat:
+    from ._parquet import read_table
+
+    result = ENAMetadataSamplesFormat()
+    read_table(str(ff)).to_csv(str(result), sep="\t", index=False)
+    return result
+
+
+@plugin.register_transformer
+def _8(ff: ENAMetadataSamplesParquetFormat) -> pd.DataFrame:
+    return _samples_parquet_to_df(ff)
+
+
+@plugin.register_transformer
+def _9(df: pd.DataFrame) -> ENAMetadataSamplesParquetFormat:
+    from ._parquet import write_table
+
+    ff = ENAMetadataSamplesParquetFormat()
+    write_table(df, str(ff))
+    return ff
+
+
+@plugin.register_transformer
+def _10(ff: ENAMetadataSamplesParquetFormat) -> qiime2.Metadata:
+    df = _samples_parquet_to_df(ff)
+    df = df.rename(columns={"alias": "id"}).set_index("id")
+    return qiime2.Metadata(df)
+
+
+@plugin.register_transformer
+def _11(md: qiime2.Metadata) -> ENAMetadataSamplesParquetFormat:
+    from ._parquet import write_table
+
+    df = md.to_dataframe()
+    df.index.name = "alias"
+    # QIIME 2 stores all numbers as floats - they are written the way QIIME 2
+    # writes them into a metadata TSV file, e.g. taxon IDs without decimals
+    for column in df.select_dtypes("number").columns:
+        df[column] = df[column].map("{:.15g}".format, na_action="ignore")
+    ff = ENAMetadataSamplesParquetFormat()
+    write_table(df.reset_index(), str(ff))
+    return ff
+
+
+@plugin.register_transformer
+def _12(ff: ENAMetadataSamplesFormat) -> ENAMetadataSamplesParquetFormat:
+    from ._parquet import write_table
+
+    result = ENAMetadataSamplesParquetFormat()
+    write_table(parse_tsv(str(ff)).table, str(result))
+    return result
+
+
+@plugin.register_transformer
+def _13(ff: ENAMetadataSamplesParquetFormat) -> ENAMetadataSamplesFormat:
+    return _samples_parquet_to_tsv(ff)
+
+
+@plugin.register_transformer
+def _14(ff: ENAMetadataSamplesFormat) -> ENAMetadataSamplesDirFmt:
+    result = ENAMetadataSamplesDirFmt()
+    result.tsv.write_data(ff, ENAMetadataSamplesFormat)
+    return result
+
+
+@plugin.register_transformer
+def _15(ff: ENAMetadataSamplesParquetFormat) -> ENAMetadataSamplesDirFmt:
+    result = ENAMetadataSamplesDirFmt()
+    result.parquet.write_data(ff, ENAMetadataSamplesParquetFormat)
+    return result
+
+
+@plugin.register_transformer
+def _16(dirfmt: ENAMetadataSamplesDirFmt) -> ENAMetadataSamplesFormat:
+    samples = dirfmt.samples()
+    if samples is None:
+        return _samples_shards_to_tsv(dirfmt.shard_paths())
+    if isinstance(samples, ENAMetadataSamplesParquetFormat):
+        return _samples_parquet_to_tsv(samples)
+    return samples
+
+
+@plugin.register_transformer
+def _17(dirfmt: ENAMetadataSamplesDirFmt) -> pd.DataFrame:
+    samples = dirfmt.samples()
+    if isinstance(samples, ENAMetadataSamplesParquetFormat):
+        return _samples_parquet_to_df(samples)
+    if samples is None:
+        samples = _samples_shards_to_tsv(dirfmt.shard_paths())
+    return parse_tsv(str(samples)).frame()
+
+
+@plugin.register_transformer
+def _18(dirfmt: ENAMetadataSamplesDirFmt) -> qiime2.Metadata:
+    samples = dirfmt.samples()
+    if isinstance(samples, ENAMetadataSamplesParquetFormat):
+        return _10(samples)
+    if samples is None:
+        samples = _samples_shards_to_tsv(dirfmt.shard_paths())
+    return _samples_fmt_to_metadata(samples)
@@ -5,9 +5,12 @@
 #
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
-import csv
+import json
+import os
+import re
+import shutil
 import xml.etree.ElementTree as ET
-from xml.etree import ElementTree
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
 
 import pandas as pd
 import q2_ena_uploader
@@ -15,13 +18,48 @@ import qiime2
 from qiime2.plugin import SemanticType, model, ValidationError
 
 from q2_ena_uploader.metadata.experiment import ExperimentSet
+from q2_ena_uploader.metadata.render import render_batches, render_files, render_set
 from q2_ena_uploader.metadata.sample import SampleSet
 from q2_ena_uploader.metadata.study import Study
+from q2_ena_uploader.metadata.xml_backend import etree
+from q2_ena_uploader.types._parse_cache import ParsedTSV, parse_tsv
+from q2_ena_uploader.types._render_cache import cached_render
+from q2_ena_uploader.types._validation_cache import cached_validation, file_digest
 
 ENAMetadataSamples = SemanticType("ENAMetadataSamples")
 ENAMetadataStudy = SemanticType("ENAMetadataStudy")
 ENAMetadataExperiment = SemanticType("ENAMetadataExperiment")
 ENASubmissionReceipt = SemanticType("ENASubmissionReceipt")
+ENASubmissionBundle = SemanticType("ENASubmissionBundle")
+
+# Number of rows of the metadata files checked by the minimal validation
+MIN_VALIDATION_ROWS = 10
+
+# Minimum total size (in bytes) of the sample metadata shards for them to be
+# validated by parallel worker processes - smaller shards are validated faster
+# than the worker processes start
+PARALLEL_VALIDATION_MIN_BYTES = 16 * 2**20
+
+
+def _parse_tsv(path: str, level: str) -> ParsedTSV:
+    # the minimal validation only looks at the first rows of the file, which
+    # are not worth caching - the full validation parses (and caches) it all
+    try:
+        if level == "min":
+            return ParsedTSV(path, n_rows=MIN_VALIDATION_ROWS)
+        return parse_tsv(path)
+    except ValueError as e:
+        # e.g. rows with more values than the header
+        raise ValidationError(str(e))
+
+
+def _validate_cached(ff: model.TextFileFormat, level: str):
+    # the minimal validation only reads the first rows of the file, which is
+    # cheaper than computing the digest of the whole file
+    if level == "min":
+        ff._validate(level)
+    else:
+        cached_validation(str(ff), type(ff), level, lambda: ff._validate(level))
 
 
 class ENAMetadataSamplesFormat(model.TextFileFormat):
@@ -33,16 +71,19 @@ class ENAMetadataSamplesFormat(model.TextFileFormat):
 
     REQUIRED_ATTRIBUTES = ["alias", "taxon_id"]
 
-    def _validate(self):
-        df = pd.read_csv(str(self), sep="\t")
-        missing_cols = [x for x in self.REQUIRED_ATTRIBUTES if x not in df.columns]
+    def _validate_columns(self, columns: List[str]):
+        missing_cols = [x for x in self.REQUIRED_ATTRIBUTES if x not in columns]
         if missing_cols:
             raise ValidationError(
                 "Some required sample attributes are missing from the "
                 f"metadata upload file: {','.join(missing_cols)}."
             )
 
-        nans = (df.isnull() | (df == "")).sum(axis=0)[self.REQUIRED_ATTRIBUTES]
+    def _validate(self, level: str = "max"):
+        parsed = _parse_tsv(str(self), level)
+        self._validate_columns(parsed.table.columns)
+
+        nans = parsed.missing().sum(axis=0)[self.REQUIRED_ATTRIBUTES]
         missing_ids = nans.where(nans > 0).dropna().index.tolist()
         if missing_ids:
             raise ValidationError(
@@ -51,18 +92,276 @@ class ENAMetadataSamplesFormat(model.TextFileFormat):
             )
 
     def _validate_(self, level):
-        self._validate()
+        _validate_cached(self, level)
 
-    def to_xml(self) -> bytes:
-        with open(str(self), "r") as f:
-            dicts = [d for d in csv.DictReader(f, delimiter="\t")]
-            elementTree = SampleSet.from_list(dicts).to_xml_element()
-            return ElementTree.tostring(elementTree.getroot(), encoding="utf8")
+    def to_xml(self, processes: int = 1, file: BinaryIO = None) -> bytes:
+        def render(file):
+            dicts = parse_tsv(str(self)).records()
+            return render_set(SampleSet, dicts, processes, file)
 
+        return cached_render([str(self)], type(self), render, file)
 
-ENAMetadataSamplesDirFmt = model.SingleFileDirectoryFormat(
-    "ENAMetadataSamplesDirFmt", "ena_metadata_samples.tsv", ENAMetadataSamplesFormat
-)
+
+class ENAMetadataSamplesShardFormat(ENAMetadataSamplesFormat):
+    """
+    A shard of the ENA Samples submission metadata, i.e. a TSV file holding
+    some of the samples with the same header as the other shards.
+
+    Only the header of a shard is validated on its own - the samples are
+    validated by ENAMetadataSamplesDirFmt, for all the shards in parallel.
+    """
+
+    def _validate_(self, level):
+        self._validate_columns(_read_header(str(self)))
+
+
+def _read_header(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return f.readline().rstrip("\r\n").split("\t")
+
+
+def _validate_shard(path: str, level: str) -> Optional[str]:
+    # run by the worker processes - the error message is returned, as
+    # exceptions with a custom signature cannot always be sent back
+    try:
+        ENAMetadataSamplesFormat(path, mode="r")._validate_(level)
+    except ValidationError as e:
+        return str(e)
+    return None
+
+
+def _shard_records(path: str) -> List[dict]:
+    return parse_tsv(path).records()
+
+
+class ENAMetadataSamplesParquetFormat(model.BinaryFileFormat):
+    """
+    This format stores the same ENA Samples submission metadata as
+    ENAMetadataSamplesFormat in a Parquet file, for studies with very many
+    samples. Every column holds the verbatim values as strings, with missing
+    values stored as nulls (or empty strings).
+    """
+
+    REQUIRED_ATTRIBUTES = ENAMetadataSamplesFormat.REQUIRED_ATTRIBUTES
+
+    def _validate(self, level: str = "max"):
+        # pyarrow is only imported when a Parquet file is used
+        from q2_ena_uploader.types._parquet import (
+            columns_with_missing,
+            is_string_type,
+            read_schema,
+        )
+
+        # only the footer of the file (schema and statistics) is read, apart
+        # from row groups of required columns written without statistics
+        try:
+            schema = read_schema(str(self))
+        except (ValueError, OSError):
+            raise ValidationError("ENA samples metadata is not a valid Parquet file.")
+
+        missing_cols = [x for x in self.REQUIRED_ATTRIBUTES if x not in schema.names]
+        if missing_cols:
+            raise ValidationError(
+                "Some required sample attributes are missing from the "
+                f"metadata upload file: {','.join(missing_cols)}."
+            )
+        non_string = [f.name for f in schema if not is_string_type(f.type)]
+        if non_string:
+            raise ValidationError(
+                "All sample attributes need to be stored as strings, which is "
+                f"not the case for: {','.join(non_string)}."
+            )
+        if level == "min":
+            return
+
+        missing_ids = columns_with_missing(str(self), self.REQUIRED_ATTRIBUTES)
+        if missing_ids:
+            raise ValidationError(
+                "Some samples are missing values in the following fields: "
+                f'{",".join(missing_ids)}.'
+            )
+
+    def _validate_(self, level):
+        # reading the footer is cheaper than computing the digest of the
+        # file, so the validation results are not cached
+        self._validate(level)
+
+    def to_xml(self, processes: int = 1, file: BinaryIO = None) -> bytes:
+        def render(file):
+            from q2_ena_uploader.types._parquet import iter_records
+
+            # rows are read and rendered one batch at a time
+            return render_batches(SampleSet, iter_records(str(self)), processes, file)
+
+        return cached_render([str(self)], type(self), render, file)
+
+
+class ENAMetadataSamplesDirFmt(model.DirectoryFormat):
+    """
+    ENA Samples submission metadata stored either as a TSV file
+    (ENAMetadataSamplesFormat), as a Parquet file
+    (ENAMetadataSamplesParquetFormat) or as several TSV shards with the same
+    header (ENAMetadataSamplesShardFormat), which are validated and rendered
+    in parallel. New samples can be appended as new shards (see
+    `append_shard`) without rewriting the existing ones.
+    """
+
+    TSV_FILENAME = "ena_metadata_samples.tsv"
+    PARQUET_FILENAME = "ena_metadata_samples.parquet"
+    SHARD_FILENAME = "ena_metadata_samples_{}.tsv"
+    SHARD_PATTERN = r"ena_metadata_samples_(\d+)\.tsv"
+
+    tsv = model.File(TSV_FILENAME, format=ENAMetadataSamplesFormat, optional=True)
+    parquet = model.File(
+        PARQUET_FILENAME, format=ENAMetadataSamplesParquetFormat, optional=True
+    )
+    shards = model.FileCollection(
+        SHARD_PATTERN, format=ENAMetadataSamplesShardFormat, optional=True
+    )
+
+    @shards.set_path_maker
+    def shards_path_maker(self, index):
+        return self.SHARD_FILENAME.format(index)
+
+    def _validate_(self, level):
+        stored = [
+            name
+            for name in (self.TSV_FILENAME, self.PARQUET_FILENAME)
+            if os.path.exists(os.path.join(str(self), name))
+        ]
+        shards = self.shard_paths()
+        if len(stored) + bool(shards) != 1:
+            raise ValidationError(
+                f"The samples metadata directory needs to contain either "
+                f"{self.TSV_FILENAME}, {self.PARQUET_FILENAME} or shards named "
+                f"{self.SHARD_FILENAME.format('<n>')}."
+            )
+        if shards:
+            self._validate_shards(shards, level)
+
+    @staticmethod
+    def _validate_shards(paths: List[str], level: str):
+        header = _read_header(paths[0])
+        different = [
+            os.path.basename(path) for path in paths if _read_header(path) != header
+        ]
+        if different:
+            raise ValidationError(
+                "All the sample metadata shards need to have the same header as "
+                f"{os.path.basename(paths[0])}, which is not the case for: "
+                f"{','.join(different)}."
+            )
+
+        size = sum(os.path.getsize(path) for path in paths)
+        if level == "max" and len(paths) > 1 and size >= PARALLEL_VALIDATION_MIN_BYTES:
+            from concurrent.futures import ProcessPoolExecutor
+
+            processes = min(len(paths), os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                errors = list(
+                    executor.map(_validate_shard, paths, [level] * len(paths))
+                )
+        else:
+            errors = [_validate_shard(path, level) for path in paths]
+
+        for path, error in zip(paths, errors):
+            if error is not None:
+                raise ValidationError(f"{os.path.basename(path)}: {error}")
+
+    def _shards(self) -> List[tuple]:
+        # (index, path) of the shards, ordered by their index
+        shards = []
+        for name in os.listdir(str(self)):
+            match = re.fullmatch(self.SHARD_PATTERN, name)
+            if match:
+                shards.append((int(match.group(1)), os.path.join(str(self), name)))
+        return sorted(shards)
+
+    def shard_paths(self) -> List[str]:
+        """Paths to the shards of the samples metadata, in their order."""
+        return [path for _, path in self._shards()]
+
+    def append_shard(self, samples: ENAMetadataSamplesFormat) -> str:
+        """
+        Append samples to the metadata as a new shard.
+
+        A directory holding a single TSV file is converted into shards first,
+        by renaming the file into the first shard - no existing samples are
+        rewritten. This is only possible for a directory which can still be
+        modified, i.e. not for one of an existing artifact.
+
+        Parameters
+        ----------
+        samples : ENAMetadataSamplesFormat
+            The samples to append - their header needs to be the same as the
+            one of the existing samples.
+
+        Returns
+        -------
+        str
+            Path to the new shard.
+
+        Raises
+        ------
+        ValueError
+            If the samples are stored as a Parquet file or if the header of
+            the new samples differs from the one of the existing samples.
+        """
+        if os.path.exists(os.path.join(str(self), self.PARQUET_FILENAME)):
+            raise ValueError("Shards cannot be appended to Parquet sample metadata.")
+        tsv = os.path.join(str(self), self.TSV_FILENAME)
+        if os.path.exists(tsv):
+            os.rename(tsv, os.path.join(str(self), self.SHARD_FILENAME.format(1)))
+
+        shards = self._shards()
+        if shards and _read_header(str(samples)) != _read_header(shards[0][1]):
+            raise ValueError(
+                "The header of the appended samples differs from the one of "
+                "the existing samples."
+            )
+        last = shards[-1][0] if shards else 0
+        path = os.path.join(str(self), self.SHARD_FILENAME.format(last + 1))
+        shutil.copyfile(str(samples), path)
+        return path
+
+    def samples(
+        self,
+    ) -> Union[ENAMetadataSamplesFormat, ENAMetadataSamplesParquetFormat, None]:
+        """The file the samples metadata is stored in, None for shards."""
+        path = os.path.join(str(self), self.PARQUET_FILENAME)
+        if os.path.exists(path):
+            return ENAMetadataSamplesParquetFormat(path, mode="r")
+        path = os.path.join(str(self), self.TSV_FILENAME)
+        if os.path.exists(path):
+            return ENAMetadataSamplesFormat(path, mode="r")
+        return None
+
+    def records(self) -> Iterator[dict]:
+        """Rows of the samples metadata as dictionaries of verbatim values."""
+        shards = self.shard_paths()
+        if shards:
+            for path in shards:
+                yield from _shard_records(path)
+            return
+        samples = self.samples()
+        if isinstance(samples, ENAMetadataSamplesParquetFormat):
+            from q2_ena_uploader.types._parquet import iter_records
+
+            for batch in iter_records(str(samples)):
+                yield from batch
+        else:
+            yield from parse_tsv(str(samples)).records()
+
+    def to_xml(self, processes: int = 1, file: BinaryIO = None) -> bytes:
+        shards = self.shard_paths()
+        if shards:
+            # every shard is parsed and rendered by a worker process and
+            # streamed into a single SAMPLE_SET
+            def render(file):
+                return render_files(SampleSet, shards, _shard_records, processes, file)
+
+            return cached_render(shards, ENAMetadataSamplesShardFormat, render, file)
+        return self.samples().to_xml(processes, file)
 
 
 def is_valid_value(x: object) -> bool:
@@ -78,9 +377,9 @@ class ENAMetadataStudyFormat(model.TextFileFormat):
 
     REQUIRED_ATTRIBUTES = ["alias", "title"]
 
-    def _validate(self):
+    def _validate(self, level: str = "max"):
         df_dict = (
-            pd.read_csv(str(self), header=None, index_col=0, sep="\t")
+            pd.read_csv(str(self), header=None, index_col=0, sep="\t", dtype=str)
             .squeeze("columns")
             .to_dict()
         )
@@ -90,6 +389,8 @@ class ENAMetadataStudyFormat(model.TextFileFormat):
                 "Some required study attributes are missing from the "
                 f"metadata upload file: {','.join(missing_keys)}."
             )
+        if level == "min":
+            return
         missing_values = [
             y for y in self.REQUIRED_ATTRIBUTES if not is_valid_value(df_dict[y])
         ]
@@ -100,17 +401,25 @@ class ENAMetadataStudyFormat(model.TextFileFormat):
             )
 
     def to_xml(self) -> bytes:
-        df = pd.read_csv(str(self), header=None, index_col=0, sep="\t")
-        df.loc["project_attribute_uploader"] = {
-            1: f"q2-ena-uploader|{q2_ena_uploader.__version__}"
-        }
-        df.loc["project_attribute_qiime2"] = {1: f"qiime2|{qiime2.__version__}"}
-        df_dict = df.squeeze("columns").to_dict()
-        elementTree = Study.from_dict(df_dict).to_xml_element()
-        return ElementTree.tostring(elementTree.getroot(), encoding="utf8")
+        def render(file):
+            df = pd.read_csv(str(self), header=None, index_col=0, sep="\t", dtype=str)
+            df.loc["project_attribute_uploader"] = {
+                1: f"q2-ena-uploader|{q2_ena_uploader.__version__}"
+            }
+            df.loc["project_attribute_qiime2"] = {1: f"qiime2|{qiime2.__version__}"}
+            df_dict = df.squeeze("columns").to_dict()
+            elementTree = Study.from_dict(df_dict).to_xml_element()
+            if file is not None:
+                etree.write(elementTree.getroot(), file, encoding="utf8")
+                return None
+            return etree.tostring(
+                elementTree.getroot(), encoding="utf8", xml_declaration=True
+            )
+
+        return cached_render([str(self)], type(self), render)
 
     def _validate_(self, level):
-        self._validate()
+        self._validate(level)
 
 
 ENAMetadataStudyDirFmt = model.SingleFileDirectoryFormat(
@@ -132,14 +441,24 @@ class ENASubmissionReceiptFormat(model.BinaryFileFormat):
             contents = file.read()
             return ET.fromstring(contents)
 
-    def _validate(self):
+    @staticmethod
+    def read_root_attributes(filename: str) -> dict:
+        # only the start tag of the root element is parsed
+        with open(filename, "rb") as file:
+            for _, element in ET.iterparse(file, events=("start",)):
+                return dict(element.attrib)
+        raise ET.ParseError("no element found")
+
+    def _validate(self, level: str = "max"):
         try:
-            et = self.read_ET_from_file(str(self))
+            if level == "min":
+                attributes = self.read_root_attributes(str(self))
+            else:
+                attributes = self.read_ET_from_file(str(self)).attrib
         except ET.ParseError:
             raise ValidationError("ENA receipt is not a valid xml form.")
-        receipt_element = et
         required_att = ["receiptDate", "submissionFile", "success"]
-        missing_att = [x for x in required_att if x not in receipt_element.attrib]
+        missing_att = [x for x in required_att if x not in attributes]
         if missing_att:
             raise ValidationError(
                 "Xml response is missing values in the following fields: "
@@ -147,7 +466,7 @@ class ENASubmissionReceiptFormat(model.BinaryFileFormat):
             )
 
     def _validate_(self, level):
-        return self._validate()
+        return self._validate(level)
 
 
 ENASubmissionReceiptDirFmt = model.SingleFileDirectoryFormat(
@@ -176,16 +495,18 @@ class ENAMetadataExperimentFormat(model.TextFileFormat):
         "library_layout",
     ]
 
-    def _validate(self):
-        df = pd.read_csv(str(self), sep="\t")
-        missing_cols = [x for x in self.REQUIRED_ATTRIBUTES if x not in df.columns]
+    def _validate(self, level: str = "max"):
+        parsed = _parse_tsv(str(self), level)
+        missing_cols = [
+            x for x in self.REQUIRED_ATTRIBUTES if x not in parsed.table.columns
+        ]
         if missing_cols:
             raise ValidationError(
                 "Some required metadata attributes are missing from the "
                 f"metadata upload file: {','.join(missing_cols)}."
             )
 
-        nans = (df.isnull() | (df == "")).sum(axis=0)[self.REQUIRED_ATTRIBUTES]
+        nans = parsed.missing().sum(axis=0)[self.REQUIRED_ATTRIBUTES]
         missing_ids = nans.where(nans > 0).dropna().index.tolist()
         if missing_ids:
             raise ValidationError(
@@ -194,13 +515,17 @@ class ENAMetadataExperimentFormat(model.TextFileFormat):
             )
 
     def _validate_(self, level):
-        self._validate()
+        _validate_cached(self, level)
 
-    def to_xml(self) -> bytes:
-        with open(str(self), "r") as f:
-            dicts = [d for d in csv.DictReader(f, delimiter="\t")]
-            element = ExperimentSet.from_list(dicts).to_xml_element()
-            return ElementTree.tostring(element.getroot(), encoding="utf8")
+    def to_xml(self, processes: int = 1, file: BinaryIO = None) -> bytes:
+        def render(file):
+            return render_set(ExperimentSet, self.records(), processes, file)
+
+        return cached_render([str(self)], type(self), render, file)
+
+    def records(self) -> List[dict]:
+        """Rows of the experiment metadata as dictionaries of verbatim values."""
+        return parse_tsv(str(self)).records()
 
 
 ENAMetadataExperimentDirFmt = model.SingleFileDirectoryFormat(
@@ -208,3 +533,161 @@ ENAMetadataExperimentDirFmt = model.SingleFileDirectoryFormat(
     "ena_metadata_experiment.tsv",
     ENAMetadataExperimentFormat,
 )
+
+
+class ENASubmissionDocumentFormat(model.BinaryFileFormat):
+    """
+    A pre-rendered XML document (e.g. SAMPLE_SET or RUN_SET) of a submission
+    bundle, sent to ENA as it is.
+    """
+
+    def _validate(self, level: str = "max"):
+        try:
+            with open(str(self), "rb") as file:
+                if level == "min":
+                    # only the start tag of the root element is parsed
+                    next(ET.iterparse(file, events=("start",)))
+                else:
+                    ET.parse(file)
+        except (ET.ParseError, StopIteration):
+            raise ValidationError(
+                f"{os.path.basename(str(self))} is not a valid xml document."
+            )
+
+    def _validate_(self, level):
+        self._validate(level)
+
+
+class ENASubmissionBundleManifestFormat(model.TextFileFormat):
+    """
+    JSON manifest of a submission bundle. It lists the submissions to be sent
+    to ENA in the order they need to be sent in (samples before reads), with
+    the pre-rendered XML documents of every submission and their SHA-256
+    checksums, and the plan of the read files referenced by the runs together
+    with their MD5 checksums.
+    """
+
+    STAGES = ("samples", "reads")
+    REQUIRED_KEYS = ["action", "submission_hold_date", "submissions", "files"]
+    DOCUMENT_KEYS = ["path", "filename", "sha256"]
+
+    def read(self) -> dict:
+        with open(str(self)) as fh:
+            return json.load(fh)
+
+    def _validate(self, level: str = "max"):
+        try:
+            manifest = self.read()
+        except ValueError:
+            raise ValidationError("The bundle manifest is not a valid json file.")
+        if not isinstance(manifest, dict):
+            raise ValidationError("The bundle manifest needs to be a json object.")
+
+        missing = [x for x in self.REQUIRED_KEYS if x not in manifest]
+        if missing:
+            raise ValidationError(
+                "The bundle manifest is missing the following fields: "
+                f'{",".join(missing)}.'
+            )
+        if not manifest["submissions"]:
+            raise ValidationError("The bundle does not contain any submissions.")
+        for i, submission in enumerate(manifest["submissions"], start=1):
+            if submission.get("stage") not in self.STAGES:
+                raise ValidationError(
+                    f"Submission {i} of the bundle has an unknown stage "
+                    f'{submission.get("stage")!r}.'
+                )
+            documents = submission.get("documents") or {}
+            if "SUBMISSION" not in documents:
+                raise ValidationError(
+                    f"Submission {i} of the bundle is missing its submission "
+                    "document."
+                )
+            for part, document in documents.items():
+                missing = [x for x in self.DOCUMENT_KEYS if x not in document]
+                if missing:
+                    raise ValidationError(
+                        f"The {part} document of submission {i} is missing the "
+                        f'following fields: {",".join(missing)}.'
+                    )
+
+    def _validate_(self, level):
+        self._validate(level)
+
+
+class ENASubmissionBundleDirFmt(model.DirectoryFormat):
+    """
+    A submission prepared offline by `prepare_submission`: the XML documents
+    of every submission, rendered and validated against the ENA schemas,
+    together with a manifest (ENASubmissionBundleManifestFormat) of their
+    checksums and of the planned read files. Sending the bundle to ENA only
+    streams the documents, without any further processing.
+    """
+
+    MANIFEST_FILENAME = "ena_submission_bundle.json"
+    DOCUMENT_FILENAME = "{}_{}_{}.xml"
+    DOCUMENT_PATTERN = r"(samples|reads)_\d+_[a-z]+\.xml"
+
+    manifest = model.File(MANIFEST_FILENAME, format=ENASubmissionBundleManifestFormat)
+    documents = model.FileCollection(
+        DOCUMENT_PATTERN, format=ENASubmissionDocumentFormat
+    )
+
+    @documents.set_path_maker
+    def documents_path_maker(self, stage, index, part):
+        return self.DOCUMENT_FILENAME.format(stage, index, part.lower())
+
+    def _validate_(self, level):
+        manifest = self.read_manifest()
+        for i, submission in enumerate(manifest["submissions"], start=1):
+            for part, document in submission["documents"].items():
+                path = os.path.join(str(self), document["path"])
+                if not os.path.exists(path):
+                    raise ValidationError(
+                        f"The {part} document of submission {i} "
+                        f'({document["path"]}) is missing from the bundle.'
+                    )
+                # the checksums are only verified by the full validation, as
+                # they require reading all of the documents
+                if level == "max" and file_digest(path) != document["sha256"]:
+                    raise ValidationError(
+                        f'The checksum of {document["path"]} does not match the '
+                        "one recorded in the bundle manifest."
+                    )
+
+    def document_path(self, stage: str, index: int, part: str) -> str:
+        """Path to the document of a part (e.g. SAMPLE) of a submission."""
+        return os.path.join(str(self), self.documents_path_maker(stage, index, part))
+
+    def read_manifest(self) -> dict:
+        return ENASubmissionBundleManifestFormat(
+            os.path.join(str(self), self.MANIFEST_FILENAME), mode="r"
+        ).read()
+
+    def write_manifest(self, manifest: dict):
+        with open(os.path.join(str(self), self.MANIFEST_FILENAME), "w") as fh:
+            json.dump(manifest, fh, indent=2)
+
+    def submissions(self) -> List[Tuple[str, Dict[str, Tuple[str, str]]]]:
+        """
+        The submissions of the bundle, in the order they need to be sent in.
+
+        Returns
+        -------
+        list of tuples
+            The stage of every submission ("samples" or "reads") and its
+            documents, as (filename, path) pairs keyed by their part.
+        """
+        return [
+            (
+                submission["stage"],
+                {
+                    part: (
+                        document["filename"],
+                        os.path.join(str(self), document["path"]),
+                    )
+                    for part, document in submission["documents"].items()
+                },
+            )
+            for submission in self.read_manifest()["submissions"]
+        ]
@@ -0,0 +1,135 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import json
+import os
+from typing import Callable, Optional
+
+import qiime2
+
+import q2_ena_uploader
+from q2_ena_uploader.types._disk_cache import _DiskCache, default_cache_dir, file_digest
+
+# Environment variable with the directory the validation results are stored
+# in - by default a directory in the user's cache directory
+CACHE_DIR_ENV = "ENA_VALIDATION_CACHE_DIR"
+
+# Environment variable disabling the cache when set to "false"
+CACHE_ENABLED_ENV = "ENA_VALIDATION_CACHE"
+
+# Maximum size (in bytes) of the stored validation results - the least
+# recently used results are evicted first
+MAX_VALIDATION_CACHE_BYTES = 4 * 2**20
+
+
+class _ValidationCache(_DiskCache):
+    SUFFIX = ".json"
+
+    def __init__(self, path: str, max_bytes: int = MAX_VALIDATION_CACHE_BYTES):
+        super().__init__(path, max_bytes)
+
+    def get(self, digest: str, key: str) -> Optional[dict]:
+        path = self.lookup(digest, key)
+        if path is None:
+            return None
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, digest: str, key: str, entry: dict):
+        fd, tmp = self.reserve()
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        self.commit(tmp, digest, key)
+
+
+def _get_cache() -> Optional[_ValidationCache]:
+    # the environment is read on every use, so that it can be changed at
+    # runtime (e.g. by the tests)
+    if os.environ.get(CACHE_ENABLED_ENV, "true").lower() == "false":
+        return None
+    return _ValidationCache(
+        os.environ.get(CACHE_DIR_ENV) or default_cache_dir("validation")
+    )
+
+
+def cached_validation(path: str, format_cls: type, level: str, validate: Callable):
+    """
+    Validate a file, unless the result of its validation is already stored.
+
+    Results are stored on disk, under the digest of the file's content, the
+    format class, the validation level and the versions of the plugin and of
+    QIIME 2, so that a file whose content did not change is only validated
+    once - even when it is extracted anew from an artifact. Only successful
+    validations are stored, an invalid file is validated again every time.
+
+    Parameters
+    ----------
+    path : str
+        Path to the validated file.
+    format_cls : type
+        The format the file is validated as.
+    level : str
+        The validation level ("min" or "max").
+    validate : callable
+        Function validating the file, raising a ValidationError if it is
+        not valid.
+
+    Raises
+    ------
+    ValidationError
+        If the file is not valid.
+    """
+    cache = _get_cache()
+    if cache is None:
+        validate()
+        return
+
+    try:
+        digest = file_digest(path)
+    except OSError:
+        validate()
+        return
+    key = (
+        f"{format_cls.__module__}.{format_cls.__qualname__}|"
+        f"{q2_ena_uploader.__version__}|{qiime2.__version__}|{level}"
+    )
+
+    entry = cache.get(digest, key)
+    if entry is not None and entry.get("valid"):
+        return
+
+    # raises if the file is not valid, in which case nothing is stored
+    validate()
+    try:
+        cache.put(digest, key, {"valid": True})
+    except OSError:
+        # e.g. a read-only cache directory - the result is not stored
+        pass
+
+
+def invalidate_validation(path: str):
+    """
+    Remove the stored validation results of a file, for all formats.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file - its results are found by its current content.
+    """
+    cache = _get_cache()
+    if cache is not None:
+        cache.invalidate(file_digest(path))
+
+
+def clear_validation_cache():
+    """Remove all the stored validation results."""
+    cache = _get_cache()
+    if cache is not None:
+        cache.clear()
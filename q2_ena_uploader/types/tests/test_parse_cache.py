@@ -0,0 +1,191 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import csv
+import os
+import shutil
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_ena_uploader.types import ENAMetadataSamplesFormat
+from q2_ena_uploader.types._parse_cache import (
+    ParsedTSV,
+    _ParseCache,
+    available_engines,
+    clear_parse_cache,
+    parse_tsv,
+)
+from q2_ena_uploader.types._render_cache import RENDER_CACHE_ENABLED_ENV
+from q2_ena_uploader.types._validation_cache import CACHE_ENABLED_ENV
+
+
+class TestParsedTSV(TestPluginBase):
+    package = "q2_ena_uploader.types.tests"
+
+    def test_frame_matches_read_csv(self):
+        for filename in [
+            "ena_metadata_samples.tsv",
+            "ena_metadata_experiment.tsv",
+            "ena_missing_values_samples.tsv",
+        ]:
+            with self.subTest(filename=filename):
+                path = self.get_data_path(filename)
+                pd.testing.assert_frame_equal(
+                    ParsedTSV(path).frame(),
+                    pd.read_csv(path, sep="\t", dtype=object),
+                )
+
+    def test_records_match_dict_reader(self):
+        # rows of this file are missing their trailing (empty) values
+        path = self.get_data_path("ena_metadata_experiment.tsv")
+        with open(path, "r") as f:
+            expected = list(csv.DictReader(f, delimiter="\t"))
+
+        records = ParsedTSV(path).records()
+
+        self.assertEqual(records, expected)
+        self.assertIsNone(records[0]["library_construction_protocol"])
+
+    def test_missing(self):
+        path = self.get_data_path("ena_missing_values_samples.tsv")
+        pd.testing.assert_frame_equal(
+            ParsedTSV(path).missing(), pd.read_csv(path, sep="\t").isnull()
+        )
+
+    def _write(self, content: str) -> str:
+        path = os.path.join(self.temp_dir.name, "metadata.tsv")
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def test_engines_agree(self):
+        contents = [
+            "alias\ttaxon_id\tdepth\nsample1\t9606\t1.50\n\nsample2\tNA\t\n",
+            # short rows and quoted values are parsed by the csv module
+            "alias\ttaxon_id\tdepth\nsample1\t9606\nsample2\n",
+            'alias\tdescription\nsample1\t"tab\tand\nline break"\n',
+            "alias\ttaxon_id\n",
+        ]
+        for content in contents:
+            path = self._write(content)
+            expected = ParsedTSV(path, engine="csv")
+            for engine in available_engines():
+                with self.subTest(content=content, engine=engine):
+                    parsed = ParsedTSV(path, engine=engine)
+                    self.assertEqual(parsed.records(), expected.records())
+                    pd.testing.assert_frame_equal(parsed.frame(), expected.frame())
+
+    def test_values_are_strings(self):
+        path = self._write("alias\ttaxon_id\tdepth\nsample1\t09606\t1.50\n")
+        self.assertEqual(
+            ParsedTSV(path).records(),
+            [{"alias": "sample1", "taxon_id": "09606", "depth": "1.50"}],
+        )
+
+    def test_frame_values_are_strings(self):
+        path = self._write("alias\ttaxon_id\tdepth\nsample1\t09606\t1.50\n")
+        frame = ParsedTSV(path).frame()
+
+        self.assertEqual(frame.loc[0, "taxon_id"], "09606")
+        self.assertEqual(frame.loc[0, "depth"], "1.50")
+
+    def test_categorical_columns(self):
+        rows = "".join(f"sample{i}\t9606\n" for i in range(10))
+        parsed = ParsedTSV(self._write(f"alias\ttaxon_id\n{rows}"))
+
+        self.assertEqual(parsed.table["alias"].dtype, object)
+        self.assertEqual(parsed.table["taxon_id"].dtype, "category")
+        self.assertEqual(parsed.records()[9], {"alias": "sample9", "taxon_id": "9606"})
+
+    def test_long_rows(self):
+        path = self._write("alias\ttaxon_id\nsample1\t9606\nsample2\t9606\tx\n")
+        for engine in available_engines():
+            with self.subTest(engine=engine):
+                with self.assertRaisesRegex(
+                    ValueError, "Line 3 of metadata.tsv has 3 values.* 2 columns"
+                ):
+                    ParsedTSV(path, engine=engine)
+
+    def test_trailing_empty_values(self):
+        path = self._write("alias\ttaxon_id\nsample1\t9606\t\t\n")
+        for engine in available_engines():
+            with self.subTest(engine=engine):
+                self.assertEqual(
+                    ParsedTSV(path, engine=engine).records(),
+                    [{"alias": "sample1", "taxon_id": "9606"}],
+                )
+
+    def test_unknown_engine(self):
+        path = self.get_data_path("ena_metadata_samples.tsv")
+        with self.assertRaisesRegex(ValueError, "Unknown TSV parsing engine: spark"):
+            ParsedTSV(path, engine="spark")
+
+
+class TestParseCache(TestPluginBase):
+    package = "q2_ena_uploader.types.tests"
+
+    def setUp(self):
+        super().setUp()
+        clear_parse_cache()
+        self.addCleanup(clear_parse_cache)
+        env = patch.dict(
+            os.environ, {CACHE_ENABLED_ENV: "false", RENDER_CACHE_ENABLED_ENV: "false"}
+        )
+        env.start()
+        self.addCleanup(env.stop)
+        self.path = os.path.join(self.temp_dir.name, "samples.tsv")
+        shutil.copy(self.get_data_path("ena_metadata_samples.tsv"), self.path)
+
+    def test_parsed_once(self):
+        self.assertIs(parse_tsv(self.path), parse_tsv(self.path))
+
+    def test_modified_file_parsed_again(self):
+        parsed = parse_tsv(self.path)
+        with open(self.path, "a") as f:
+            f.write("\n12\talias3\tBrazil\t2022-02-02\n")
+
+        reparsed = parse_tsv(self.path)
+
+        self.assertIsNot(parsed, reparsed)
+        self.assertEqual(len(reparsed.table), len(parsed.table) + 1)
+
+    def test_eviction(self):
+        other = os.path.join(self.temp_dir.name, "other.tsv")
+        shutil.copy(self.path, other)
+        size = ParsedTSV(self.path).nbytes
+        cache = _ParseCache(max_bytes=int(size * 1.5))
+
+        first = cache.get(self.path)
+        cache.get(other)
+
+        # the least recently used table made room for the new one
+        self.assertEqual(cache.nbytes, size)
+        self.assertIsNot(cache.get(self.path), first)
+
+    def test_too_large_not_cached(self):
+        cache = _ParseCache(max_bytes=1)
+
+        self.assertIsNot(cache.get(self.path), cache.get(self.path))
+        self.assertEqual(cache.nbytes, 0)
+
+    def test_format_parsed_once(self):
+        ff = ENAMetadataSamplesFormat(self.path, mode="r")
+
+        with patch(
+            "q2_ena_uploader.types._parse_cache.ParsedTSV", wraps=ParsedTSV
+        ) as mock_parsed:
+            ff.validate()
+            ff.to_xml()
+
+        mock_parsed.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,261 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import os
+import shutil
+import time
+import unittest
+from tempfile import TemporaryFile
+from unittest.mock import patch
+
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_ena_uploader.types import (
+    ENAMetadataExperimentFormat,
+    ENAMetadataSamplesDirFmt,
+    ENAMetadataSamplesFormat,
+    ENAMetadataStudyFormat,
+)
+from q2_ena_uploader.types._render_cache import (
+    RENDER_CACHE_DIR_ENV,
+    RENDER_CACHE_ENABLED_ENV,
+    _RenderCache,
+    cached_render,
+    clear_render_cache,
+)
+from q2_ena_uploader.types._types_and_formats import render_set
+from q2_ena_uploader.types._validation_cache import CACHE_ENABLED_ENV
+
+
+class TestRenderCache(TestPluginBase):
+    package = "q2_ena_uploader.types.tests"
+
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = os.path.join(self.temp_dir.name, "cache")
+        env = patch.dict(
+            os.environ,
+            {
+                RENDER_CACHE_DIR_ENV: self.cache_dir,
+                RENDER_CACHE_ENABLED_ENV: "true",
+                CACHE_ENABLED_ENV: "false",
+            },
+        )
+        env.start()
+        self.addCleanup(env.stop)
+
+    def _copy(self, filename: str, name: str = None) -> str:
+        path = os.path.join(self.temp_dir.name, name or filename)
+        shutil.copy(self.get_data_path(filename), path)
+        return path
+
+    def _write_experiment(self) -> str:
+        # a library with a nominal sdev but without a nominal length
+        header = (
+            "title\tstudy_ref\tsample_description\tplatform\tinstrument_model\t"
+            "library_strategy\tlibrary_source\tlibrary_selection\t"
+            "library_layout\tlibrary_nominal_sdev\n"
+        )
+        row = (
+            "title1\tstudy_ref1\tsample_description1\tILLUMINA\tIllumina MiSeq\t"
+            "WGS\tGENOMIC\tRANDOM\tSINGLE\t10\n"
+        )
+        path = os.path.join(self.temp_dir.name, "experiment.tsv")
+        with open(path, "w") as f:
+            f.write(header + row)
+        return path
+
+    def _render(self, ff, *args, **kwargs) -> tuple:
+        # the document and the number of times it was actually rendered
+        with patch(
+            "q2_ena_uploader.types._types_and_formats.render_set", wraps=render_set
+        ) as mock_render:
+            xml = ff.to_xml(*args, **kwargs)
+        return xml, mock_render.call_count
+
+    def test_document_stored(self):
+        ff = ENAMetadataSamplesFormat(self._copy("ena_metadata_samples.tsv"), "r")
+
+        xml, calls = self._render(ff)
+        self.assertEqual(calls, 1)
+        self.assertEqual(self._render(ff), (xml, 0))
+
+    def test_document_stored_for_copy(self):
+        # artifacts are extracted into a new directory whenever they are loaded
+        path = self._copy("ena_metadata_experiment.tsv")
+        xml, _ = self._render(ENAMetadataExperimentFormat(path, "r"))
+        copy = self._copy("ena_metadata_experiment.tsv", "copy.tsv")
+
+        self.assertEqual(self._render(ENAMetadataExperimentFormat(copy, "r")), (xml, 0))
+
+    def test_document_streamed_to_file(self):
+        ff = ENAMetadataSamplesFormat(self._copy("ena_metadata_samples.tsv"), "r")
+        with patch.dict(os.environ, {RENDER_CACHE_ENABLED_ENV: "false"}):
+            expected = ff.to_xml()
+
+        for calls in (1, 0):
+            with self.subTest(calls=calls), TemporaryFile() as fh:
+                self.assertEqual(self._render(ff, file=fh), (None, calls))
+                fh.seek(0)
+                self.assertEqual(fh.read(), expected)
+        self.assertEqual(self._render(ff), (expected, 0))
+
+    def test_warnings_issued_again(self):
+        path = self._write_experiment()
+        ff = ENAMetadataExperimentFormat(path, "r")
+
+        for calls in (1, 0):
+            with self.subTest(calls=calls):
+                with self.assertWarnsRegex(UserWarning, "Nominal_sdev"):
+                    xml, rendered = self._render(ff)
+                self.assertEqual(rendered, calls)
+
+    def test_warnings_issued_again_to_file(self):
+        path = self._write_experiment()
+        ff = ENAMetadataExperimentFormat(path, "r")
+        with patch.dict(os.environ, {RENDER_CACHE_ENABLED_ENV: "false"}):
+            expected = ff.to_xml()
+
+        for calls in (1, 0):
+            with self.subTest(calls=calls), TemporaryFile() as fh:
+                with self.assertWarnsRegex(UserWarning, "Nominal_sdev"):
+                    self.assertEqual(self._render(ff, file=fh), (None, calls))
+                fh.seek(0)
+                self.assertEqual(fh.read(), expected)
+
+    def test_entry_without_warnings_rendered(self):
+        # entries stored without their warnings are rendered again
+        path = self._copy("ena_metadata_samples.tsv")
+        ff = ENAMetadataSamplesFormat(path, "r")
+        xml, _ = self._render(ff)
+        (entry,) = os.listdir(self.cache_dir)
+        with open(os.path.join(self.cache_dir, entry), "wb") as fh:
+            fh.write(xml)
+
+        self.assertEqual(self._render(ff), (xml, 1))
+        self.assertEqual(self._render(ff), (xml, 0))
+
+    def test_modified_file_rendered(self):
+        path = self._copy("ena_metadata_samples.tsv")
+        ff = ENAMetadataSamplesFormat(path, "r")
+        self._render(ff)
+        with open(path, "a") as f:
+            f.write("\n12\talias3\tBrazil\t2022-02-02\n")
+
+        xml, calls = self._render(ff)
+        self.assertEqual(calls, 1)
+        self.assertIn(b'alias="alias3"', xml)
+
+    def test_keyed_by_version(self):
+        ff = ENAMetadataSamplesFormat(self._copy("ena_metadata_samples.tsv"), "r")
+        self._render(ff)
+
+        with patch("q2_ena_uploader.__version__", "999.0.0"):
+            self.assertEqual(self._render(ff)[1], 1)
+        self.assertEqual(self._render(ff)[1], 0)
+
+    def test_study_stored(self):
+        ff = ENAMetadataStudyFormat(self._copy("ena_metadata_study.tsv"), "r")
+        xml = ff.to_xml()
+
+        with patch(
+            "q2_ena_uploader.types._types_and_formats.Study.from_dict"
+        ) as mock_from_dict:
+            self.assertEqual(ff.to_xml(), xml)
+        mock_from_dict.assert_not_called()
+
+    def test_shards_stored(self):
+        header = "alias\ttaxon_id\n"
+        dirfmt = ENAMetadataSamplesDirFmt()
+        for i in range(2):
+            ff = ENAMetadataSamplesFormat()
+            with open(str(ff), "w") as f:
+                f.write(header + f"sample{i}\t9606\n")
+            dirfmt.append_shard(ff)
+        xml = dirfmt.to_xml()
+
+        with patch(
+            "q2_ena_uploader.types._types_and_formats.render_files"
+        ) as mock_render:
+            self.assertEqual(dirfmt.to_xml(), xml)
+            mock_render.assert_not_called()
+
+            # appending a shard changes the rendered document
+            ff = ENAMetadataSamplesFormat()
+            with open(str(ff), "w") as f:
+                f.write(header + "sample2\t9606\n")
+            dirfmt.append_shard(ff)
+            dirfmt.to_xml()
+            mock_render.assert_called_once()
+
+    def test_failed_render_not_stored(self):
+        path = self._copy("ena_metadata_samples.tsv")
+
+        def render(file):
+            file.write(b"<SAMPLE_SET>")
+            raise ValueError("failed")
+
+        with self.assertRaisesRegex(ValueError, "failed"):
+            cached_render([path], ENAMetadataSamplesFormat, render)
+
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_clear(self):
+        ff = ENAMetadataSamplesFormat(self._copy("ena_metadata_samples.tsv"), "r")
+        self._render(ff)
+
+        clear_render_cache()
+
+        self.assertEqual(os.listdir(self.cache_dir), [])
+        self.assertEqual(self._render(ff)[1], 1)
+
+    def test_disabled(self):
+        ff = ENAMetadataSamplesFormat(self._copy("ena_metadata_samples.tsv"), "r")
+        with patch.dict(os.environ, {RENDER_CACHE_ENABLED_ENV: "false"}):
+            self.assertEqual(self._render(ff)[1], 1)
+            self.assertEqual(self._render(ff)[1], 1)
+
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def test_disabled_by_default(self):
+        ff = ENAMetadataSamplesFormat(self._copy("ena_metadata_samples.tsv"), "r")
+        with patch.dict(os.environ):
+            del os.environ[RENDER_CACHE_ENABLED_ENV]
+            self.assertEqual(self._render(ff)[1], 1)
+            self.assertEqual(self._render(ff)[1], 1)
+
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def test_unusable_cache_dir(self):
+        ff = ENAMetadataSamplesFormat(self._copy("ena_metadata_samples.tsv"), "r")
+        with open(self.cache_dir, "w") as f:
+            f.write("not a directory")
+
+        xml, calls = self._render(ff)
+        self.assertEqual(calls, 1)
+        self.assertEqual(self._render(ff), (xml, 1))
+
+    def test_eviction(self):
+        cache = _RenderCache(self.cache_dir, max_bytes=3)
+        for digest in ("a", "b", "c", "d"):
+            fd, tmp = cache.reserve()
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(b"x")
+            cache.commit(tmp, digest, "key")
+            # make sure the entries differ in their time of last use
+            time.sleep(0.01)
+            if digest == "c":
+                cache.lookup("a", "key")
+
+        self.assertIsNotNone(cache.lookup("a", "key"))
+        self.assertIsNone(cache.lookup("b", "key"))
+        self.assertIsNotNone(cache.lookup("c", "key"))
+        self.assertIsNotNone(cache.lookup("d", "key"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,11 @@
+import os
 import unittest
 import xml.etree.ElementTree as ET
+from unittest.mock import patch
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import qiime2
 from qiime2.plugin import ValidationError
 from qiime2.plugin.testing import TestPluginBase
@@ -12,6 +16,8 @@ from q2_ena_uploader.types import (
     ENAMetadataStudy,
     ENAMetadataStudyFormat,
     ENAMetadataSamplesDirFmt,
+    ENAMetadataSamplesParquetFormat,
+    ENAMetadataSamplesShardFormat,
     ENAMetadataStudyDirFmt,
     ENASubmissionReceipt,
     ENASubmissionReceiptDirFmt,
@@ -20,6 +26,12 @@ from q2_ena_uploader.types import (
     ENAMetadataExperimentFormat,
     ENAMetadataExperimentDirFmt,
 )
+from q2_ena_uploader.types._parquet import iter_records, write_table
+from q2_ena_uploader.types._parse_cache import ParsedTSV
+from q2_ena_uploader.types._render_cache import RENDER_CACHE_ENABLED_ENV
+from q2_ena_uploader.types._transformer import _samples_parquet_to_tsv
+from q2_ena_uploader.types._types_and_formats import MIN_VALIDATION_ROWS
+from q2_ena_uploader.types._validation_cache import CACHE_ENABLED_ENV
 
 
 class TestTypes(TestPluginBase):
@@ -61,6 +73,15 @@ class TestTypes(TestPluginBase):
 class TestFormats(TestPluginBase):
     package = "q2_ena_uploader.types.tests"
 
+    def setUp(self):
+        super().setUp()
+        # the formats are validated and rendered anew by every test
+        env = patch.dict(
+            os.environ, {CACHE_ENABLED_ENV: "false", RENDER_CACHE_ENABLED_ENV: "false"}
+        )
+        env.start()
+        self.addCleanup(env.stop)
+
     def test_ena_metadata_samples_fmt(self):
         meta_path = self.get_data_path("ena_metadata_samples.tsv")
         format = ENAMetadataSamplesFormat(meta_path, mode="r")
@@ -86,6 +107,16 @@ class TestFormats(TestPluginBase):
         ):
             format.validate()
 
+    def test_ena_samples_long_rows(self):
+        path = os.path.join(self.temp_dir.name, "samples.tsv")
+        with open(path, "w") as f:
+            f.write("alias\ttaxon_id\nsample1\t9606\tHomo sapiens\n")
+        format = ENAMetadataSamplesFormat(path, mode="r")
+        for level in ("min", "max"):
+            with self.subTest(level=level):
+                with self.assertRaisesRegex(ValidationError, "Line 2 of samples.tsv"):
+                    format.validate(level=level)
+
     def test_ena_metadata_study_fmt(self):
         meta_path = self.get_data_path("ena_metadata_study.tsv")
         format = ENAMetadataStudyFormat(meta_path, mode="r")
@@ -164,6 +195,314 @@ class TestFormats(TestPluginBase):
         ):
             format.validate()
 
+    def _samples_with_missing_value(self, row: int) -> str:
+        path = os.path.join(self.temp_dir.name, "samples.tsv")
+        with open(path, "w") as f:
+            f.write("alias\ttaxon_id\n")
+            for i in range(MIN_VALIDATION_ROWS + 5):
+                f.write(f"sample{i}\t{'' if i == row else 9606}\n")
+        return path
+
+    def test_ena_samples_min_validation_checks_first_rows(self):
+        format = ENAMetadataSamplesFormat(
+            self._samples_with_missing_value(MIN_VALIDATION_ROWS - 1), mode="r"
+        )
+        with self.assertRaisesRegex(ValidationError, "missing values.*taxon_id"):
+            format.validate(level="min")
+
+    def test_ena_samples_min_validation_skips_other_rows(self):
+        format = ENAMetadataSamplesFormat(
+            self._samples_with_missing_value(MIN_VALIDATION_ROWS), mode="r"
+        )
+        format.validate(level="min")
+        with self.assertRaisesRegex(ValidationError, "missing values.*taxon_id"):
+            format.validate(level="max")
+
+    def test_ena_experiment_min_validation_missing_attributes(self):
+        meta_path = self.get_data_path("ena_missing_att_experiment.tsv")
+        format = ENAMetadataExperimentFormat(meta_path, mode="r")
+        with self.assertRaisesRegex(
+            ValidationError, "attributes are missing.*study_ref,sample_description"
+        ):
+            format.validate(level="min")
+
+    def test_ena_study_min_validation(self):
+        meta_path = self.get_data_path("ena_study_missing_values.tsv")
+        format = ENAMetadataStudyFormat(meta_path, mode="r")
+        format.validate(level="min")
+
+        meta_path = self.get_data_path("ena_study_missing_att.tsv")
+        format = ENAMetadataStudyFormat(meta_path, mode="r")
+        with self.assertRaisesRegex(ValidationError, "attributes are missing"):
+            format.validate(level="min")
+
+    def test_xml_receipt_min_validation(self):
+        # only the root element of the receipt is parsed
+        with open(self.get_data_path("ena_submission_receipt.xml")) as f:
+            truncated = f.read()[:400]
+        path = os.path.join(self.temp_dir.name, "receipt.xml")
+        with open(path, "w") as f:
+            f.write(truncated)
+        format = ENASubmissionReceiptFormat(path, mode="r")
+
+        format.validate(level="min")
+        with self.assertRaisesRegex(ValidationError, "not a valid xml"):
+            format.validate(level="max")
+
+    def test_xml_receipt_min_validation_missing_values(self):
+        meta_path = self.get_data_path("ena_submission_missing_values.xml")
+        format = ENASubmissionReceiptFormat(meta_path, mode="r")
+        with self.assertRaisesRegex(
+            ValidationError, "missing values.*receiptDate,submissionFile"
+        ):
+            format.validate(level="min")
+
+    def test_xml_receipt_min_validation_not_xml(self):
+        path = os.path.join(self.temp_dir.name, "receipt.xml")
+        with open(path, "w") as f:
+            f.write("not xml")
+        format = ENASubmissionReceiptFormat(path, mode="r")
+        with self.assertRaisesRegex(ValidationError, "not a valid xml"):
+            format.validate(level="min")
+
+
+class TestParquetFormats(TestPluginBase):
+    package = "q2_ena_uploader.types.tests"
+
+    def setUp(self):
+        super().setUp()
+        # the formats are rendered anew by every test
+        env = patch.dict(os.environ, {RENDER_CACHE_ENABLED_ENV: "false"})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def _parquet(self, table=None, **kwargs) -> str:
+        if table is None:
+            tsv = self.get_data_path("ena_metadata_samples.tsv")
+            table = ParsedTSV(tsv).table
+        path = os.path.join(self.temp_dir.name, "samples.parquet")
+        if isinstance(table, pa.Table):
+            pq.write_table(table, path, **kwargs)
+        else:
+            write_table(table, path)
+        return path
+
+    def test_ena_metadata_samples_parquet_fmt(self):
+        format = ENAMetadataSamplesParquetFormat(self._parquet(), mode="r")
+        format.validate()
+
+    def test_ena_samples_parquet_not_parquet(self):
+        meta_path = self.get_data_path("ena_metadata_samples.tsv")
+        format = ENAMetadataSamplesParquetFormat(meta_path, mode="r")
+        with self.assertRaisesRegex(ValidationError, "not a valid Parquet file"):
+            format.validate()
+
+    def test_ena_samples_parquet_missing_attributes(self):
+        table = pd.DataFrame({"description": ["sample 1"]})
+        format = ENAMetadataSamplesParquetFormat(self._parquet(table), mode="r")
+        with self.assertRaisesRegex(
+            ValidationError,
+            "Some required sample attributes are missing from "
+            "the metadata upload file: alias,taxon_id.",
+        ):
+            format.validate(level="min")
+
+    def test_ena_samples_parquet_not_strings(self):
+        table = pa.table({"alias": ["sample1"], "taxon_id": [9606]})
+        format = ENAMetadataSamplesParquetFormat(self._parquet(table), mode="r")
+        with self.assertRaisesRegex(ValidationError, "as strings.*: taxon_id"):
+            format.validate(level="min")
+
+    def test_ena_samples_parquet_missing_values(self):
+        table = pd.DataFrame({"alias": ["sample1", "NA"], "taxon_id": ["9606", None]})
+        format = ENAMetadataSamplesParquetFormat(self._parquet(table), mode="r")
+
+        format.validate(level="min")
+        with self.assertRaisesRegex(
+            ValidationError,
+            "Some samples are missing values in the following fields: "
+            "alias,taxon_id.",
+        ):
+            format.validate()
+
+    def test_ena_samples_parquet_validated_from_statistics(self):
+        format = ENAMetadataSamplesParquetFormat(self._parquet(), mode="r")
+        with patch.object(pq.ParquetFile, "read_row_group") as mock_read:
+            format.validate()
+        mock_read.assert_not_called()
+
+    def test_ena_samples_parquet_without_statistics(self):
+        table = pa.table({"alias": ["sample1", ""], "taxon_id": ["9606", "9606"]})
+        path = self._parquet(table, write_statistics=False)
+        format = ENAMetadataSamplesParquetFormat(path, mode="r")
+        with self.assertRaisesRegex(ValidationError, "following fields: alias."):
+            format.validate()
+
+    def test_ena_samples_parquet_round_trip_xml(self):
+        # numbers and the strings of missing values are kept verbatim
+        path = self.get_data_path("ena_metadata_samples_na.tsv")
+        tsv = ENAMetadataSamplesFormat(path, mode="r")
+        parquet = ENAMetadataSamplesParquetFormat(
+            self._parquet(ParsedTSV(path).table), mode="r"
+        )
+        round_trip = _samples_parquet_to_tsv(parquet)
+
+        self.assertEqual(parquet.to_xml(), tsv.to_xml())
+        self.assertEqual(round_trip.to_xml(), tsv.to_xml())
+
+    def test_ena_samples_parquet_numbers_as_in_tsv(self):
+        df = pd.DataFrame({"alias": ["sample1"], "taxon_id": [9606], "depth": [1.0]})
+        records = next(iter_records(self._parquet(df)))
+        self.assertEqual(
+            records, [{"alias": "sample1", "taxon_id": "9606", "depth": "1.0"}]
+        )
+
+    def test_ena_samples_parquet_to_xml(self):
+        tsv = ENAMetadataSamplesFormat(
+            self.get_data_path("ena_metadata_samples.tsv"), mode="r"
+        )
+        format = ENAMetadataSamplesParquetFormat(self._parquet(), mode="r")
+
+        self.assertEqual(format.to_xml(), tsv.to_xml())
+
+    def test_ena_samples_dir_fmt(self):
+        for filename, parquet in [
+            ("ena_metadata_samples.tsv", False),
+            ("ena_metadata_samples.parquet", True),
+        ]:
+            with self.subTest(filename=filename):
+                dirfmt = ENAMetadataSamplesDirFmt()
+                path = os.path.join(str(dirfmt), filename)
+                if parquet:
+                    os.rename(self._parquet(), path)
+                else:
+                    with open(path, "w") as f:
+                        with open(self.get_data_path(filename)) as tsv:
+                            f.write(tsv.read())
+
+                dirfmt.validate(level="max")
+                self.assertIsInstance(
+                    dirfmt.samples(),
+                    (
+                        ENAMetadataSamplesParquetFormat
+                        if parquet
+                        else ENAMetadataSamplesFormat
+                    ),
+                )
+                self.assertIn(b"<SAMPLE_SET>", dirfmt.to_xml())
+
+    def test_ena_samples_dir_fmt_empty(self):
+        with self.assertRaisesRegex(ValidationError, "needs to contain either"):
+            ENAMetadataSamplesDirFmt().validate(level="max")
+
+
+class TestShardedSamples(TestPluginBase):
+    package = "q2_ena_uploader.types.tests"
+
+    HEADER = "alias\ttaxon_id\tcollection date\n"
+
+    def setUp(self):
+        super().setUp()
+        # the formats are validated and rendered anew by every test
+        env = patch.dict(
+            os.environ, {CACHE_ENABLED_ENV: "false", RENDER_CACHE_ENABLED_ENV: "false"}
+        )
+        env.start()
+        self.addCleanup(env.stop)
+
+    def _write(self, rows: str, header: str = HEADER) -> ENAMetadataSamplesFormat:
+        ff = ENAMetadataSamplesFormat()
+        with open(str(ff), "w") as f:
+            f.write(header + rows)
+        return ff
+
+    def _rows(self, start: int, stop: int) -> str:
+        return "".join(f"sample{i}\t9606\t2022-02-02\n" for i in range(start, stop))
+
+    def _sharded(self, n_shards: int = 3) -> ENAMetadataSamplesDirFmt:
+        dirfmt = ENAMetadataSamplesDirFmt()
+        for i in range(n_shards):
+            dirfmt.append_shard(self._write(self._rows(5 * i, 5 * (i + 1))))
+        return dirfmt
+
+    def test_shards_valid(self):
+        dirfmt = self._sharded()
+        for level in ("min", "max"):
+            with self.subTest(level=level):
+                dirfmt.validate(level=level)
+
+    def test_shards_ordered_by_index(self):
+        dirfmt = self._sharded(12)
+        self.assertEqual(
+            [os.path.basename(path) for path in dirfmt.shard_paths()],
+            [f"ena_metadata_samples_{i}.tsv" for i in range(1, 13)],
+        )
+        self.assertIsNone(dirfmt.samples())
+
+    def test_shards_to_xml_matches_single_file(self):
+        expected = self._write(self._rows(0, 15)).to_xml()
+        dirfmt = self._sharded()
+        for processes in (1, 2):
+            with self.subTest(processes=processes):
+                self.assertEqual(dirfmt.to_xml(processes), expected)
+
+    def test_shards_different_header(self):
+        dirfmt = self._sharded(2)
+        path = os.path.join(str(dirfmt), "ena_metadata_samples_3.tsv")
+        with open(path, "w") as f:
+            f.write("alias\ttaxon_id\n" + "sample20\t9606\n")
+
+        with self.assertRaisesRegex(
+            ValidationError, "same header.*not the case for: ena_metadata_samples_3"
+        ):
+            dirfmt.validate(level="max")
+
+    def test_shards_missing_values(self):
+        dirfmt = self._sharded(2)
+        dirfmt.append_shard(self._write("sample20\t\t2022-02-02\n"))
+        for parallel_min_bytes in (0, 2**30):
+            with self.subTest(parallel_min_bytes=parallel_min_bytes):
+                with patch(
+                    "q2_ena_uploader.types._types_and_formats."
+                    "PARALLEL_VALIDATION_MIN_BYTES",
+                    parallel_min_bytes,
+                ):
+                    with self.assertRaisesRegex(
+                        ValidationError,
+                        "ena_metadata_samples_3.tsv: .*following fields: taxon_id.",
+                    ):
+                        dirfmt.validate(level="max")
+
+    def test_shard_missing_attributes(self):
+        shard = self._write("sample1\t2022-02-02\n", header="alias\tcollection date\n")
+        with self.assertRaisesRegex(ValidationError, "metadata upload file: taxon_id"):
+            ENAMetadataSamplesShardFormat(str(shard), mode="r")._validate_("max")
+
+    def test_append_shard_to_tsv(self):
+        dirfmt = ENAMetadataSamplesDirFmt()
+        tsv = os.path.join(str(dirfmt), "ena_metadata_samples.tsv")
+        with open(tsv, "w") as f:
+            f.write(self.HEADER + self._rows(0, 5))
+
+        path = dirfmt.append_shard(self._write(self._rows(5, 10)))
+
+        self.assertFalse(os.path.exists(tsv))
+        self.assertEqual(os.path.basename(path), "ena_metadata_samples_2.tsv")
+        self.assertEqual(len(dirfmt.shard_paths()), 2)
+        dirfmt.validate(level="max")
+
+    def test_append_shard_different_header(self):
+        dirfmt = self._sharded(1)
+        with self.assertRaisesRegex(ValueError, "header of the appended samples"):
+            dirfmt.append_shard(self._write("sample1\t9606\n", "alias\ttaxon_id\n"))
+
+    def test_shards_and_single_file(self):
+        dirfmt = self._sharded(1)
+        with open(os.path.join(str(dirfmt), "ena_metadata_samples.tsv"), "w") as f:
+            f.write(self.HEADER + self._rows(5, 10))
+        with self.assertRaisesRegex(ValidationError, "needs to contain either"):
+            dirfmt.validate(level="max")
+
 
 class TestTransformers(TestPluginBase):
     package = "q2_ena_uploader.types.tests"
@@ -175,10 +514,10 @@ class TestTransformers(TestPluginBase):
         meta_path1 = self.get_data_path("ena_metadata_samples.tsv")
         meta_path2 = self.get_data_path("ena_metadata_study.tsv")
         meta_path3 = self.get_data_path("ena_metadata_experiment.tsv")
-        self.ena_meta_df = pd.read_csv(meta_path1, sep="\t")
-        self.ena_experiment_df = pd.read_csv(meta_path3, sep="\t")
+        self.ena_meta_df = pd.read_csv(meta_path1, sep="\t", dtype=object)
+        self.ena_experiment_df = pd.read_csv(meta_path3, sep="\t", dtype=object)
         self.ena_meta_study_df = pd.read_csv(
-            meta_path2, header=None, index_col=0, sep="\t"
+            meta_path2, header=None, index_col=0, sep="\t", dtype=object
         )
 
     def test_str_ena_receipt(self):
@@ -204,6 +543,61 @@ class TestTransformers(TestPluginBase):
         self.assertIsInstance(obs, pd.DataFrame)
         pd.testing.assert_frame_equal(obs, self.ena_experiment_df)
 
+    def test_ena_samples_parquet_to_df(self):
+        transformer = self.get_transformer(
+            ENAMetadataSamplesFormat, ENAMetadataSamplesParquetFormat
+        )
+        tsv = ENAMetadataSamplesFormat(
+            self.get_data_path("ena_metadata_samples.tsv"), mode="r"
+        )
+        parquet = transformer(tsv)
+
+        transformer = self.get_transformer(
+            ENAMetadataSamplesParquetFormat, pd.DataFrame
+        )
+        pd.testing.assert_frame_equal(transformer(parquet), self.ena_meta_df)
+
+    def test_ena_samples_parquet_round_trip(self):
+        for view_type in (pd.DataFrame, ENAMetadataSamplesFormat):
+            with self.subTest(view_type=view_type):
+                _, view = self.transform_format(
+                    ENAMetadataSamplesFormat, view_type, "ena_metadata_samples.tsv"
+                )
+                to_parquet = self.get_transformer(
+                    view_type, ENAMetadataSamplesParquetFormat
+                )
+                to_df = self.get_transformer(
+                    ENAMetadataSamplesParquetFormat, pd.DataFrame
+                )
+                pd.testing.assert_frame_equal(to_df(to_parquet(view)), self.ena_meta_df)
+
+    def test_ena_samples_parquet_metadata_round_trip(self):
+        _, metadata = self.transform_format(
+            ENAMetadataSamplesFormat, qiime2.Metadata, "ena_metadata_samples.tsv"
+        )
+        to_parquet = self.get_transformer(
+            qiime2.Metadata, ENAMetadataSamplesParquetFormat
+        )
+        to_metadata = self.get_transformer(
+            ENAMetadataSamplesParquetFormat, qiime2.Metadata
+        )
+        self.assertEqual(to_metadata(to_parquet(metadata)), metadata)
+
+    def test_ena_samples_shards_to_df(self):
+        dirfmt = ENAMetadataSamplesDirFmt()
+        for rows in ["alias1\t9606\n", "alias2\t9606"]:
+            shard = ENAMetadataSamplesFormat()
+            with open(str(shard), "w") as f:
+                f.write("alias\ttaxon_id\n" + rows)
+            dirfmt.append_shard(shard)
+
+        obs = self.get_transformer(ENAMetadataSamplesDirFmt, pd.DataFrame)(dirfmt)
+
+        exp = pd.DataFrame(
+            {"alias": ["alias1", "alias2"], "taxon_id": ["9606", "9606"]}, dtype=object
+        )
+        pd.testing.assert_frame_equal(obs, exp)
+
     def test_ena_study_metadata_to_dict(self):
         _, obs = self.transform_format(
             ENAMetadataStudyFormat, dict, "ena_metadata_study.tsv"
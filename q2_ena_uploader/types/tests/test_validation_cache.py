@@ -0,0 +1,163 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2025, Bokulich Lab.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import json
+import os
+import shutil
+import time
+import unittest
+from unittest.mock import patch
+
+from qiime2.plugin import ValidationError
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_ena_uploader.types import (
+    ENAMetadataExperimentFormat,
+    ENAMetadataSamplesFormat,
+)
+from q2_ena_uploader.types._validation_cache import (
+    CACHE_DIR_ENV,
+    CACHE_ENABLED_ENV,
+    _ValidationCache,
+    clear_validation_cache,
+    invalidate_validation,
+)
+
+
+class TestValidationCache(TestPluginBase):
+    package = "q2_ena_uploader.types.tests"
+
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = os.path.join(self.temp_dir.name, "cache")
+        env = patch.dict(os.environ, {CACHE_DIR_ENV: self.cache_dir})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def _copy(self, filename: str) -> str:
+        path = os.path.join(self.temp_dir.name, filename)
+        shutil.copy(self.get_data_path(filename), path)
+        return path
+
+    def _validate(self, format_cls, path: str, level: str = "max") -> int:
+        # number of times the file was actually validated
+        with patch.object(
+            format_cls, "_validate", autospec=True, side_effect=format_cls._validate
+        ) as mock_validate:
+            format_cls(path, mode="r").validate(level)
+        return mock_validate.call_count
+
+    def test_result_stored(self):
+        path = self._copy("ena_metadata_samples.tsv")
+
+        self.assertEqual(self._validate(ENAMetadataSamplesFormat, path), 1)
+        self.assertEqual(self._validate(ENAMetadataSamplesFormat, path), 0)
+
+    def test_result_stored_for_copy(self):
+        # artifacts are extracted into a new directory whenever they are loaded
+        self._validate(ENAMetadataSamplesFormat, self._copy("ena_metadata_samples.tsv"))
+        copy = os.path.join(self.temp_dir.name, "copy.tsv")
+        shutil.copy(self.get_data_path("ena_metadata_samples.tsv"), copy)
+
+        self.assertEqual(self._validate(ENAMetadataSamplesFormat, copy), 0)
+
+    def test_invalid_result_not_stored(self):
+        path = self._copy("ena_missing_values_samples.tsv")
+        for _ in range(2):
+            with patch.object(
+                ENAMetadataSamplesFormat,
+                "_validate",
+                autospec=True,
+                side_effect=ENAMetadataSamplesFormat._validate,
+            ) as mock_validate:
+                with self.assertRaisesRegex(
+                    ValidationError, "following fields: alias,taxon_id."
+                ):
+                    ENAMetadataSamplesFormat(path, mode="r").validate()
+            self.assertEqual(mock_validate.call_count, 1)
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def test_modified_file_validated(self):
+        path = self._copy("ena_metadata_samples.tsv")
+        self._validate(ENAMetadataSamplesFormat, path)
+        with open(path, "a") as f:
+            f.write("\n12\talias3\tBrazil\t2022-02-02\n")
+
+        self.assertEqual(self._validate(ENAMetadataSamplesFormat, path), 1)
+
+    def test_keyed_by_format_and_version(self):
+        path = self._copy("ena_metadata_experiment.tsv")
+        self._validate(ENAMetadataExperimentFormat, path)
+
+        with patch("q2_ena_uploader.__version__", "999.0.0"):
+            self.assertEqual(self._validate(ENAMetadataExperimentFormat, path), 1)
+        with patch("qiime2.__version__", "999.0.0"):
+            self.assertEqual(self._validate(ENAMetadataExperimentFormat, path), 1)
+        self.assertEqual(self._validate(ENAMetadataExperimentFormat, path), 0)
+
+    def test_min_validation_not_stored(self):
+        path = self._copy("ena_metadata_samples.tsv")
+        self._validate(ENAMetadataSamplesFormat, path, level="min")
+
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def test_invalidate(self):
+        path = self._copy("ena_metadata_samples.tsv")
+        other = self._copy("ena_metadata_experiment.tsv")
+        self._validate(ENAMetadataSamplesFormat, path)
+        self._validate(ENAMetadataExperimentFormat, other)
+
+        invalidate_validation(path)
+
+        self.assertEqual(self._validate(ENAMetadataSamplesFormat, path), 1)
+        self.assertEqual(self._validate(ENAMetadataExperimentFormat, other), 0)
+
+    def test_clear(self):
+        path = self._copy("ena_metadata_samples.tsv")
+        self._validate(ENAMetadataSamplesFormat, path)
+
+        clear_validation_cache()
+
+        self.assertEqual(os.listdir(self.cache_dir), [])
+        self.assertEqual(self._validate(ENAMetadataSamplesFormat, path), 1)
+
+    def test_disabled(self):
+        path = self._copy("ena_metadata_samples.tsv")
+        with patch.dict(os.environ, {CACHE_ENABLED_ENV: "false"}):
+            self.assertEqual(self._validate(ENAMetadataSamplesFormat, path), 1)
+            self.assertEqual(self._validate(ENAMetadataSamplesFormat, path), 1)
+
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def test_unusable_cache_dir(self):
+        path = self._copy("ena_metadata_samples.tsv")
+        with open(self.cache_dir, "w") as f:
+            f.write("not a directory")
+
+        self.assertEqual(self._validate(ENAMetadataSamplesFormat, path), 1)
+        self.assertEqual(self._validate(ENAMetadataSamplesFormat, path), 1)
+
+    def test_eviction(self):
+        # room for three entries
+        entry_size = len(json.dumps({"valid": True}))
+        cache = _ValidationCache(self.cache_dir, max_bytes=3 * entry_size)
+        for digest in ("a", "b", "c"):
+            cache.put(digest, "key", {"valid": True})
+            # make sure the entries differ in their time of last use
+            time.sleep(0.01)
+        cache.get("a", "key")
+
+        cache.put("d", "key", {"valid": True})
+
+        self.assertIsNotNone(cache.get("a", "key"))
+        self.assertIsNone(cache.get("b", "key"))
+        self.assertIsNotNone(cache.get("c", "key"))
+        self.assertIsNotNone(cache.get("d", "key"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,12 +6,27 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 import os
+import re
+import threading
+import time
+import uuid
 import warnings
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 from enum import Enum
-from typing import Tuple
-from xml.etree.ElementTree import fromstring
+from io import BytesIO, IOBase
+from typing import TYPE_CHECKING, BinaryIO, Dict, List, Optional, Tuple, Union
+from xml.etree.ElementTree import (
+    Element,
+    ElementTree,
+    SubElement,
+    fromstring,
+    iterparse,
+    tostring,
+)
 
-import requests
+if TYPE_CHECKING:
+    import requests
 
 # URL for the ENA development server submission endpoint
 DEV_SERVER_URL = "https://wwwdev.ebi.ac.uk/ena/submit/drop-box/submit"
@@ -19,9 +34,41 @@ DEV_SERVER_URL = "https://wwwdev.ebi.ac.uk/ena/submit/drop-box/submit"
 # URL for the ENA production server submission endpoint
 PRODUCTION_SERVER_URL = "https://www.ebi.ac.uk/ena/submit/drop-box/submit"
 
+# Environment variable overriding the submission endpoint, e.g. to point the
+# plugin at a local stand-in drop-box (see q2_ena_uploader.drop_box_server)
+SERVER_URL_ENV = "ENA_SERVER_URL"
+
 # Hostname for the ENA FTP server for file uploads
 FTP_HOST = "webin2.ebi.ac.uk"
 
+# Size of the chunks in which receipts are written to disk as they arrive
+RECEIPT_CHUNK_SIZE = 64 * 1024
+
+# Default number of connections kept open to every ENA host
+POOL_SIZE = 10
+
+# Seconds to wait for a connection to ENA and for its response - processing
+# of large submissions can take ENA several minutes
+CONNECT_TIMEOUT = 30
+READ_TIMEOUT = 900
+
+# Number of times a failed submission is retried and the delay (in seconds)
+# before the first retry, doubled with every further attempt
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 2.0
+
+# ENA error reported for objects registered by an earlier ADD submission, e.g.
+# 'In sample, alias: "s1". The object being added already exists in the
+# submission account with accession: "ERS1".'
+_ALREADY_EXISTS = re.compile(
+    r'In (\w+), alias:\s*"([^"]+)".*already exists in the submission account '
+    r'with accession:\s*"([^"]+)"',
+    re.DOTALL,
+)
+
+_session = None
+_session_lock = threading.Lock()
+
 
 class ActionType(Enum):
     """
@@ -75,12 +122,68 @@ def assert_credentials() -> Tuple[str, str]:
     return username, password
 
 
-def assert_success(response: requests.Response) -> None:
+def get_server_url(dev: bool = True) -> str:
+    """
+    Get the URL of the ENA submission endpoint.
+
+    Parameters
+    ----------
+    dev : bool, optional
+        Whether to use the development server, by default True.
+
+    Returns
+    -------
+    str
+        The URL set in the ENA_SERVER_URL environment variable or, if not set,
+        the URL of the development or production server.
+    """
+    return os.environ.get(SERVER_URL_ENV) or (
+        DEV_SERVER_URL if dev else PRODUCTION_SERVER_URL
+    )
+
+
+def receipt_status(receipt: BinaryIO) -> Tuple[str, Optional[str]]:
+    """
+    Read the outcome of a submission from its receipt.
+
+    The receipt is parsed incrementally and every element is discarded as
+    soon as it has been read - the success attribute is read from its root
+    element and, for failed submissions, the parsing stops at the first
+    error message.
+
+    Parameters
+    ----------
+    receipt : file-like
+        Binary file containing the receipt XML.
+
+    Returns
+    -------
+    tuple
+        The (lowercase) success attribute of the receipt and the first error
+        message (None if the submission was successful).
+    """
+    root, success, depth = None, None, 0
+    for event, element in iterparse(receipt, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root, success = element, element.get("success", "").lower()
+            depth += 1
+            continue
+        depth -= 1
+        if success == "false" and element.tag == "ERROR":
+            return success, element.text
+        if depth == 1:
+            root.clear()
+    return success, None
+
+
+def assert_success(receipt: Union["requests.Response", BinaryIO]) -> None:
+    source = receipt if isinstance(receipt, IOBase) else BytesIO(receipt.content)
     try:
-        receipt = fromstring(response.content)
-        success = receipt.get("success", "").lower()
+        success, error_msg = receipt_status(source)
         if success == "false":
-            error_msg = receipt.find(".//ERROR").text
+            if error_msg is None:
+                raise ValueError("The receipt contains no error message.")
             warnings.warn(
                 "The response from the ENA server contained an error: '%s' - "
                 "please inspect the output artifact to learn more." % error_msg
@@ -90,3 +193,580 @@ def assert_success(response: requests.Response) -> None:
         warnings.warn(
             "Unable to parse ENA response. Please inspect the returned data manually."
         )
+
+
+def _create_session(pool_size: int, keep_alive: bool) -> "requests.Session":
+    # requests is only imported when the first session is created, so that
+    # it is not loaded together with the plugin
+    from q2_ena_uploader._http import create_session
+
+    return create_session(pool_size, keep_alive)
+
+
+def configure_session(
+    pool_size: int = POOL_SIZE, keep_alive: bool = True
+) -> "requests.Session":
+    """
+    Configure the HTTP session shared by all the requests sent to ENA.
+
+    Parameters
+    ----------
+    pool_size : int, optional
+        Maximum number of connections kept open to every host, by default 10.
+        Should be at least the number of batches submitted concurrently.
+    keep_alive : bool, optional
+        Whether connections should be reused between requests, by default
+        True. When False, every request opens a new connection.
+
+    Returns
+    -------
+    requests.Session
+        The newly configured session.
+    """
+    global _session
+    session = _create_session(pool_size, keep_alive)
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = session
+    return session
+
+
+def get_session() -> "requests.Session":
+    """
+    Return the HTTP session shared by all the requests sent to ENA.
+
+    The session is created on first use. Its pool size and keep-alive
+    settings are taken from the ENA_POOL_SIZE and ENA_KEEP_ALIVE environment
+    variables, unless it was configured using `configure_session`.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _create_session(
+                int(os.environ.get("ENA_POOL_SIZE", POOL_SIZE)),
+                os.environ.get("ENA_KEEP_ALIVE", "true").lower() != "false",
+            )
+        return _session
+
+
+def connection_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Report how the connections of the shared HTTP session were used.
+
+    Returns
+    -------
+    dict
+        Number of connections opened to and requests sent to every host
+        (e.g. "https://www.ebi.ac.uk:443") - fewer connections than requests
+        means that the connections were reused.
+    """
+    if _session is None:
+        return {}
+
+    stats = {}
+    for adapter in set(_session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            stats[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "connections": pool.num_connects,
+                "requests": pool.num_requests,
+            }
+    return stats
+
+
+class MultipartStream:
+    """
+    A multipart/form-data request body read directly from its parts.
+
+    Parts may be given as bytes/str or as binary files (e.g. XML documents
+    spooled to temporary files), which are read in chunks while the body is
+    being sent instead of being copied into one in-memory body first.
+    """
+
+    def __init__(self, files: Dict[str, tuple]):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+
+        self._parts = []
+        for name, (filename, content, content_type) in files.items():
+            header = (
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="{name}"; '
+                f'filename="{filename}"\r\n'
+                f"Content-Type: {content_type}\r\n\r\n"
+            )
+            if isinstance(content, str):
+                content = content.encode("utf-8")
+            if isinstance(content, bytes):
+                content = BytesIO(content)
+            self._parts.extend([BytesIO(header.encode("utf-8")), content])
+            self._parts.append(BytesIO(b"\r\n"))
+        self._parts.append(BytesIO(f"--{boundary}--\r\n".encode("utf-8")))
+        # number of bytes of the body read (i.e. sent) so far
+        self.sent = 0
+
+        # used by requests as the Content-Length of the body
+        self.len = 0
+        for part in self._parts:
+            self.len += part.seek(0, os.SEEK_END)
+            part.seek(0)
+        self._current = 0
+
+    def read(self, size: int = -1) -> bytes:
+        remaining = self.len if size is None or size < 0 else size
+        chunks = []
+        while remaining > 0 and self._current < len(self._parts):
+            chunk = self._parts[self._current].read(remaining)
+            if not chunk:
+                self._current += 1
+                continue
+            chunks.append(chunk)
+            remaining -= len(chunk)
+            self.sent += len(chunk)
+        return b"".join(chunks)
+
+
+def _is_streamed(files: Dict[str, tuple]) -> bool:
+    return any(not isinstance(part[1], (str, bytes)) for part in files.values())
+
+
+def _never_sent(error: Optional[Exception], body: Optional[MultipartStream]) -> bool:
+    # whether a failed request certainly did not reach the server, i.e. it
+    # failed while the connection was being established
+    import requests
+    from urllib3.exceptions import NewConnectionError
+
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.ConnectionError):
+        return False
+    if body is not None and body.sent == 0:
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def _is_add_submission(files: Dict[str, tuple]) -> bool:
+    try:
+        submission = fromstring(files["SUBMISSION"][1])
+    except Exception:
+        return False
+    return submission.find("ACTIONS/ACTION/ADD") is not None
+
+
+def annotate_receipt(content: bytes, messages: List[str]) -> bytes:
+    """
+    Add INFO messages to an ENA receipt.
+
+    Parameters
+    ----------
+    content : bytes
+        The receipt XML.
+    messages : list of str
+        The messages to add.
+
+    Returns
+    -------
+    bytes
+        The receipt with the messages, or the original content if it is not
+        a receipt.
+    """
+    try:
+        receipt = fromstring(content)
+    except Exception:
+        return content
+    if receipt.tag != "RECEIPT":
+        return content
+
+    element = receipt.find("MESSAGES")
+    if element is None:
+        element = SubElement(receipt, "MESSAGES")
+    for message in messages:
+        SubElement(element, "INFO").text = message
+    return tostring(receipt, encoding="utf-8", xml_declaration=True)
+
+
+def annotate_receipt_file(path: str, messages: List[str]):
+    """Add INFO messages to the ENA receipt stored in a file."""
+    if not messages:
+        return
+    with open(path, "r+b") as fh:
+        content = annotate_receipt(fh.read(), messages)
+        fh.seek(0)
+        fh.truncate()
+        fh.write(content)
+
+
+def post_submission(
+    url: str,
+    auth: Tuple[str, str],
+    files: Dict[str, tuple],
+    retries: int = MAX_RETRIES,
+    backoff_factor: float = BACKOFF_FACTOR,
+    timeout: Tuple[float, float] = (CONNECT_TIMEOUT, READ_TIMEOUT),
+    receipt: BinaryIO = None,
+) -> "requests.Response":
+    """
+    Post a submission to the ENA drop-box, retrying transient failures.
+
+    Connection errors, timeouts and server errors (5xx) are retried with an
+    exponential backoff. The duration and outcome of every attempt (also of
+    a single successful one) are added to the receipt as INFO messages, so
+    that they are recorded in the receipt artifact.
+
+    ADD submissions which failed after reaching the server may nevertheless
+    have been processed by ENA, so they are only retried if the connection
+    could not be established. Should the receipt of a retried ADD submission
+    still report objects which already exist, they are added to the receipt
+    together with the accessions named by ENA (see `recover_existing_objects`).
+
+    Parameters
+    ----------
+    url : str
+        The ENA drop-box submission endpoint.
+    auth : tuple
+        Username and password to authenticate with.
+    files : dict
+        The multipart `files` payload of the submission. Parts given as
+        binary files are streamed from disk (see `MultipartStream`).
+    retries : int, optional
+        Maximum number of retries, by default 3.
+    backoff_factor : float, optional
+        Delay before the first retry in seconds, by default 2. The delay is
+        doubled with every further retry.
+    timeout : tuple, optional
+        Connect and read timeouts in seconds, by default (30, 900).
+    receipt : file-like, optional
+        Binary file the receipt is written to in chunks as it is received,
+        instead of being read into the content of the response.
+
+    Returns
+    -------
+    requests.Response
+        Response to the last attempt (already consumed if `receipt` is set).
+
+    Raises
+    ------
+    requests.ConnectionError, requests.Timeout
+        If the last attempt failed to get a response from the server, or an
+        ADD submission failed after it was sent.
+    """
+    import requests
+
+    session = get_session()
+    kwargs = {"auth": auth, "timeout": timeout}
+    if receipt is not None:
+        kwargs["stream"] = True
+    add = _is_add_submission(files)
+    attempts = []
+    for attempt in range(1, retries + 2):
+        start = time.perf_counter()
+        body = None
+        try:
+            if _is_streamed(files):
+                # a new stream (re)reads the files from start for every attempt
+                body = MultipartStream(files)
+                response = session.post(
+                    url,
+                    data=body,
+                    headers={"Content-Type": body.content_type},
+                    **kwargs,
+                )
+            else:
+                response = session.post(url, files=files, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error, response, outcome = e, None, type(e).__name__
+        else:
+            error, outcome = None, f"HTTP {response.status_code}"
+        attempts.append(
+            f"Submission attempt {attempt} took "
+            f"{time.perf_counter() - start:.2f} s ({outcome})."
+        )
+
+        if response is not None and response.status_code < 500:
+            break
+        # unless the connection could not be established, the server may
+        # have registered the objects of an ADD before the request failed
+        if attempt > retries or (add and not _never_sent(error, body)):
+            if error is not None:
+                raise error
+            break
+
+        if response is not None and receipt is not None:
+            # release the connection of the failed (unread) streamed attempt
+            response.close()
+        time.sleep(backoff_factor * 2 ** (attempt - 1))
+
+    if receipt is not None:
+        for chunk in response.iter_content(RECEIPT_CHUNK_SIZE):
+            receipt.write(chunk)
+
+    content = response.content if receipt is None else _read_back(receipt)
+    if add and len(attempts) > 1:
+        content = recover_existing_objects(content)
+    # the receipt is stored as the output artifact, so the attempts are
+    # recorded alongside ENA's own messages
+    content = annotate_receipt(content, attempts)
+    if receipt is None:
+        response._content = content
+    else:
+        receipt.seek(0)
+        receipt.truncate()
+        receipt.write(content)
+
+    return response
+
+
+def _read_back(file: BinaryIO) -> bytes:
+    # the receipts of output artifacts are opened for writing only
+    file.flush()
+    if file.readable():
+        file.seek(0)
+        return file.read()
+    with open(file.name, "rb") as fh:
+        return fh.read()
+
+
+def recover_existing_objects(content: bytes) -> bytes:
+    """
+    Add the objects ENA reports as already existing to an ADD receipt.
+
+    ENA fails an ADD submission of objects which are already registered in
+    the submission account, naming their accessions in the error messages.
+    If a submission is sent again after ENA registered its objects, these
+    objects are added to the receipt with their accessions and the errors
+    are replaced by INFO messages - the receipt is successful if no other
+    errors were reported.
+
+    Parameters
+    ----------
+    content : bytes
+        The receipt XML.
+
+    Returns
+    -------
+    bytes
+        The receipt with the existing objects, or the original content if
+        it reports no existing objects (or is not a receipt).
+    """
+    try:
+        receipt = fromstring(content)
+    except Exception:
+        return content
+    messages = receipt.find("MESSAGES")
+    if messages is None:
+        return content
+
+    recovered = []
+    for error in messages.findall("ERROR"):
+        match = _ALREADY_EXISTS.search(error.text or "")
+        if match is None:
+            continue
+        tag, alias, accession = match.groups()
+        messages.remove(error)
+        recovered.append(Element(tag.upper(), {"alias": alias, "accession": accession}))
+        SubElement(messages, "INFO").text = (
+            f"{tag.capitalize()} '{alias}' was already registered with the "
+            f"accession {accession}, most likely by an earlier attempt of this "
+            "submission which failed to return a receipt."
+        )
+    if not recovered:
+        return content
+
+    position = list(receipt).index(messages)
+    for i, element in enumerate(recovered):
+        receipt.insert(position + i, element)
+    if messages.find("ERROR") is None:
+        receipt.set("success", "true")
+    return tostring(receipt, encoding="utf-8", xml_declaration=True)
+
+
+def split_xml_set(xml: bytes, batch_size: int) -> List[bytes]:
+    """
+    Split an XML set document (e.g. SAMPLE_SET) into smaller documents.
+
+    Parameters
+    ----------
+    xml : bytes
+        The XML set document to split.
+    batch_size : int
+        Maximum number of objects to include in every document.
+
+    Returns
+    -------
+    list of bytes
+        XML documents with the same root element, each containing at most
+        `batch_size` of the original child elements, in their original order.
+    """
+    root = fromstring(xml)
+    children = list(root)
+    batches = []
+    for i in range(0, len(children), batch_size):
+        batch_root = Element(root.tag, root.attrib)
+        batch_root.extend(children[i : i + batch_size])
+        batches.append(tostring(batch_root, encoding="utf8"))
+    return batches
+
+
+def merge_receipts(
+    receipts: List[bytes], file: Optional[BinaryIO] = None
+) -> Optional[bytes]:
+    """
+    Merge receipts of several ENA submissions into a single receipt.
+
+    All the submitted objects (including the individual SUBMISSION elements)
+    are kept in the order of the provided receipts, messages are combined
+    into a single MESSAGES element and the merged receipt is only
+    successful if all of the individual submissions were.
+
+    Parameters
+    ----------
+    receipts : list of bytes
+        Raw ENA receipts, as returned by the server.
+    file : file-like, optional
+        Binary file the merged receipt is written to instead of being returned.
+
+    Returns
+    -------
+    bytes or None
+        The merged receipt XML, or None if it was written to `file`.
+    """
+    if len(receipts) == 1:
+        if file is None:
+            return receipts[0]
+        file.write(receipts[0])
+        return None
+
+    merged = None
+    objects, messages, actions = [], [], None
+    seen_messages = set()
+    success = True
+    for i, receipt in enumerate(receipts, start=1):
+        try:
+            root = fromstring(receipt)
+        except Exception:
+            success = False
+            error = Element("ERROR")
+            error.text = f"Unable to parse the ENA response for batch {i}."
+            messages.append(error)
+            continue
+
+        if merged is None:
+            merged = Element("RECEIPT", root.attrib)
+        if root.get("success", "").lower() != "true":
+            success = False
+
+        for child in root:
+            if child.tag == "MESSAGES":
+                # the same INFO messages are repeated in every receipt
+                for message in child:
+                    if (message.tag, message.text) not in seen_messages:
+                        seen_messages.add((message.tag, message.text))
+                        messages.append(message)
+            elif child.tag == "ACTIONS":
+                actions = actions if actions is not None else child
+            else:
+                objects.append(child)
+
+    if merged is None:
+        merged = Element(
+            "RECEIPT",
+            {
+                "receiptDate": datetime.now().astimezone().isoformat(),
+                "submissionFile": "submission.xml",
+            },
+        )
+    merged.set("success", "true" if success else "false")
+    merged.extend(objects)
+    SubElement(merged, "MESSAGES").extend(messages)
+    if actions is not None:
+        merged.append(actions)
+
+    if file is None:
+        return tostring(merged, encoding="utf-8", xml_declaration=True)
+    ElementTree(merged).write(file, encoding="utf-8", xml_declaration=True)
+    return None
+
+
+def _failed_receipt(message: str) -> bytes:
+    # a receipt standing in for a submission which got no response from ENA
+    root = Element(
+        "RECEIPT",
+        {
+            "receiptDate": datetime.now().astimezone().isoformat(),
+            "submissionFile": "submission.xml",
+            "success": "false",
+        },
+    )
+    SubElement(SubElement(root, "MESSAGES"), "ERROR").text = message
+    return tostring(root, encoding="utf-8", xml_declaration=True)
+
+
+def submit_batches(
+    url: str,
+    auth: Tuple[str, str],
+    batches: List[Dict[str, tuple]],
+    threads: int = 1,
+    receipt: Optional[BinaryIO] = None,
+) -> Optional[bytes]:
+    """
+    Submit several multipart documents to ENA and merge their receipts.
+
+    A batch which could not be submitted (e.g. due to a network error) does
+    not stop the other batches - the merged receipt keeps the objects
+    registered by all the other batches and contains an ERROR message for
+    every batch which failed, so that they can be submitted again.
+
+    Parameters
+    ----------
+    url : str
+        The ENA drop-box submission endpoint.
+    auth : tuple
+        Username and password to authenticate with.
+    batches : list of dict
+        The multipart `files` payload of every individual submission.
+    threads : int, optional
+        Maximum number of submissions sent concurrently, by default 1.
+    receipt : file-like, optional
+        Binary file the merged receipt is written to instead of being returned.
+
+    Returns
+    -------
+    bytes or None
+        A single receipt covering all of the submitted batches, or None if it
+        was written to `receipt`.
+
+    Raises
+    ------
+    Exception
+        The error of the first batch if none of the batches could be
+        submitted.
+    """
+    contents: List[Optional[bytes]] = [None] * len(batches)
+    errors: Dict[int, Exception] = {}
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = {
+            executor.submit(post_submission, url, auth, files): i
+            for i, files in enumerate(batches)
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                contents[i] = future.result().content
+            except Exception as e:
+                errors[i] = e
+                contents[i] = _failed_receipt(
+                    f"Batch {i + 1} of {len(batches)} could not be submitted: {e}"
+                )
+
+    if len(errors) == len(batches):
+        raise errors[0]
+
+    merged = merge_receipts(contents)
+    assert_success(BytesIO(merged))
+    if receipt is None:
+        return merged
+    receipt.write(merged)
+    return None